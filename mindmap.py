@@ -1,631 +1,2074 @@
-import tkinter as tk
-from tkinter import simpledialog, messagebox, filedialog, colorchooser
-import json
-import os
-import math
-import copy
-import random
-
-class MindMapNode:
-    def __init__(self, text, x, y, parent=None, color="lightblue"):
-        self.text = text
-        self.x = x
-        self.y = y
-        self.parent = parent
-        self.children = []
-        self.id = None
-        self.text_id = None
-        self.connector_id = None
-        self.color = color
-
-class MindMapApp:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Mind Map Creator")
-        self.root.geometry("800x600")
-
-        self.timer_label = tk.Label(self.root, text="Timer: 00:00:00", font=("Arial", 10))
-        self.timer_label.pack(side=tk.TOP, anchor="e")
-
-        self.timer_running = False
-        self.timer_seconds = 0
-
-        self.setup_timer_canvas()
-
-        self.canvas = tk.Canvas(root, bg="white")
-        self.canvas.pack(fill=tk.BOTH, expand=True)
-
-        self.nodes = []
-        self.selected_node = None
-        self.drag_data = {"x": 0, "y": 0, "item": None}
-
-        self.current_file = None
-        self.recent_files = []
-
-        self.undo_stack = []
-        self.redo_stack = []
-
-        self.setup_menu()
-        self.setup_bindings()
-        self.create_central_node()
-
-        self.bubbles = []
-
-        self.add_logo()
-
-    def add_logo(self):
-        pass
-
-    def setup_menu(self):
-        menubar = tk.Menu(self.root)
-
-        file_menu = tk.Menu(menubar, tearoff=0)
-        file_menu.add_command(label="New", command=self.new_mindmap)
-        file_menu.add_command(label="Save", command=self.save_mindmap)
-        file_menu.add_command(label="Save As", command=self.save_as_mindmap)
-        file_menu.add_command(label="Load", command=self.load_mindmap)
-        file_menu.add_command(label="Open Recent", command=self.open_recent_menu)
-        file_menu.add_separator()
-        file_menu.add_command(label="Export as PNG", command=self.export_as_png)
-        file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.root.quit)
-        menubar.add_cascade(label="File", menu=file_menu)
-
-        edit_menu = tk.Menu(menubar, tearoff=0)
-        edit_menu.add_command(label="Add Child", command=self.add_child_node)
-        edit_menu.add_command(label="Delete Node", command=self.delete_node)
-        edit_menu.add_command(label="Edit Text", command=self.edit_node_text)
-        edit_menu.add_command(label="Change Node Color", command=self.change_node_color)
-        edit_menu.add_separator()
-        edit_menu.add_command(label="Undo", command=self.undo, accelerator="Ctrl+Z")
-        edit_menu.add_command(label="Redo", command=self.redo, accelerator="Ctrl+Y")
-        edit_menu.add_separator()
-        edit_menu.add_command(label="Center View on Node", command=self.center_view_on_node)
-        edit_menu.add_separator()
-        edit_menu.add_command(label="Search Node", command=self.search_node, accelerator="Ctrl+F")
-        menubar.add_cascade(label="Edit", menu=edit_menu)
-
-        nn_menu = tk.Menu(menubar, tearoff=0)
-        nn_menu.add_command(label="Show Info", command=self.show_nn_info)
-        nn_menu.add_command(label="Add Example Node", command=self.add_nn_example_node)
-        menubar.add_cascade(label="Neural Networks", menu=nn_menu)
-
-        timer_menu = tk.Menu(menubar, tearoff=0)
-        timer_menu.add_command(label="Start Timer", command=self.start_timer)
-        timer_menu.add_command(label="Stop Timer", command=self.stop_timer)
-        timer_menu.add_command(label="Reset Timer", command=self.reset_timer)
-        menubar.add_cascade(label="Timer", menu=timer_menu)
-
-        self.root.config(menu=menubar)
-
-    def setup_bindings(self):
-        self.canvas.bind("<Button-1>", self.on_click)
-        self.canvas.bind("<B1-Motion>", self.on_drag)
-        self.canvas.bind("<ButtonRelease-1>", self.on_release)
-        self.canvas.bind("<Double-Button-1>", self.on_double_click)
-        self.root.bind("<Control-z>", lambda e: self.undo())
-        self.root.bind("<Control-y>", lambda e: self.redo())
-        self.root.bind("<Control-f>", lambda e: self.search_node())
-
-    def create_central_node(self):
-        center_x = self.canvas.winfo_width() // 2 or 400
-        center_y = self.canvas.winfo_height() // 2 or 300
-        central_node = MindMapNode("Central Idea", center_x, center_y)
-        self.draw_node(central_node)
-        self.nodes.append(central_node)
-
-    def draw_node(self, node):
-        node_width = 100
-        node_height = 60
-        try:
-            font_family = "Vazirmatn"
-            self.canvas.create_text(0, 0, text="", font=(font_family, 10))
-        except tk.TclError:
-            font_family = "Tahoma"
-        node.id = self.canvas.create_oval(
-            node.x - node_width // 2, node.y - node_height // 2,
-            node.x + node_width // 2, node.y + node_height // 2,
-            fill=node.color, outline="black", width=2
-        )
-        node.text_id = self.canvas.create_text(
-            node.x, node.y, text=node.text, font=(font_family, 12), width=90
-        )
-        if node.parent:
-            start = self.get_edge_point(node.parent, node)
-            end = self.get_edge_point(node, node.parent)
-            node.connector_id = self.canvas.create_line(
-                start[0], start[1], end[0], end[1],
-                fill="black", width=2
-            )
-
-    def get_edge_point(self, node_from, node_to):
-        dx = node_to.x - node_from.x
-        dy = node_to.y - node_from.y
-        angle = math.atan2(dy, dx)
-        node_width = 100
-        node_height = 60
-        x = node_from.x + (node_width // 2) * math.cos(angle)
-        y = node_from.y + (node_height // 2) * math.sin(angle)
-        return (x, y)
-
-    def on_click(self, event):
-        clicked_node = self.find_node_at_position(event.x, event.y)
-        if clicked_node:
-            self.selected_node = clicked_node
-            self.drag_data["item"] = clicked_node
-            self.drag_data["x"] = event.x
-            self.drag_data["y"] = event.y
-            self.canvas.itemconfig(clicked_node.id, fill="lightgreen")
-        else:
-            self.selected_node = None
-
-    def on_drag(self, event):
-        if self.drag_data["item"]:
-            node = self.drag_data["item"]
-            dx = event.x - self.drag_data["x"]
-            dy = event.y - self.drag_data["y"]
-
-            self.canvas.move(node.id, dx, dy)
-            self.canvas.move(node.text_id, dx, dy)
-            node.x += dx
-            node.y += dy
-
-            if node.parent and node.connector_id:
-                self.canvas.delete(node.connector_id)
-                start = self.get_edge_point(node.parent, node)
-                end = self.get_edge_point(node, node.parent)
-                node.connector_id = self.canvas.create_line(
-                    start[0], start[1], end[0], end[1],
-                    fill="black", width=2
-                )
-
-            for child in node.children:
-                if child.connector_id:
-                    self.canvas.delete(child.connector_id)
-                start = self.get_edge_point(node, child)
-                end = self.get_edge_point(child, node)
-                child.connector_id = self.canvas.create_line(
-                    start[0], start[1], end[0], end[1],
-                    fill="black", width=2
-                )
-
-            self.drag_data["x"] = event.x
-            self.drag_data["y"] = event.y
-
-    def on_release(self, event):
-        if self.drag_data["item"]:
-            node = self.drag_data["item"]
-            self.canvas.itemconfig(node.id, fill=node.color)
-            self.drag_data["item"] = None
-            self.push_undo_state()
-
-    def on_double_click(self, event):
-        clicked_node = self.find_node_at_position(event.x, event.y)
-        if clicked_node:
-            self.edit_node_text()
-        else:
-            self.add_child_node()
-
-    def find_node_at_position(self, x, y):
-        for node in self.nodes:
-            if (node.x - 50 <= x <= node.x + 50 and
-                node.y - 30 <= y <= node.y + 30):
-                return node
-        return None
-
-    def add_child_node(self):
-        if not self.selected_node:
-            messagebox.showwarning("Warning", "Please select a node first!")
-            return
-
-        parent = self.selected_node
-        child_text = simpledialog.askstring("Add Child", "Enter child node text:")
-
-        if child_text:
-            num_children = len(parent.children)
-            angle = (num_children * 60) % 360
-            rad = math.radians(angle)
-            distance = 150
-
-            child_x = parent.x + distance * math.cos(rad)
-            child_y = parent.y + distance * math.sin(rad)
-            child_x = max(60, min(self.canvas.winfo_width() - 60, child_x))
-            child_y = max(40, min(self.canvas.winfo_height() - 40, child_y))
-
-            child_node = MindMapNode(child_text, child_x, child_y, parent)
-            parent.children.append(child_node)
-            self.nodes.append(child_node)
-            self.draw_node(child_node)
-            self.push_undo_state()
-
-    def delete_node(self):
-        if not self.selected_node:
-            messagebox.showwarning("Warning", "Please select a node first!")
-            return
-        if self.selected_node.parent is None:
-            messagebox.showwarning("Warning", "Cannot delete the central node!")
-            return
-
-        node = self.selected_node
-        self.push_undo_state()
-
-        for child in node.children[:]:
-            self.selected_node = child
-            self.delete_node()
-
-        if node.parent:
-            node.parent.children.remove(node)
-        self.nodes.remove(node)
-        self.canvas.delete(node.id)
-        self.canvas.delete(node.text_id)
-        if node.connector_id:
-            self.canvas.delete(node.connector_id)
-        self.selected_node = None
-
-    def edit_node_text(self):
-        if not self.selected_node:
-            messagebox.showwarning("Warning", "Please select a node first!")
-            return
-        new_text = simpledialog.askstring("Edit Text", "Enter new text:",
-                                          initialvalue=self.selected_node.text)
-        if new_text:
-            self.push_undo_state()
-            self.selected_node.text = new_text
-            self.canvas.itemconfig(self.selected_node.text_id, text=new_text)
-
-    def change_node_color(self):
-        if not self.selected_node:
-            messagebox.showwarning("Warning", "Please select a node first!")
-            return
-        color = colorchooser.askcolor(title="Choose node color", initialcolor=self.selected_node.color)[1]
-        if color:
-            self.push_undo_state()
-            self.selected_node.color = color
-            self.canvas.itemconfig(self.selected_node.id, fill=color)
-
-    def new_mindmap(self):
-        self.push_undo_state()
-        self.canvas.delete("all")
-        self.nodes = []
-        self.selected_node = None
-        self.create_central_node()
-
-    def save_mindmap(self):
-        if not self.current_file:
-            self.save_as_mindmap()
-            return
-        data = {
-            "nodes": self.serialize_nodes(self.nodes)
-        }
-        with open(self.current_file, "w") as f:
-            json.dump(data, f, indent=2)
-        self.add_to_recent(self.current_file)
-
-    def save_as_mindmap(self):
-        file_path = filedialog.asksaveasfilename(
-            defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
-        )
-        if not file_path:
-            return
-        self.current_file = file_path
-        self.save_mindmap()
-
-    def load_mindmap(self):
-        file_path = filedialog.askopenfilename(
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
-        )
-        if not file_path:
-            return
-        self.current_file = file_path
-        with open(file_path, "r") as f:
-            data = json.load(f)
-        self.canvas.delete("all")
-        self.nodes = []
-        self.selected_node = None
-        self.deserialize_nodes(data["nodes"])
-        self.add_to_recent(file_path)
-        self.push_undo_state(clear_redo=True)
-
-    def add_to_recent(self, file_path):
-        if file_path not in self.recent_files:
-            self.recent_files.insert(0, file_path)
-        self.recent_files = self.recent_files[:5]
-
-    def open_recent_menu(self):
-        menu = tk.Menu(self.root, tearoff=0)
-        for file in self.recent_files:
-            menu.add_command(label=file, command=lambda f=file: self.load_recent_file(f))
-        try:
-            menu.tk_popup(self.root.winfo_pointerx(), self.root.winfo_pointery())
-        finally:
-            menu.grab_release()
-
-    def load_recent_file(self, file_path):
-        if not os.path.exists(file_path):
-            messagebox.showerror("Error", "File not found!")
-            return
-        self.current_file = file_path
-        with open(file_path, "r") as f:
-            data = json.load(f)
-        self.canvas.delete("all")
-        self.nodes = []
-        self.selected_node = None
-        self.deserialize_nodes(data["nodes"])
-        self.push_undo_state(clear_redo=True)
-
-    def export_as_png(self):
-        try:
-            import pyscreenshot as ImageGrab
-        except ImportError:
-            messagebox.showerror("Error", "Please install pyscreenshot:\npip install pyscreenshot")
-            return
-        x = self.root.winfo_rootx() + self.canvas.winfo_x()
-        y = self.root.winfo_rooty() + self.canvas.winfo_y()
-        x1 = x + self.canvas.winfo_width()
-        y1 = y + self.canvas.winfo_height()
-        img = ImageGrab.grab(bbox=(x, y, x1, y1))
-        file_path = filedialog.asksaveasfilename(
-            defaultextension=".png",
-            filetypes=[("PNG files", "*.png"), ("All files", "*.*")]
-        )
-        if file_path:
-            img.save(file_path)
-            messagebox.showinfo("Exported", f"Mind map exported as {file_path}")
-
-    def serialize_nodes(self, nodes):
-        serialized = []
-        for node in nodes:
-            if node.parent is None or node in node.parent.children:
-                serialized_node = {
-                    "text": node.text,
-                    "x": node.x,
-                    "y": node.y,
-                    "color": node.color,
-                    "children": self.serialize_nodes(node.children)
-                }
-                serialized.append(serialized_node)
-        return serialized
-
-    def deserialize_nodes(self, nodes_data, parent=None):
-        for node_data in nodes_data:
-            node = MindMapNode(
-                node_data["text"],
-                node_data["x"],
-                node_data["y"],
-                parent,
-                node_data.get("color", "lightblue")
-            )
-            if parent:
-                parent.children.append(node)
-            self.nodes.append(node)
-            self.draw_node(node)
-            if "children" in node_data:
-                self.deserialize_nodes(node_data["children"], node)
-
-    def center_view_on_node(self):
-        if not self.selected_node:
-            messagebox.showwarning("Warning", "Please select a node first!")
-            return
-        canvas_width = self.canvas.winfo_width()
-        canvas_height = self.canvas.winfo_height()
-        x = self.selected_node.x
-        y = self.selected_node.y
-        self.canvas.xview_moveto(max(0, x - canvas_width // 2) / self.canvas.winfo_width())
-        self.canvas.yview_moveto(max(0, y - canvas_height // 2) / self.canvas.winfo_height())
-
-    def push_undo_state(self, clear_redo=True):
-        state = json.dumps(self.serialize_nodes(self.nodes))
-        self.undo_stack.append(state)
-        if clear_redo:
-            self.redo_stack.clear()
-
-    def undo(self):
-        if not self.undo_stack:
-            return
-        if len(self.undo_stack) == 1:
-            return
-        state = self.undo_stack.pop()
-        self.redo_stack.append(state)
-        prev_state = self.undo_stack[-1]
-        self.restore_state(prev_state)
-
-    def redo(self):
-        if not self.redo_stack:
-            return
-        state = self.redo_stack.pop()
-        self.undo_stack.append(state)
-        self.restore_state(state)
-
-    def restore_state(self, state_json):
-        nodes_data = json.loads(state_json)
-        self.canvas.delete("all")
-        self.nodes = []
-        self.selected_node = None
-        self.deserialize_nodes(nodes_data)
-
-    def start_timer(self):
-        if not self.timer_running:
-            self.timer_running = True
-            self.update_timer()
-
-    def stop_timer(self):
-        self.timer_running = False
-
-    def reset_timer(self):
-        self.timer_running = False
-        self.timer_seconds = 0
-        self.timer_label.config(text="Timer: 00:00:00")
-        self.update_timer_bubbles()
-
-    def setup_timer_canvas(self):
-        self.timer_canvas = tk.Canvas(self.root, width=160, height=36, bg="white", highlightthickness=0)
-        self.timer_canvas.pack(side=tk.TOP, anchor="w", padx=5, pady=2)
-
-    def add_timer_bubble(self):
-        bubble = {
-            "x": random.randint(20, 140),
-            "y": 30,
-            "vx": random.uniform(-0.7, 0.7),
-            "vy": random.uniform(-1.5, -0.5),
-            "r": random.randint(8, 14),
-            "color": random.choice(["#6ec6ff", "#1976d2", "#ff9800", "#90caf9", "#81c784", "#f06292"]),
-            "alpha": 1.0,
-            "life": random.randint(60, 90)
-        }
-        if len(self.bubbles) < 18:
-            self.bubbles.append(bubble)
-
-    def update_timer_bubbles(self):
-        self.timer_canvas.delete("all")
-        new_bubbles = []
-        for bubble in self.bubbles:
-            bubble["x"] += bubble["vx"]
-            bubble["y"] += bubble["vy"]
-            bubble["r"] *= 0.992
-            bubble["life"] -= 1
-            bubble["alpha"] = max(0, bubble["life"] / 90)
-            base_color = self._hex_to_rgb(bubble["color"])
-            fade_color = tuple(int(255 * (1 - bubble["alpha"]) + c * bubble["alpha"]) for c in base_color)
-            color = self._rgb_to_hex(fade_color)
-            if bubble["life"] > 0 and bubble["r"] > 2:
-                self.timer_canvas.create_oval(
-                    bubble["x"]-bubble["r"], bubble["y"]-bubble["r"],
-                    bubble["x"]+bubble["r"], bubble["y"]+bubble["r"],
-                    fill=color, outline="", width=0
-                )
-                new_bubbles.append(bubble)
-        self.bubbles = new_bubbles
-
-        h = self.timer_seconds // 3600
-        m = (self.timer_seconds % 3600) // 60
-        s = self.timer_seconds % 60
-        self.timer_canvas.create_text(80, 18, text=f"{h:02d}:{m:02d}:{s:02d}", font=("Arial", 11, "bold"), fill="#333")
-
-    def update_timer(self):
-        if self.timer_running:
-            self.timer_seconds += 1
-            self.timer_label.config(text=f"Timer: {self.timer_seconds//3600:02d}:{(self.timer_seconds%3600)//60:02d}:{self.timer_seconds%60:02d}")
-            self.add_timer_bubble()
-            self.update_timer_bubbles()
-            self.root.after(1000, self.update_timer)
-        else:
-            self.update_timer_bubbles()
-
-    def show_nn_info(self):
-        messagebox.showinfo("Neural Networks", "Neural networks are a set of algorithms, modeled loosely after the human brain, that are designed to recognize patterns.")
-
-    def add_nn_example_node(self):
-        if not self.selected_node:
-            messagebox.showwarning("Warning", "Please select a node first!")
-            return
-        try:
-            num_layers = int(simpledialog.askstring("Neural Network", "How many layers?"))
-            if num_layers < 1:
-                raise ValueError
-        except Exception:
-            messagebox.showerror("Error", "Invalid number of layers.")
-            return
-
-        layers_nodes = []
-        parent_layer = [self.selected_node]
-
-        for layer in range(1, num_layers + 1):
-            weights_str = simpledialog.askstring(
-                "Layer Weights",
-                f"Enter weights for layer {layer} (comma separated, one row per neuron, separate rows with ';'):\nExample: 0.5,0.2,0.1; -0.3,0.7,0.8"
-            )
-            bias_str = simpledialog.askstring(
-                "Layer Bias",
-                f"Enter biases for layer {layer} (comma separated, one per neuron):\nExample: 0.1, -0.2, 0.3"
-            )
-            if not weights_str or not bias_str:
-                continue
-
-            weights_rows = [row.strip() for row in weights_str.split(";") if row.strip()]
-            biases = [b.strip() for b in bias_str.split(",") if b.strip()]
-            num_neurons = len(weights_rows)
-            if num_neurons != len(biases):
-                messagebox.showerror("Error", f"Number of neurons and biases do not match in layer {layer}!")
-                return
-
-            angle_start = -90
-            angle_step = 180 / max(1, num_neurons - 1) if num_neurons > 1 else 0
-            distance = 150 + (layer - 1) * 60
-
-            layer_nodes = []
-            for i, (weights, bias) in enumerate(zip(weights_rows, biases)):
-                angle = angle_start + i * angle_step
-                rad = math.radians(angle)
-                child_x = self.selected_node.x + distance * math.cos(rad)
-                child_y = self.selected_node.y + distance * math.sin(rad)
-                child_x = max(60, min(self.canvas.winfo_width() - 60, child_x))
-                child_y = max(40, min(self.canvas.winfo_height() - 40, child_y))
-                child_text = f"Layer {layer}\nWeights: {weights}\nBias: {bias}"
-                child_node = MindMapNode(child_text, child_x, child_y, None)
-                self.nodes.append(child_node)
-                self.draw_node(child_node)
-                layer_nodes.append(child_node)
-
-            for child_node in layer_nodes:
-                for parent_node in parent_layer:
-                    start = self.get_edge_point(parent_node, child_node)
-                    end = self.get_edge_point(child_node, parent_node)
-                    self.canvas.create_line(
-                        start[0], start[1], end[0], end[1],
-                        fill="#888", width=2, dash=(2, 2)
-                    )
-            parent_layer = layer_nodes
-            layers_nodes.append(layer_nodes)
-
-        self.push_undo_state()
-        self.animate_bubbles()
-
-    def animate_bubbles(self):
-        self.update_timer_bubbles()
-        self.root.after(50, self.animate_bubbles)
-
-    def _hex_to_rgb(self, hex_color):
-        hex_color = hex_color.lstrip('#')
-        return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-
-    def _rgb_to_hex(self, rgb):
-        return '#%02x%02x%02x' % rgb
-
-    def search_node(self):
-        query = simpledialog.askstring("Search Node", "Enter text to search for:")
-        if not query:
-            return
-        found = []
-        for node in self.nodes:
-            if query.lower() in node.text.lower():
-                found.append(node)
-                self.canvas.itemconfig(node.id, outline="red", width=4)
-            else:
-                self.canvas.itemconfig(node.id, outline="black", width=2)
-        if found:
-            node = found[0]
-            self.canvas.xview_moveto(max(0, node.x - 200) / self.canvas.winfo_width())
-            self.canvas.yview_moveto(max(0, node.y - 150) / self.canvas.winfo_height())
-            messagebox.showinfo("Search", f"{len(found)} node(s) found and highlighted.")
-        else:
-            messagebox.showinfo("Search", "No node found with that text.")
-
-
-if __name__ == "__main__":
-    root = tk.Tk()
-    app = MindMapApp(root)
-    root.mainloop()
-
-__pycache__/
-*.pyc
-*.pyo
-*.pyd
-*.swp
-*.swo
-*.bak
-*.tmp
-.DS_Store
-.idea/
-.vscode/
-.env
\ No newline at end of file
+import tkinter as tk
+from tkinter import simpledialog, messagebox, filedialog, colorchooser, ttk
+from tkinter import font as tkfont
+import bisect
+import functools
+import os
+import re
+import math
+import time
+import random
+import queue
+import threading
+from collections import deque
+from xml.etree.ElementTree import ParseError
+from mindmap_core import (
+    MindMapNode, MindMapDocument, SpatialGrid, LazyMapSource, OperationLog, iter_subtree, index_nodes,
+    iter_node_records, fallback_uid_base, apply_ops, compact_snapshot, read_map_file, parse_map_bytes,
+    chunk_state, is_chunked_file, load_layer, hides_children, StaleJournal,
+    TranslateDelta, RecolorDelta, NodeAttrDelta, AddSubtreeDelta, DeleteSubtreeDelta, CompoundDelta,
+    PositionsDelta
+)
+from mindmap_layout import layout_positions, find_free_slot, label_extent, WRAP_WIDTHS
+from mindmap_export import write_png, write_svg
+from mindmap_import import read_outline
+
+class FrameScheduler:
+    # Runs each requested callback at most once per frame. Requests made
+    # while a frame is running are deferred to the next frame, so repeated
+    # events (mouse motion, scrolling) collapse into one update.
+    def __init__(self, root, frame_ms=16):
+        self.root = root
+        self.frame_ms = frame_ms
+        self.tasks = {}
+        self.handle = None
+        self.last_frame = 0.0
+
+    def request(self, key, callback):
+        self.tasks[key] = callback
+        if self.handle is None:
+            delay = int(self.frame_ms - (time.perf_counter() - self.last_frame) * 1000)
+            if delay > 0:
+                self.handle = self.root.after(delay, self.run)
+            else:
+                self.handle = self.root.after_idle(self.run)
+
+    def cancel(self, key):
+        self.tasks.pop(key, None)
+
+    def flush(self, key):
+        callback = self.tasks.pop(key, None)
+        if callback is not None:
+            callback()
+
+    def run(self):
+        self.handle = None
+        self.last_frame = time.perf_counter()
+        tasks, self.tasks = self.tasks, {}
+        for callback in tasks.values():
+            callback()
+
+class LatencyHistogram:
+    # Counts samples in power-of-two millisecond buckets and keeps the
+    # latest ones for percentiles.
+    BOUNDS_MS = (1, 2, 4, 8, 16, 32, 64, 128)
+    BARS = " ▁▂▃▄▅▆▇█"
+
+    def __init__(self, recent=256):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.recent = deque(maxlen=recent)
+        self.total = 0
+        self.worst = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(self.BOUNDS_MS, ms)] += 1
+        self.recent.append(ms)
+        self.total += 1
+        self.worst = max(self.worst, ms)
+
+    def percentile(self, fraction):
+        ordered = sorted(self.recent)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def bars(self):
+        peak = max(self.counts) or 1
+        top = len(self.BARS) - 1
+        return "".join(self.BARS[math.ceil(count * top / peak)] for count in self.counts)
+
+class HandlerProfiler:
+    # Wraps handlers so each call is timed into a histogram while enabled;
+    # a disabled wrapper only checks the flag.
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {}
+
+    def wrap(self, key, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            if not self.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(key, (time.perf_counter() - start) * 1000)
+        return timed
+
+    def instrument(self, owner, names):
+        # Instance attributes shadow the methods, so bindings made later and
+        # calls through self both go through the wrapper.
+        for name in names:
+            setattr(owner, name, self.wrap(name, getattr(owner, name)))
+
+    def record(self, key, ms):
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        histogram.add(ms)
+
+    def reset(self):
+        self.histograms = {}
+
+    def report(self):
+        lines = [f"{'handler':<22}{'calls':>6}{'p50':>7}{'p95':>7}{'max':>7}  "
+                 f"<{LatencyHistogram.BOUNDS_MS[0]}..{LatencyHistogram.BOUNDS_MS[-1]}+ ms"]
+        ranked = sorted(self.histograms.items(), key=lambda item: -item[1].percentile(0.95))
+        for key, histogram in ranked:
+            lines.append(f"{key[:22]:<22}{histogram.total:>6}{histogram.percentile(0.5):>7.1f}"
+                         f"{histogram.percentile(0.95):>7.1f}{histogram.worst:>7.1f}  {histogram.bars()}")
+        return lines
+
+class TextMetrics:
+    # Sizes of wrapped labels. Each character is measured once per font,
+    # and finished label sizes are kept in an LRU cache keyed by text, font
+    # and wrap width, so redraws never go back to Tk for a known label.
+    def __init__(self, root, max_entries=1 << 16):
+        self.root = root
+        self.fonts = {}
+        self.size = functools.lru_cache(maxsize=max_entries)(self.measure)
+
+    def font_info(self, font):
+        info = self.fonts.get(font)
+        if info is None:
+            tk_font = tkfont.Font(root=self.root, family=font[0], size=font[1])
+            info = self.fonts[font] = (tk_font, {" ": tk_font.measure(" ")}, tk_font.metrics("linespace"))
+        return info
+
+    def prime(self, font, chars):
+        # Measures characters up front, so labels made of them can be sized
+        # off the Tk thread without calling into Tk.
+        tk_font, widths, linespace = self.font_info(font)
+        for char in set(chars).difference(widths):
+            widths[char] = tk_font.measure(char)
+
+    def measure(self, text, font, wrap_width):
+        tk_font, widths, linespace = self.font_info(font)
+        try:
+            return wrapped_size(text, widths, linespace, wrap_width)
+        except KeyError:
+            for char in set(text).difference(widths):
+                widths[char] = tk_font.measure(char)
+            return wrapped_size(text, widths, linespace, wrap_width)
+
+def wrapped_size(text, widths, linespace, wrap_width):
+    # Greedy word wrap like the canvas does it. Widths add up per
+    # character here, so a line's width is the sum of its words and spaces
+    # and no candidate line has to be measured again.
+    char_width = widths.__getitem__
+    if "\n" not in text:
+        width = sum(map(char_width, text))
+        if width <= wrap_width:
+            return width, linespace
+    space = widths[" "]
+    widest = 0
+    lines = 0
+    for paragraph in text.split("\n"):
+        line = 0
+        for word in paragraph.split(" "):
+            width = sum(map(char_width, word))
+            if not line:
+                line = width
+            elif line + space + width > wrap_width:
+                widest = max(widest, line)
+                lines += 1
+                line = width
+            else:
+                line += space + width
+        widest = max(widest, line)
+        lines += 1
+    return widest, lines * linespace
+
+class JobCancelled(Exception):
+    pass
+
+class BackgroundJob:
+    # Runs work(job) on a worker thread. The worker reports progress with
+    # job.report() and calls job.check() to honour cancellation; results
+    # reach the Tk thread through a queue that is polled with after(), so
+    # done(result) and failed(error) always run on the Tk thread. A
+    # cancelled job calls failed(None). A job that commits its result as
+    # it goes (a save replacing the file) calls done(result) whenever the
+    # work finished, even if Cancel came too late to stop it. A cancelled
+    # event can be passed in when Cancel may be clicked before the job
+    # exists.
+    def __init__(self, root, work, done, failed, progress=None, poll_ms=50, commits=False, cancelled=None):
+        self.root = root
+        self.done = done
+        self.failed = failed
+        self.commits = commits
+        self.progress = progress
+        self.poll_ms = poll_ms
+        self.messages = queue.Queue()
+        self.cancelled = cancelled if cancelled is not None else threading.Event()
+        threading.Thread(target=self.run, args=(work,), daemon=True).start()
+        self.root.after(poll_ms, self.poll)
+
+    def run(self, work):
+        try:
+            result = work(self)
+        except JobCancelled:
+            self.messages.put(("cancelled", None))
+        except Exception as e:
+            self.messages.put(("failed", e))
+        else:
+            self.messages.put(("done", result))
+
+    def report(self, *args):
+        self.messages.put(("progress", args))
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise JobCancelled()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def poll(self):
+        latest = None
+        while True:
+            try:
+                kind, value = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                latest = value
+                continue
+            if kind == "done" and self.cancelled.is_set() and not self.commits:
+                kind = "cancelled"
+            if kind == "done":
+                self.done(value)
+            elif kind == "failed":
+                self.failed(value)
+            else:
+                self.failed(None)
+            return
+        if latest is not None and self.progress is not None:
+            self.progress(*latest)
+        self.root.after(self.poll_ms, self.poll)
+
+class ProgressDialog:
+    # Modal while open: the map cannot be edited underneath a running save
+    # or load, but the window keeps redrawing.
+    def __init__(self, root, title, cancel):
+        self.window = tk.Toplevel(root)
+        self.window.title(title)
+        self.window.transient(root)
+        self.window.resizable(False, False)
+        self.label = tk.Label(self.window, text=title + "...", anchor="w", width=48)
+        self.label.pack(padx=12, pady=(12, 4), fill=tk.X)
+        self.bar = ttk.Progressbar(self.window, length=320, maximum=1.0)
+        self.bar.pack(padx=12, pady=4)
+        self.cancel_button = tk.Button(self.window, text="Cancel", command=cancel)
+        self.cancel_button.pack(pady=(4, 12))
+        self.window.protocol("WM_DELETE_WINDOW", cancel)
+        self.busy = False
+        self.window.wait_visibility()
+        self.window.grab_set()
+
+    def update(self, text, fraction=None):
+        self.label.config(text=text)
+        if fraction is None:
+            if not self.busy:
+                self.bar.config(mode="indeterminate")
+                self.bar.start(20)
+                self.busy = True
+        else:
+            if self.busy:
+                self.bar.stop()
+                self.bar.config(mode="determinate")
+                self.busy = False
+            self.bar.config(value=fraction)
+
+    def disable_cancel(self):
+        self.cancel_button.config(state=tk.DISABLED)
+        self.window.protocol("WM_DELETE_WINDOW", lambda: None)
+
+    def close(self):
+        self.bar.stop()
+        self.window.grab_release()
+        self.window.destroy()
+
+def fade_palette(color, steps):
+    # Colors for every remaining-life value, blended from white at 0 up to
+    # the full color at steps.
+    rgb = [int(color[i:i + 2], 16) for i in (1, 3, 5)]
+    return ["#%02x%02x%02x" % tuple(int(255 * (1 - life / steps) + c * life / steps) for c in rgb)
+            for life in range(steps + 1)]
+
+class BubbleAnimation:
+    # Bubbles rising behind the timer clock. The ovals are a fixed pool
+    # created up front and moved with coords/itemconfig; one after() loop
+    # runs while any bubble is alive and stops by itself afterwards.
+    COLORS = ("#6ec6ff", "#1976d2", "#ff9800", "#90caf9", "#81c784", "#f06292")
+    MAX_BUBBLES = 18
+    MAX_LIFE = 90
+
+    def __init__(self, canvas, frame_ms=50):
+        self.canvas = canvas
+        self.frame_ms = frame_ms
+        self.handle = None
+        self.bubbles = []
+        self.free = [canvas.create_oval(0, 0, 0, 0, outline="", width=0, state="hidden")
+                     for _ in range(self.MAX_BUBBLES)]
+        self.label = canvas.create_text(80, 18, text="00:00:00", font=("Arial", 11, "bold"), fill="#333")
+        self.palettes = [fade_palette(color, self.MAX_LIFE) for color in self.COLORS]
+
+    def add(self):
+        if not self.free:
+            return
+        self.bubbles.append([
+            random.randint(20, 140), 30,
+            random.uniform(-0.7, 0.7), random.uniform(-1.5, -0.5),
+            random.randint(8, 14), random.randint(60, self.MAX_LIFE),
+            random.choice(self.palettes), self.free.pop(),
+        ])
+        if self.handle is None:
+            self.handle = self.canvas.after(self.frame_ms, self.step)
+
+    def step(self):
+        self.handle = None
+        alive = []
+        canvas = self.canvas
+        for bubble in self.bubbles:
+            x, y, vx, vy, r, life, palette, item = bubble
+            x += vx
+            y += vy
+            r *= 0.992
+            life -= 1
+            if life > 0 and r > 2:
+                bubble[0], bubble[1], bubble[4], bubble[5] = x, y, r, life
+                canvas.coords(item, x - r, y - r, x + r, y + r)
+                canvas.itemconfig(item, fill=palette[life], state="normal")
+                alive.append(bubble)
+            else:
+                canvas.itemconfig(item, state="hidden")
+                self.free.append(item)
+        self.bubbles = alive
+        if alive:
+            self.handle = canvas.after(self.frame_ms, self.step)
+
+    def set_text(self, text):
+        self.canvas.itemconfig(self.label, text=text)
+
+class MindMapApp:
+    FONT_FAMILIES = ("Vazirmatn", "Tahoma")
+    FONT_SIZE = 12
+    VIEW_MARGIN = 0.25
+    FULL_DETAIL_NODE_LIMIT = 800
+    AGGREGATE_NODE_LIMIT = 4000
+    MAX_BLOBS = 1500
+    ITEM_POOL_LIMIT = 2000
+    MIN_ZOOM = 0.02
+    MAX_ZOOM = 4.0
+    TEXT_MIN_ZOOM = 0.35
+    BLOB_MAX_ZOOM = 0.12
+    SEARCH_PAGE_SIZE = 200
+    # Maps below these sizes are saved and opened directly; bigger ones go
+    # through a worker thread with a progress dialog.
+    BACKGROUND_SAVE_NODES = 20000
+    BACKGROUND_LOAD_BYTES = 4 << 20
+    READ_CHUNK_BYTES = 1 << 20
+    APPLY_BATCH = 500
+    APPLY_FRAME_SECONDS = 0.012
+    JOURNAL_SYNC_MS = 1000
+    OVERLAY_MS = 500
+    PROFILED_HANDLERS = (
+        "on_click", "on_drag", "apply_drag", "on_release", "on_pan", "on_mouse_wheel", "zoom_step",
+        "refresh_viewport", "find_node_at_position", "delete_node", "undo", "redo", "toggle_collapse",
+        "auto_layout_nodes", "show_search_result",
+    )
+
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Mind Map Creator")
+        self.root.geometry("800x600")
+
+        self.timer_label = tk.Label(self.root, text="Timer: 00:00:00", font=("Arial", 10))
+        self.timer_label.pack(side=tk.TOP, anchor="e")
+
+        self.timer_running = False
+        self.timer_handle = None
+        self.timer_seconds = 0
+
+        self.setup_timer_canvas()
+
+        self.canvas = tk.Canvas(root, bg="white")
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.font_family = self.resolve_font_family()
+        self.text_metrics = TextMetrics(self.root)
+        self.label_extent = functools.lru_cache(maxsize=1 << 16)(self.measure_label)
+
+        self.culling = tk.BooleanVar(self.root, value=True)
+        self.zoom = 1.0
+        self.offset_x = 0.0
+        self.offset_y = 0.0
+        self.scrollregion = None
+        self.scrollregion_stale = True
+        self.view_rect = None
+        self.detail_level = "full"
+        self.drawn = {}
+        self.blob_ids = []
+        self.item_pool = {"oval": [], "text": [], "line": []}
+        self.search_matches = set()
+        self.search_results = []
+        self.search_position = -1
+        self.search_mode = tk.StringVar(self.root, value="substring")
+        self.layout_mode = tk.StringVar(self.root, value="radial")
+        self.auto_layout = tk.BooleanVar(self.root, value=False)
+        self.frames = FrameScheduler(self.root)
+        # Handlers are wrapped up front so the overlay can be switched on at
+        # any time; until then the wrappers cost a flag check per call.
+        self.profiler = HandlerProfiler()
+        self.profiler.instrument(self, self.PROFILED_HANDLERS)
+        self.frames.run = self.profiler.wrap("frame", self.frames.run)
+        self.profiling = tk.BooleanVar(self.root, value=False)
+        self.overlay = None
+        self.overlay_handle = None
+        self.overlay_due = 0.0
+
+        self.doc = MindMapDocument()
+        self.spatial_index = SpatialGrid()
+        self.selected_node = None
+        self.selection = {}
+        self.drag_data = {"x": 0, "y": 0, "item": None}
+
+        self.current_file = None
+        self.recent_files = []
+        self.save_format = tk.StringVar(self.root, value="indented")
+        self.autosave = tk.BooleanVar(self.root, value=True)
+        self.compacting = False
+
+        self.setup_menu()
+        self.setup_bindings()
+        self.create_central_node()
+
+        self.add_logo()
+        self.root.after(self.JOURNAL_SYNC_MS, self.sync_op_log)
+
+    def add_logo(self):
+        pass
+
+    def setup_menu(self):
+        menubar = tk.Menu(self.root)
+
+        file_menu = tk.Menu(menubar, tearoff=0)
+        file_menu.add_command(label="New", command=self.new_mindmap)
+        file_menu.add_command(label="Save", command=self.save_mindmap)
+        file_menu.add_command(label="Save As", command=self.save_as_mindmap)
+        file_menu.add_command(label="Load", command=self.load_mindmap)
+        file_menu.add_command(label="Open Large Map (Lazy)", command=self.load_mindmap_lazy)
+        file_menu.add_command(label="Open Recent", command=self.open_recent_menu)
+        file_menu.add_command(label="Import Outline", command=self.import_outline)
+        format_menu = tk.Menu(file_menu, tearoff=0)
+        format_menu.add_radiobutton(label="Indented", variable=self.save_format, value="indented")
+        format_menu.add_radiobutton(label="Compact", variable=self.save_format, value="compact")
+        format_menu.add_radiobutton(label="Compact (flat table)", variable=self.save_format, value="flat")
+        format_menu.add_radiobutton(label="Chunked (incremental saves)", variable=self.save_format,
+                                    value="chunked")
+        file_menu.add_cascade(label="Save Format", menu=format_menu)
+        file_menu.add_checkbutton(label="Autosave Changes", variable=self.autosave,
+                                  command=self.toggle_autosave)
+        file_menu.add_separator()
+        file_menu.add_command(label="Export as PNG", command=self.export_as_png)
+        file_menu.add_command(label="Export as SVG", command=self.export_as_svg)
+        file_menu.add_separator()
+        file_menu.add_command(label="Exit", command=self.exit_app)
+        menubar.add_cascade(label="File", menu=file_menu)
+
+        edit_menu = tk.Menu(menubar, tearoff=0)
+        edit_menu.add_command(label="Add Child", command=self.add_child_node)
+        edit_menu.add_command(label="Select All", command=self.select_all, accelerator="Ctrl+A")
+        edit_menu.add_command(label="Delete Node", command=self.delete_node)
+        edit_menu.add_command(label="Edit Text", command=self.edit_node_text)
+        edit_menu.add_command(label="Change Node Color", command=self.change_node_color)
+        edit_menu.add_command(label="Collapse/Expand Branch", command=self.toggle_collapse, accelerator="Ctrl+E")
+        edit_menu.add_separator()
+        edit_menu.add_command(label="Undo", command=self.undo, accelerator="Ctrl+Z")
+        edit_menu.add_command(label="Redo", command=self.redo, accelerator="Ctrl+Y")
+        edit_menu.add_separator()
+        edit_menu.add_command(label="Center View on Node", command=self.center_view_on_node)
+        edit_menu.add_separator()
+        edit_menu.add_command(label="Search Node", command=self.search_node, accelerator="Ctrl+F")
+        edit_menu.add_command(label="Next Match", command=self.next_match, accelerator="F3")
+        edit_menu.add_command(label="Previous Match", command=self.previous_match, accelerator="Shift+F3")
+        search_menu = tk.Menu(edit_menu, tearoff=0)
+        search_menu.add_radiobutton(label="Substring", variable=self.search_mode, value="substring")
+        search_menu.add_radiobutton(label="Word Prefix", variable=self.search_mode, value="prefix")
+        search_menu.add_radiobutton(label="Regular Expression", variable=self.search_mode, value="regex")
+        edit_menu.add_cascade(label="Search Mode", menu=search_menu)
+        menubar.add_cascade(label="Edit", menu=edit_menu)
+
+        view_menu = tk.Menu(menubar, tearoff=0)
+        view_menu.add_command(label="Zoom In", command=lambda: self.zoom_step(1.25), accelerator="Ctrl++")
+        view_menu.add_command(label="Zoom Out", command=lambda: self.zoom_step(0.8), accelerator="Ctrl+-")
+        view_menu.add_command(label="Reset Zoom", command=lambda: self.zoom_step(1 / self.zoom), accelerator="Ctrl+0")
+        view_menu.add_separator()
+        view_menu.add_checkbutton(label="Render Visible Area Only", variable=self.culling,
+                                  command=self.refresh_viewport)
+        view_menu.add_checkbutton(label="Show Profiling Overlay", variable=self.profiling,
+                                  command=self.toggle_profiling)
+        menubar.add_cascade(label="View", menu=view_menu)
+
+        layout_menu = tk.Menu(menubar, tearoff=0)
+        layout_menu.add_radiobutton(label="Radial", variable=self.layout_mode, value="radial")
+        layout_menu.add_radiobutton(label="Tidy Tree", variable=self.layout_mode, value="tree")
+        layout_menu.add_separator()
+        layout_menu.add_command(label="Lay Out Map / Selected Branches", command=self.auto_layout_nodes,
+                                accelerator="Ctrl+L")
+        layout_menu.add_checkbutton(label="Lay Out Branch When Adding Children", variable=self.auto_layout)
+        menubar.add_cascade(label="Layout", menu=layout_menu)
+
+        nn_menu = tk.Menu(menubar, tearoff=0)
+        nn_menu.add_command(label="Show Info", command=self.show_nn_info)
+        nn_menu.add_command(label="Add Network", command=self.add_nn_network)
+        nn_menu.add_command(label="Run Forward Pass", command=self.run_forward_pass)
+        menubar.add_cascade(label="Neural Networks", menu=nn_menu)
+
+        timer_menu = tk.Menu(menubar, tearoff=0)
+        timer_menu.add_command(label="Start Timer", command=self.start_timer)
+        timer_menu.add_command(label="Stop Timer", command=self.stop_timer)
+        timer_menu.add_command(label="Reset Timer", command=self.reset_timer)
+        menubar.add_cascade(label="Timer", menu=timer_menu)
+
+        self.root.config(menu=menubar)
+
+    def setup_bindings(self):
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.canvas.bind("<B1-Motion>", self.on_drag)
+        self.canvas.bind("<ButtonRelease-1>", self.on_release)
+        self.canvas.bind("<Double-Button-1>", self.on_double_click)
+        self.root.bind("<Control-z>", lambda e: self.undo())
+        self.root.bind("<Control-y>", lambda e: self.redo())
+        self.root.bind("<Control-f>", lambda e: self.search_node())
+        self.root.bind("<F3>", lambda e: self.next_match())
+        self.root.bind("<Shift-F3>", lambda e: self.previous_match())
+        self.root.bind("<Control-e>", lambda e: self.toggle_collapse())
+        self.root.bind("<Control-a>", lambda e: self.select_all())
+        self.root.bind("<Control-l>", lambda e: self.auto_layout_nodes())
+        self.root.bind("<Escape>", lambda e: self.set_selection(()))
+        self.canvas.bind("<Configure>", lambda e: self.schedule_viewport_refresh())
+        self.canvas.bind("<ButtonPress-2>", self.on_pan_start)
+        self.canvas.bind("<B2-Motion>", self.on_pan)
+        self.canvas.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.canvas.bind("<Button-4>", self.on_mouse_wheel)
+        self.canvas.bind("<Button-5>", self.on_mouse_wheel)
+        self.root.bind("<Control-plus>", lambda e: self.zoom_step(1.25))
+        self.root.bind("<Control-equal>", lambda e: self.zoom_step(1.25))
+        self.root.bind("<Control-minus>", lambda e: self.zoom_step(0.8))
+        self.root.bind("<Control-0>", lambda e: self.zoom_step(1 / self.zoom))
+
+    def create_central_node(self):
+        center_x, center_y = self.to_world(
+            self.canvas.canvasx(self.canvas.winfo_width() // 2 or 400),
+            self.canvas.canvasy(self.canvas.winfo_height() // 2 or 300)
+        )
+        central_node = MindMapNode("Central Idea", center_x, center_y)
+        self.doc.attach_subtree(central_node, None)
+        self.show_node(central_node)
+        return central_node
+
+    def draw_node(self, node):
+        node.id = self.acquire_item(
+            "oval", *self.node_coords(node),
+            fill=node.color, dash=(4, 2) if hides_children(node) else "",
+            tags="match" if node in self.search_matches else "", **self.node_outline(node)
+        )
+        if self.detail_level == "full":
+            wrap = self.label_extent(node.text)[2]
+            node.text_id = self.acquire_item(
+                "text", *self.to_canvas(node.x, node.y), text=node.text,
+                font=(self.font_family, self.font_size()), width=wrap * self.zoom,
+                tags=("node_text", f"wrap{wrap}")
+            )
+        if node.parent:
+            node.connector_id = self.acquire_item(
+                "line", *self.connector_coords(node), **self.connector_options(node)
+            )
+        self.drawn[node] = None
+
+    def node_coords(self, node):
+        half_width, half_height = self.label_extent(node.text)[:2]
+        x0, y0 = self.to_canvas(node.x - half_width, node.y - half_height)
+        x1, y1 = self.to_canvas(node.x + half_width, node.y + half_height)
+        return x0, y0, x1, y1
+
+    def measure_label(self, text):
+        font = (self.font_family, self.FONT_SIZE)
+        return label_extent(text, lambda label, wrap: self.text_metrics.size(label, font, wrap))
+
+    def node_extent(self, node):
+        return self.label_extent(node.text)[:2]
+
+    def node_outline(self, node):
+        if node in self.search_matches:
+            return {"outline": "red", "width": 4}
+        if node in self.selection:
+            return {"outline": "blue", "width": 3}
+        return {"outline": "black", "width": 2}
+
+    def font_size(self):
+        return max(1, round(self.FONT_SIZE * self.zoom))
+
+    def to_canvas(self, x, y):
+        return x * self.zoom + self.offset_x, y * self.zoom + self.offset_y
+
+    def to_world(self, x, y):
+        return (x - self.offset_x) / self.zoom, (y - self.offset_y) / self.zoom
+
+    def event_to_world(self, event):
+        return self.to_world(self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
+
+    def connector_options(self, node):
+        # The connector into a layer node stands for all of its dense
+        # connections, drawn as one line that thickens with their number.
+        if node.layer is not None:
+            return {"fill": "#888", "width": min(12, 2 + math.log2(1 + node.layer.weights.size) / 2)}
+        return {"fill": "black", "width": 2}
+
+    def connector_coords(self, node):
+        return self.edge_coords(node.parent, node.parent.x, node.parent.y, node, node.x, node.y)
+
+    def edge_coords(self, parent, px, py, node, x, y):
+        # One atan2/cos/sin pair serves both ends: the angle seen from the
+        # child is the parent's angle turned by 180 degrees. Each end is
+        # clipped to its own node's oval.
+        angle = math.atan2(y - py, x - px)
+        cos, sin = math.cos(angle), math.sin(angle)
+        parent_width, parent_height = self.label_extent(parent.text)[:2]
+        width, height = self.label_extent(node.text)[:2]
+        zoom = self.zoom
+        return ((px + parent_width * cos) * zoom + self.offset_x, (py + parent_height * sin) * zoom + self.offset_y,
+                (x - width * cos) * zoom + self.offset_x, (y - height * sin) * zoom + self.offset_y)
+
+    def visible_world_rect(self):
+        x0, y0 = self.to_world(self.canvas.canvasx(0), self.canvas.canvasy(0))
+        x1, y1 = self.to_world(self.canvas.canvasx(self.canvas.winfo_width()),
+                               self.canvas.canvasy(self.canvas.winfo_height()))
+        return x0, y0, x1, y1
+
+    def on_pan_start(self, event):
+        self.canvas.scan_mark(event.x, event.y)
+
+    def on_pan(self, event):
+        self.canvas.scan_dragto(event.x, event.y, gain=1)
+        self.schedule_viewport_refresh()
+
+    def on_mouse_wheel(self, event):
+        if getattr(event, "num", None) == 5 or getattr(event, "delta", 0) < 0:
+            factor = 0.8
+        else:
+            factor = 1.25
+        self.zoom_step(factor, self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
+
+    def zoom_step(self, factor, x=None, y=None):
+        if x is None:
+            x = self.canvas.canvasx(self.canvas.winfo_width() / 2)
+            y = self.canvas.canvasy(self.canvas.winfo_height() / 2)
+        zoom = min(self.MAX_ZOOM, max(self.MIN_ZOOM, self.zoom * factor))
+        factor = zoom / self.zoom
+        if factor == 1:
+            return
+        # Scale the existing items around the cursor instead of redrawing them.
+        self.canvas.scale("all", x, y, factor, factor)
+        self.zoom = zoom
+        self.offset_x = x + (self.offset_x - x) * factor
+        self.offset_y = y + (self.offset_y - y) * factor
+        self.canvas.itemconfig("node_text", font=(self.font_family, self.font_size()))
+        for wrap in WRAP_WIDTHS:
+            self.canvas.itemconfig(f"wrap{wrap}", width=wrap * zoom)
+        self.scrollregion_stale = True
+        self.schedule_viewport_refresh()
+
+    def resolve_font_family(self):
+        # Tk silently substitutes missing fonts, so look the family up once
+        # instead of probing with canvas items.
+        available = set(tkfont.families(self.root))
+        for family in self.FONT_FAMILIES:
+            if family in available:
+                return family
+        return self.FONT_FAMILIES[-1]
+
+    def update_scrollregion(self, *extra_world_rect):
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        left = self.canvas.canvasx(0)
+        top = self.canvas.canvasy(0)
+        x0, y0, x1, y1 = left, top, left + width, top + height
+        rects = [extra_world_rect] if extra_world_rect else []
+        cells = self.spatial_index.cells
+        if cells:
+            size = self.spatial_index.cell_size
+            cxs = [cx for cx, cy in cells]
+            cys = [cy for cx, cy in cells]
+            rects.append((min(cxs) * size, min(cys) * size, (max(cxs) + 1) * size, (max(cys) + 1) * size))
+        for rect in rects:
+            rx0, ry0 = self.to_canvas(rect[0], rect[1])
+            rx1, ry1 = self.to_canvas(rect[2], rect[3])
+            x0, y0, x1, y1 = min(x0, rx0), min(y0, ry0), max(x1, rx1), max(y1, ry1)
+        self.scrollregion = (x0 - width, y0 - height, x1 + width, y1 + height)
+        self.canvas.configure(scrollregion=self.scrollregion)
+        self.scrollregion_stale = False
+
+    def scroll_to(self, x, y):
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        left, top = self.to_canvas(x, y)
+        left -= width / 2
+        top -= height / 2
+        self.update_scrollregion(*self.to_world(left, top), *self.to_world(left + width, top + height))
+        x0, y0, x1, y1 = self.scrollregion
+        self.canvas.xview_moveto((left - x0) / (x1 - x0))
+        self.canvas.yview_moveto((top - y0) / (y1 - y0))
+        self.refresh_viewport()
+
+    def undraw_node(self, node):
+        if node.id is None:
+            return
+        self.release_item("oval", node.id)
+        if node.text_id is not None:
+            self.release_item("text", node.text_id)
+        if node.connector_id is not None:
+            self.release_item("line", node.connector_id)
+        node.id = node.text_id = node.connector_id = None
+        del self.drawn[node]
+
+    def acquire_item(self, kind, *coords, **options):
+        pool = self.item_pool[kind]
+        if pool:
+            item = pool.pop()
+            self.canvas.coords(item, *coords)
+            self.canvas.itemconfig(item, state="normal", **options)
+            return item
+        return getattr(self.canvas, "create_" + kind)(*coords, **options)
+
+    def release_item(self, kind, item):
+        pool = self.item_pool[kind]
+        if len(pool) < self.ITEM_POOL_LIMIT:
+            self.canvas.itemconfig(item, state="hidden")
+            pool.append(item)
+        else:
+            self.canvas.delete(item)
+
+    def reset_canvas(self):
+        self.canvas.delete("all")
+        for node in self.drawn:
+            node.id = node.text_id = node.connector_id = None
+        self.drawn = {}
+        self.blob_ids = []
+        for pool in self.item_pool.values():
+            pool.clear()
+
+    def schedule_viewport_refresh(self):
+        self.frames.request("viewport", self.refresh_viewport)
+
+    def refresh_viewport(self):
+        self.frames.cancel("viewport")
+        if self.drag_data.get("moving") is not None:
+            # Items of a dragged branch are tagged and moved as a group;
+            # translate_nodes schedules a refresh once the drop is committed.
+            return
+        if self.scrollregion_stale:
+            self.update_scrollregion()
+        x0, y0, x1, y1 = self.visible_world_rect()
+        margin = max(x1 - x0, y1 - y0) * self.VIEW_MARGIN
+        self.view_rect = (x0 - margin, y0 - margin, x1 + margin, y1 + margin)
+        if self.culling.get():
+            wanted = self.spatial_index.query_rect(*self.view_rect)
+        else:
+            wanted = list(self.spatial_index.bounds)
+
+        if len(wanted) > self.AGGREGATE_NODE_LIMIT or self.zoom < self.BLOB_MAX_ZOOM:
+            level = "aggregate"
+        elif len(wanted) > self.FULL_DETAIL_NODE_LIMIT or self.zoom < self.TEXT_MIN_ZOOM:
+            level = "simple"
+        else:
+            level = "full"
+        if level != self.detail_level:
+            for node in list(self.drawn):
+                self.undraw_node(node)
+            self.detail_level = level
+        self.draw_blobs()
+        if level == "aggregate":
+            return
+
+        wanted_set = set(wanted)
+        for node in [node for node in self.drawn if node not in wanted_set]:
+            self.undraw_node(node)
+        for node in wanted:
+            if node.id is None:
+                self.draw_node(node)
+
+    def draw_blobs(self):
+        blobs = {}
+        size = self.spatial_index.cell_size
+        if self.detail_level == "aggregate":
+            if self.culling.get():
+                cells = list(self.spatial_index.cell_counts(*self.view_rect))
+            else:
+                cells = [(cx, cy, len(cell)) for (cx, cy), cell in self.spatial_index.cells.items()]
+            # Merge neighbouring grid cells until the blob count is bounded.
+            group = max(1, math.ceil(math.sqrt(len(cells) / self.MAX_BLOBS)))
+            for cx, cy, count in cells:
+                key = (cx // group, cy // group)
+                blobs[key] = blobs.get(key, 0) + count
+            size *= group
+        while len(self.blob_ids) > len(blobs):
+            self.canvas.delete(self.blob_ids.pop())
+        for index, ((gx, gy), count) in enumerate(blobs.items()):
+            radius = size / 2 * min(1.0, 0.3 + math.sqrt(count) / 10) * self.zoom
+            x, y = self.to_canvas((gx + 0.5) * size, (gy + 0.5) * size)
+            coords = (x - radius, y - radius, x + radius, y + radius)
+            if index < len(self.blob_ids):
+                self.canvas.coords(self.blob_ids[index], *coords)
+            else:
+                self.blob_ids.append(self.canvas.create_oval(*coords, fill="#9fb8d0", outline=""))
+
+    def toggle_profiling(self):
+        if not self.profiling.get():
+            self.profiler.enabled = False
+            if self.overlay_handle is not None:
+                self.root.after_cancel(self.overlay_handle)
+                self.overlay_handle = None
+            self.overlay.place_forget()
+            return
+        if self.overlay is None:
+            self.overlay = tk.Label(self.canvas, font=("Courier", 9), justify=tk.LEFT, anchor="nw",
+                                    bg="#fffff0", relief="solid", bd=1)
+        self.overlay.place(relx=1.0, x=-6, y=6, anchor="ne")
+        self.profiler.reset()
+        self.profiler.enabled = True
+        self.overlay_due = time.perf_counter()
+        self.update_overlay()
+
+    def update_overlay(self):
+        # How late this refresh runs shows how long the event loop was
+        # blocked, whichever handler did it.
+        now = time.perf_counter()
+        self.profiler.record("event loop lag", max(0.0, (now - self.overlay_due) * 1000))
+        items = len(self.canvas.find_all())
+        lines = [f"{items} canvas items, {len(self.drawn)} nodes drawn of {len(self.doc)}, "
+                 f"detail: {self.detail_level}"]
+        lines.extend(self.profiler.report())
+        self.overlay.config(text="\n".join(lines))
+        self.overlay_due = time.perf_counter() + self.OVERLAY_MS / 1000
+        self.overlay_handle = self.root.after(self.OVERLAY_MS, self.update_overlay)
+
+    def wants_drawn(self, node):
+        if self.detail_level == "aggregate":
+            return False
+        if self.view_rect is None or not self.culling.get():
+            return True
+        x0, y0, x1, y1 = self.view_rect
+        bx0, by0, bx1, by1 = self.spatial_index.bounds[node]
+        return bx0 <= x1 and bx1 >= x0 and by0 <= y1 and by1 >= y0
+
+    def on_click(self, event):
+        x, y = self.event_to_world(event)
+        state = getattr(event, "state", 0)
+        additive = bool(state & 0x0001)
+        clicked_node = self.find_node_at_position(x, y)
+        self.drag_data["x"] = x
+        self.drag_data["y"] = y
+        if clicked_node is None:
+            if not additive:
+                self.set_selection(())
+            cx, cy = self.to_canvas(x, y)
+            self.drag_data["band"] = self.canvas.create_rectangle(cx, cy, cx, cy, outline="gray", dash=(4, 2))
+            self.drag_data["band_start"] = (x, y)
+            self.drag_data["additive"] = additive
+            return
+        if additive and clicked_node in self.selection:
+            self.set_selection([node for node in self.selection if node is not clicked_node])
+            return
+        if additive:
+            self.set_selection(list(self.selection) + [clicked_node])
+        elif clicked_node not in self.selection:
+            self.set_selection([clicked_node])
+        self.selected_node = clicked_node
+        self.drag_data["item"] = clicked_node
+        self.drag_data["subtree"] = not state & 0x0004
+        self.drag_data["dx"] = self.drag_data["dy"] = 0
+        if clicked_node.id is not None:
+            self.canvas.itemconfig(clicked_node.id, fill="lightgreen")
+
+    def on_drag(self, event):
+        if self.drag_data["item"] or "band" in self.drag_data:
+            self.drag_data["target"] = self.event_to_world(event)
+            self.frames.request("drag", self.apply_drag)
+
+    def apply_drag(self):
+        target = self.drag_data.pop("target", None)
+        if target is None:
+            return
+        x, y = target
+        dx = x - self.drag_data["x"]
+        dy = y - self.drag_data["y"]
+        self.drag_data["x"] = x
+        self.drag_data["y"] = y
+
+        if "band" in self.drag_data:
+            x0, y0 = self.drag_data["band_start"]
+            self.canvas.coords(self.drag_data["band"], *self.to_canvas(x0, y0), *self.to_canvas(x, y))
+            return
+        if self.drag_data["item"] is None:
+            return
+        if self.drag_data.get("moving") is None:
+            moving = self.moving_nodes(self.drag_data["subtree"])
+            self.drag_data["moving"] = moving
+            self.drag_data["boundary"] = self.tag_moving(moving)
+        self.drag_data["dx"] += dx
+        self.drag_data["dy"] += dy
+        # The whole branch moves with one canvas call; only the connectors
+        # that tie it to the rest of the map need new geometry.
+        self.canvas.move("moving", dx * self.zoom, dy * self.zoom)
+        self.update_boundary(self.drag_data["moving"], self.drag_data["boundary"],
+                             self.drag_data["dx"], self.drag_data["dy"])
+
+    def on_release(self, event):
+        self.frames.flush("drag")
+        band = self.drag_data.pop("band", None)
+        if band is not None:
+            self.canvas.delete(band)
+            x0, y0 = self.drag_data.pop("band_start")
+            x1, y1 = self.drag_data["x"], self.drag_data["y"]
+            hits = self.find_nodes_in_rect(min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+            if self.drag_data.pop("additive", False):
+                hits = list(self.selection) + [node for node in hits if node not in self.selection]
+            self.set_selection(hits)
+            return
+        if self.drag_data["item"]:
+            node = self.drag_data["item"]
+            if node.id is not None:
+                self.canvas.itemconfig(node.id, fill=node.color)
+            self.drag_data["item"] = None
+            moving = self.drag_data.pop("moving", None)
+            if moving is not None:
+                dx, dy = self.drag_data["dx"], self.drag_data["dy"]
+                self.translate_nodes(moving, dx, dy, self.drag_data.pop("boundary"))
+                if dx or dy:
+                    self.record_change(TranslateDelta(moving, dx, dy))
+
+    def set_selection(self, nodes):
+        old = self.selection
+        self.selection = dict.fromkeys(nodes)
+        for node in old:
+            if node not in self.selection and node.id is not None:
+                self.canvas.itemconfig(node.id, **self.node_outline(node))
+        for node in self.selection:
+            if node not in old and node.id is not None:
+                self.canvas.itemconfig(node.id, **self.node_outline(node))
+        if self.selected_node not in self.selection:
+            self.selected_node = next(reversed(self.selection), None) if self.selection else None
+
+    def select_all(self):
+        self.set_selection([node for node in self.doc if node in self.spatial_index])
+
+    def selection_roots(self):
+        roots = []
+        for node in self.selection:
+            parent = node.parent
+            while parent is not None and parent not in self.selection:
+                parent = parent.parent
+            if parent is None:
+                roots.append(node)
+        return roots
+
+    def moving_nodes(self, subtree):
+        if not subtree:
+            return dict(self.selection)
+        moving = {}
+        for root in self.selection_roots():
+            for node in iter_subtree(root):
+                moving[node] = None
+        return moving
+
+    def tag_moving(self, moving):
+        # Tags the drawn items of the moving nodes, including connectors
+        # between two moving nodes, and returns the nodes whose connector
+        # joins a moving node to a stationary one.
+        addtag = self.canvas.addtag_withtag
+        boundary = []
+        for node in moving:
+            if node.id is not None:
+                addtag("moving", node.id)
+                if node.text_id is not None:
+                    addtag("moving", node.text_id)
+            if node.connector_id is not None:
+                if node.parent in moving:
+                    addtag("moving", node.connector_id)
+                else:
+                    boundary.append(node)
+            for child in node.children:
+                if child.connector_id is not None and child not in moving:
+                    boundary.append(child)
+        return boundary
+
+    def update_boundary(self, moving, boundary, dx, dy):
+        coords = self.canvas.coords
+        edge_coords = self.edge_coords
+        for node in boundary:
+            parent = node.parent
+            if node in moving:
+                coords(node.connector_id, *edge_coords(parent, parent.x, parent.y, node, node.x + dx, node.y + dy))
+            else:
+                coords(node.connector_id, *edge_coords(parent, parent.x + dx, parent.y + dy, node, node.x, node.y))
+
+    def translate_nodes(self, nodes, dx, dy, boundary=None):
+        if boundary is None:
+            boundary = self.tag_moving(nodes)
+            self.canvas.move("moving", dx * self.zoom, dy * self.zoom)
+        self.canvas.dtag("moving")
+        self.doc.translate_nodes(nodes, dx, dy)
+        for node in nodes:
+            if node in self.spatial_index:
+                self.index_node(node)
+        self.update_boundary(nodes, boundary, 0, 0)
+        self.schedule_viewport_refresh()
+
+    def recolor_nodes(self, nodes, color):
+        self.doc.recolor_nodes(nodes, color)
+        addtag = self.canvas.addtag_withtag
+        for node in nodes:
+            if node.id is not None:
+                addtag("recolor", node.id)
+        self.canvas.itemconfig("recolor", fill=color)
+        self.canvas.dtag("recolor")
+
+    def set_node_attr(self, node, attr, value):
+        self.doc.set_node_attr(node, attr, value)
+        if node.id is None:
+            return
+        if attr == "color":
+            self.canvas.itemconfig(node.id, fill=value)
+        elif attr == "text":
+            self.resize_node(node)
+
+    def resize_node(self, node):
+        # A new label can change the node's size, which moves its bounds and
+        # the ends of the connectors touching it.
+        if node in self.spatial_index:
+            self.index_node(node)
+        if node.id is None:
+            return
+        self.canvas.coords(node.id, *self.node_coords(node))
+        if node.text_id is not None:
+            wrap = self.label_extent(node.text)[2]
+            self.canvas.itemconfig(node.text_id, text=node.text, width=wrap * self.zoom,
+                                   tags=("node_text", f"wrap{wrap}"))
+        if node.connector_id is not None:
+            self.canvas.coords(node.connector_id, *self.connector_coords(node))
+        for child in node.children:
+            if child.connector_id is not None:
+                self.canvas.coords(child.connector_id, *self.connector_coords(child))
+
+    def attach_subtree(self, node, parent, index=None):
+        self.doc.attach_subtree(node, parent, index)
+        for current in iter_subtree(node):
+            if self.is_visible_child(current):
+                self.show_node(current)
+
+    def detach_subtree(self, node):
+        index = self.doc.detach_subtree(node)
+        self.forget_nodes(iter_subtree(node))
+        if self.selected_node is not None and self.selected_node not in self.spatial_index:
+            self.selected_node = None
+        return index
+
+    def on_double_click(self, event):
+        clicked_node = self.find_node_at_position(*self.event_to_world(event))
+        if clicked_node:
+            self.edit_node_text()
+        else:
+            self.add_child_node()
+
+    def find_node_at_position(self, x, y):
+        return self.spatial_index.nearest(x, y)
+
+    def find_nodes_in_rect(self, x0, y0, x1, y1):
+        return self.spatial_index.query_rect(x0, y0, x1, y1)
+
+    def index_node(self, node):
+        index_nodes(self.spatial_index, (node,), self.node_extent)
+        self.scrollregion_stale = True
+
+    def forget_nodes(self, nodes):
+        # Drops the nodes from the view and deletes their canvas items with
+        # one delete call instead of returning them to the item pool.
+        items = []
+        for node in nodes:
+            self.spatial_index.remove(node)
+            self.selection.pop(node, None)
+            if node.id is None:
+                continue
+            items.append(node.id)
+            if node.text_id is not None:
+                items.append(node.text_id)
+            if node.connector_id is not None:
+                items.append(node.connector_id)
+            node.id = node.text_id = node.connector_id = None
+            del self.drawn[node]
+        if items:
+            self.canvas.delete(*items)
+
+    def is_visible_child(self, node):
+        parent = node.parent
+        return parent is None or (parent in self.spatial_index and not hides_children(parent))
+
+    def show_node(self, node):
+        if node not in self.spatial_index:
+            self.index_node(node)
+            if self.wants_drawn(node):
+                self.draw_node(node)
+
+    def hide_node(self, node):
+        self.spatial_index.remove(node)
+        self.selection.pop(node, None)
+        self.undraw_node(node)
+
+    def iter_visible(self, node):
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            yield current
+            if not hides_children(current):
+                stack.extend(reversed(current.children))
+
+    def toggle_collapse(self):
+        if not self.selected_node:
+            messagebox.showwarning("Warning", "Please select a node first!")
+            return
+        node = self.selected_node
+        if hides_children(node):
+            self.expand_node(node)
+        elif node.children:
+            self.collapse_node(node)
+
+    def set_collapsed(self, node, collapsed):
+        if collapsed:
+            self.collapse_node(node)
+        else:
+            self.expand_node(node)
+
+    def collapse_node(self, node):
+        self.doc.set_collapsed(node, True)
+        for child in node.children:
+            for current in list(self.iter_visible(child)):
+                self.hide_node(current)
+        if node.id is not None:
+            self.canvas.itemconfig(node.id, dash=(4, 2))
+        if self.selected_node is not None and self.selected_node not in self.spatial_index:
+            self.selected_node = None
+
+    def expand_node(self, node):
+        self.doc.set_collapsed(node, False)
+        if node.id is not None:
+            self.canvas.itemconfig(node.id, dash="")
+        if node not in self.spatial_index:
+            return
+        for child in node.children:
+            for current in self.iter_visible(child):
+                self.show_node(current)
+
+    def add_child_node(self):
+        if not self.selected_node:
+            messagebox.showwarning("Warning", "Please select a node first!")
+            return
+
+        parent = self.selected_node
+        if hides_children(parent):
+            self.expand_node(parent)
+        child_text = simpledialog.askstring("Add Child", "Enter child node text:")
+
+        if child_text:
+            if parent.parent is not None:
+                # Grow away from the grandparent so branches fan outwards.
+                rad = math.atan2(parent.y - parent.parent.y, parent.x - parent.parent.x)
+            else:
+                rad = math.radians((len(parent.children) * 60) % 360)
+            child_x, child_y = find_free_slot(self.spatial_index, parent, rad, self.label_extent(child_text)[:2])
+
+            child_node = MindMapNode(child_text, child_x, child_y, parent)
+            self.attach_subtree(child_node, parent)
+            left, top, right, bottom = self.visible_world_rect()
+            if not (left < child_x < right and top < child_y < bottom):
+                self.scroll_to(child_x, child_y)
+            if self.auto_layout.get():
+                self.record_change(CompoundDelta([AddSubtreeDelta(child_node), self.layout_branch(parent)]))
+            else:
+                self.record_change(AddSubtreeDelta(child_node))
+
+    def auto_layout_nodes(self):
+        roots = self.selection_roots() or self.doc.root_nodes()
+        deltas = [self.layout_branch(root) for root in roots]
+        if not deltas:
+            return
+        self.record_change(deltas[0] if len(deltas) == 1 else CompoundDelta(deltas))
+
+    def layout_branch(self, root):
+        # Re-lays out only the branch under root; the rest of the map keeps
+        # its positions.
+        positions = layout_positions(root, self.layout_mode.get(), self.node_extent)
+        old_positions = {node: (node.x, node.y) for node in positions}
+        self.set_positions(positions)
+        return PositionsDelta(old_positions, positions)
+
+    def set_positions(self, positions):
+        self.doc.set_positions(positions)
+        coords = self.canvas.coords
+        for node in positions:
+            if node in self.spatial_index:
+                self.index_node(node)
+            if node.id is None:
+                continue
+            coords(node.id, *self.node_coords(node))
+            if node.text_id is not None:
+                coords(node.text_id, *self.to_canvas(node.x, node.y))
+            if node.connector_id is not None:
+                coords(node.connector_id, *self.connector_coords(node))
+            for child in node.children:
+                if child.connector_id is not None and child not in positions:
+                    coords(child.connector_id, *self.connector_coords(child))
+        self.schedule_viewport_refresh()
+
+    def delete_node(self):
+        if not self.selection:
+            messagebox.showwarning("Warning", "Please select a node first!")
+            return
+        roots = [node for node in self.selection_roots() if node.parent is not None]
+        if not roots:
+            messagebox.showwarning("Warning", "Cannot delete the central node!")
+            return
+
+        deltas = []
+        for node in roots:
+            index = self.detach_subtree(node)
+            deltas.append(DeleteSubtreeDelta(node, index))
+        self.record_change(deltas[0] if len(deltas) == 1 else CompoundDelta(deltas))
+        self.selected_node = None
+
+    def edit_node_text(self):
+        if not self.selected_node:
+            messagebox.showwarning("Warning", "Please select a node first!")
+            return
+        new_text = simpledialog.askstring("Edit Text", "Enter new text:",
+                                          initialvalue=self.selected_node.text)
+        if new_text:
+            node = self.selected_node
+            self.record_change(NodeAttrDelta(node, "text", node.text, new_text))
+            self.set_node_attr(node, "text", new_text)
+
+    def change_node_color(self):
+        if not self.selection:
+            messagebox.showwarning("Warning", "Please select a node first!")
+            return
+        initial = self.selected_node.color if self.selected_node else None
+        color = colorchooser.askcolor(title="Choose node color", initialcolor=initial)[1]
+        if color:
+            nodes = list(self.selection)
+            self.record_change(RecolorDelta(nodes, color))
+            self.recolor_nodes(nodes, color)
+
+    def new_mindmap(self):
+        # The new map belongs to no file yet, so it must not end up in the
+        # journal of the map that was open.
+        if self.doc.op_log is not None:
+            self.doc.op_log.discard()
+            self.doc.op_log = None
+        self.current_file = None
+        self.doc.mark_saved(None)
+        old_roots = self.doc.root_nodes()
+        deltas = [DeleteSubtreeDelta(root) for root in old_roots]
+        for root in old_roots:
+            self.detach_subtree(root)
+        self.reset_canvas()
+        self.selected_node = None
+        deltas.append(AddSubtreeDelta(self.create_central_node()))
+        self.record_change(CompoundDelta(deltas))
+
+    def save_mindmap(self):
+        if not self.current_file:
+            self.save_as_mindmap()
+            return
+        file_path = self.current_file
+        save_format = self.save_format.get()
+        if (len(self.doc) < self.BACKGROUND_SAVE_NODES or
+                self.doc.saves_incrementally(file_path, save_format)):
+            self.doc.save(file_path, save_format)
+            self.add_to_recent(file_path)
+            self.start_op_log()
+            return
+        name = os.path.basename(file_path)
+
+        def work(job):
+            def progress(written):
+                job.check()
+                job.report(f"Saving {name}... {written / 1e6:.1f} MB written")
+            self.doc.save(file_path, save_format, progress)
+
+        def done(result, dialog):
+            dialog.close()
+            self.add_to_recent(file_path)
+            self.start_op_log()
+
+        self.start_job("Saving", work, done, commits=True)
+
+    def start_op_log(self, log=None):
+        # Every edit from here on is appended to <file>.journal, so an
+        # autosave costs the size of the edit rather than a full rewrite.
+        # log, when given, is a recovered journal to continue.
+        self.stop_op_log()
+        if not self.autosave.get() or not self.current_file:
+            return
+        if log is None:
+            log = OperationLog(self.current_file)
+            log.start()
+        self.doc.op_log = log
+
+    def stop_op_log(self):
+        if self.doc.op_log is not None:
+            self.doc.op_log.close()
+            self.doc.op_log = None
+
+    def toggle_autosave(self):
+        if not self.autosave.get():
+            self.stop_op_log()
+        elif self.current_file:
+            # Edits made while autosave was off are not in any journal, so
+            # the journal has to restart from a full save.
+            self.save_mindmap()
+
+    def recover_op_log(self, file_path):
+        log = OperationLog(file_path)
+        changes = log.recover()
+        if not changes:
+            self.start_op_log()
+            return
+        if messagebox.askyesno("Recover Changes", f"{os.path.basename(file_path)} has {len(changes)} "
+                               "autosaved changes that were never saved to the file. Recover them?"):
+            applied = 0
+            try:
+                for ops in changes:
+                    apply_ops(self, self.doc, ops)
+                    applied += 1
+            except (KeyError, ValueError, TypeError) as e:
+                messagebox.showerror("Error", f"Recovered {applied} of {len(changes)} changes; "
+                                              f"the rest could not be applied:\n{e!r}")
+                self.save_mindmap()
+                return
+            if self.autosave.get():
+                log.resume(len(changes))
+                self.start_op_log(log)
+        else:
+            log.discard()
+            self.start_op_log()
+
+    def sync_op_log(self):
+        log = self.doc.op_log
+        if log is not None:
+            log.sync()
+            if not self.compacting and log.needs_compaction():
+                self.compact_op_log(log)
+        self.root.after(self.JOURNAL_SYNC_MS, self.sync_op_log)
+
+    def compact_op_log(self, log):
+        # Folds the journal into a new snapshot on a worker thread. The
+        # worker rebuilds the map from the old snapshot and the journal,
+        # never from the document being edited, and edits made meanwhile
+        # are carried over into the next journal.
+        end = log.size()
+        save_format = self.save_format.get()
+        self.compacting = True
+
+        def done(result):
+            self.compacting = False
+            temp_path, signature = result
+            if self.doc.op_log is not log:
+                os.remove(temp_path)
+                return
+            try:
+                self.doc.release_path(log.map_path)
+                log.rotate(temp_path, signature, end)
+            except StaleJournal:
+                stale()
+            except OSError:
+                # The journal stays as it was; compaction is not retried.
+                log.compaction_failed = True
+
+        def failed(error):
+            self.compacting = False
+            log.compaction_failed = True
+            if isinstance(error, StaleJournal):
+                stale()
+
+        def stale():
+            # The journal does not describe the file on disk any more, so
+            # the map is saved from the document instead, which also starts
+            # a fresh journal.
+            log.compaction_failed = True
+            if self.doc.op_log is log:
+                self.save_mindmap()
+
+        BackgroundJob(self.root, lambda job: compact_snapshot(log.map_path, log.path, end, save_format),
+                      done, failed)
+
+    def exit_app(self):
+        self.stop_op_log()
+        self.root.quit()
+
+    def start_job(self, title, work, done, commits=False):
+        # The dialog runs the event loop while it appears, so Cancel can be
+        # clicked before the job is created.
+        cancelled = threading.Event()
+        dialog = ProgressDialog(self.root, title, cancelled.set)
+
+        def failed(error):
+            dialog.close()
+            if error is not None:
+                messagebox.showerror("Error", f"{title} failed:\n{error}")
+
+        return BackgroundJob(self.root, work, lambda result: done(result, dialog), failed,
+                             dialog.update, commits=commits, cancelled=cancelled)
+
+    def save_as_mindmap(self):
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        self.current_file = file_path
+        self.save_mindmap()
+
+    def load_mindmap_lazy(self):
+        file_path = filedialog.askopenfilename(
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        if is_chunked_file(file_path):
+            self.open_file(file_path)
+            return
+        if os.path.getsize(file_path) < self.BACKGROUND_LOAD_BYTES:
+            self.open_lazy_source(file_path, LazyMapSource(file_path))
+            return
+        name = os.path.basename(file_path)
+
+        def work(job):
+            # Indexing cannot stop halfway; a cancelled index is discarded.
+            job.report(f"Indexing {name}...")
+            return LazyMapSource(file_path)
+
+        def done(source, dialog):
+            dialog.close()
+            self.open_lazy_source(file_path, source)
+
+        self.start_job("Opening", work, done)
+
+    def open_lazy_source(self, file_path, source):
+        # Recovering journaled edits needs the whole map in memory.
+        if source.flat or OperationLog(file_path).recover():
+            source.close()
+            self.open_file(file_path)
+            return
+        self.stop_op_log()
+        self.current_file = file_path
+        self.clear_map()
+        for root in self.doc.load_lazy(source):
+            for current in self.iter_visible(root):
+                self.index_node(current)
+        self.refresh_viewport()
+        self.add_to_recent(file_path)
+        self.start_op_log()
+
+    def clear_map(self):
+        self.reset_canvas()
+        self.doc.clear()
+        self.spatial_index.clear()
+        self.selected_node = None
+        self.selection = {}
+
+    def load_mindmap(self):
+        file_path = filedialog.askopenfilename(
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        self.open_file(file_path)
+
+    def add_to_recent(self, file_path):
+        if file_path not in self.recent_files:
+            self.recent_files.insert(0, file_path)
+        self.recent_files = self.recent_files[:5]
+
+    def open_recent_menu(self):
+        menu = tk.Menu(self.root, tearoff=0)
+        for file in self.recent_files:
+            menu.add_command(label=file, command=lambda f=file: self.load_recent_file(f))
+        try:
+            menu.tk_popup(self.root.winfo_pointerx(), self.root.winfo_pointery())
+        finally:
+            menu.grab_release()
+
+    def load_recent_file(self, file_path):
+        if not os.path.exists(file_path):
+            messagebox.showerror("Error", "File not found!")
+            return
+        self.open_file(file_path)
+
+    def open_file(self, file_path):
+        if os.path.getsize(file_path) < self.BACKGROUND_LOAD_BYTES:
+            data, chunks = read_map_file(file_path)
+            self.stop_op_log()
+            self.current_file = file_path
+            self.reconcile_nodes(data)
+            self.match_save_format(chunks)
+            self.doc.mark_saved(chunks)
+            self.doc.undo_journal.clear()
+            self.add_to_recent(file_path)
+            self.recover_op_log(file_path)
+            return
+        name = os.path.basename(file_path)
+
+        def work(job):
+            total = max(1, os.path.getsize(file_path))
+            raw = bytearray()
+            with open(file_path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                while True:
+                    job.check()
+                    chunk = f.read(self.READ_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    raw += chunk
+                    job.report(f"Reading {name}...", len(raw) / total)
+            job.report(f"Parsing {name}...")
+            data, segments = parse_map_bytes(raw)
+            job.check()
+            signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            return data, chunk_state(file_path, signature, segments)
+
+        def done(result, dialog):
+            # The canvas is updated in frame-sized batches so the window
+            # keeps repainting; past this point the load can no longer be
+            # cancelled.
+            dialog.disable_cancel()
+            self.stop_op_log()
+            self.current_file = file_path
+            data, chunks = result
+            steps = self.iter_reconcile(data)
+
+            def step():
+                deadline = time.perf_counter() + self.APPLY_FRAME_SECONDS
+                for fraction in steps:
+                    if time.perf_counter() >= deadline:
+                        if fraction is None:
+                            dialog.update(f"Preparing {name}...")
+                        else:
+                            dialog.update(f"Loading {name}... {fraction:.0%}", fraction)
+                        self.frames.request("load", step)
+                        return
+                self.match_save_format(chunks)
+                self.doc.mark_saved(chunks)
+                self.doc.undo_journal.clear()
+                self.add_to_recent(file_path)
+                dialog.close()
+                self.recover_op_log(file_path)
+
+            step()
+
+        self.start_job("Opening", work, done)
+
+    def match_save_format(self, chunks):
+        # Saves and compactions write the format picked in the menu, so a
+        # chunked file keeps getting incremental saves only if the menu
+        # follows the file that was opened.
+        if chunks is not None:
+            self.save_format.set("chunked")
+        elif self.save_format.get() == "chunked":
+            self.save_format.set("indented")
+
+    def import_outline(self):
+        file_path = filedialog.askopenfilename(
+            filetypes=[("Outlines", "*.md *.markdown *.opml *.xml *.txt"), ("Markdown files", "*.md *.markdown"),
+                       ("OPML files", "*.opml"), ("Text files", "*.txt"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        name = os.path.basename(file_path)
+        parent = self.selected_node
+        if parent is None:
+            roots = self.doc.root_nodes()
+            parent = roots[0] if roots else None
+        if parent is not None and hides_children(parent):
+            self.expand_node(parent)
+        mode = self.layout_mode.get()
+        font = (self.font_family, self.FONT_SIZE)
+
+        def parse(job=None):
+            # Parsing and layout touch only the new, still detached nodes,
+            # so they can run on a worker thread.
+            total = max(1, os.path.getsize(file_path))
+
+            def report(read):
+                job.check()
+                job.report(f"Importing {name}...", read / total)
+            roots = read_outline(file_path, progress=report if job is not None else None)
+            if not roots:
+                return None
+            if len(roots) == 1:
+                branch = roots[0]
+            else:
+                branch = MindMapNode(os.path.splitext(name)[0], 0, 0)
+                for root in roots:
+                    root.parent = branch
+                branch.children = roots
+            chars = set()
+            for node in iter_subtree(branch):
+                chars.update(node.text)
+            return branch, chars
+
+        def place(branch):
+            # The free slot depends on the spatial index and on the size of
+            # the branch's root, so this runs on the Tk thread.
+            branch.parent = parent
+            if parent is None:
+                branch.x, branch.y = self.to_world(self.canvas.canvasx(self.canvas.winfo_width() // 2),
+                                                   self.canvas.canvasy(self.canvas.winfo_height() // 2))
+                return
+            if parent.parent is not None:
+                angle = math.atan2(parent.y - parent.parent.y, parent.x - parent.parent.x)
+            else:
+                angle = math.radians((len(parent.children) * 60) % 360)
+            branch.x, branch.y = find_free_slot(self.spatial_index, parent, angle, self.node_extent(branch))
+
+        def lay_out(branch, job=None):
+            if job is not None:
+                job.report(f"Laying out {name}...")
+            for node, (node_x, node_y) in layout_positions(branch, mode, self.node_extent).items():
+                node.x, node.y = node_x, node_y
+            return branch
+
+        if os.path.getsize(file_path) < self.BACKGROUND_LOAD_BYTES:
+            try:
+                parsed = parse()
+            except (OSError, ParseError) as e:
+                messagebox.showerror("Error", f"Importing failed:\n{e}")
+                return
+            if parsed is None:
+                self.add_outline(None, parent, name)
+                return
+            place(parsed[0])
+            self.add_outline(lay_out(parsed[0]), parent, name)
+            return
+
+        def laid_out(branch, dialog):
+            dialog.close()
+            self.add_outline(branch, parent, name)
+
+        def done(parsed, dialog):
+            dialog.close()
+            if parsed is None:
+                self.add_outline(None, parent, name)
+                return
+            branch, chars = parsed
+            place(branch)
+            # The layout sizes every label on the worker thread, which must
+            # not call into Tk, so the outline's characters are measured
+            # here first.
+            self.text_metrics.prime(font, chars)
+            self.start_job("Importing", lambda job: lay_out(branch, job), laid_out)
+
+        self.start_job("Importing", parse, done)
+
+    def add_outline(self, branch, parent, name):
+        if branch is None:
+            messagebox.showinfo("Import", f"No outline items found in {name}.")
+            return
+        # The branch goes into the model and the spatial index in one pass
+        # and is drawn by a single viewport refresh.
+        self.doc.attach_subtree(branch, parent)
+        for node in self.iter_visible(branch):
+            self.index_node(node)
+        self.record_change(AddSubtreeDelta(branch))
+        self.set_selection([branch])
+        self.scroll_to(branch.x, branch.y)
+
+    def export_as_png(self):
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".png",
+            filetypes=[("PNG files", "*.png"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        scale = simpledialog.askfloat("Export as PNG", "Scale (1.0 = 100%):", initialvalue=1.0,
+                                      minvalue=0.05, maxvalue=20.0)
+        if not scale:
+            return
+        try:
+            width, height = write_png(file_path, self.doc.root_nodes(), scale=scale)
+        except ImportError:
+            messagebox.showerror("Error", "Please install Pillow:\npip install Pillow")
+            return
+        messagebox.showinfo("Exported", f"Mind map exported as {file_path} ({width}x{height})")
+
+    def export_as_svg(self):
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".svg",
+            filetypes=[("SVG files", "*.svg"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        with open(file_path, "w", encoding="utf-8") as f:
+            write_svg(f, self.doc.root_nodes())
+        messagebox.showinfo("Exported", f"Mind map exported as {file_path}")
+
+    def reconcile_nodes(self, data):
+        for _ in self.iter_reconcile(data):
+            pass
+
+    def iter_reconcile(self, data):
+        # Yields every APPLY_BATCH nodes so callers can spread the work over
+        # several frames: None while the file is scanned, then the fraction
+        # of nodes applied.
+        batch = self.APPLY_BATCH
+        target = {}
+        order = []
+        uid_of = {}
+        base = fallback_uid_base(data)
+        for i, (key, parent_key, node_data) in enumerate(iter_node_records(data)):
+            uid = node_data.get("id")
+            if uid is None or uid in target:
+                uid = base + i
+            uid_of[key] = uid
+            target[uid] = (node_data, uid_of.get(parent_key))
+            order.append(uid)
+            if len(order) % batch == 0:
+                yield None
+
+        existing = self.doc.nodes
+        removed = [uid for uid in existing if uid not in target]
+        for start in range(0, len(removed), batch):
+            self.forget_nodes([existing.pop(uid) for uid in removed[start:start + batch]])
+            yield None
+
+        moved = set()
+        nodes = []
+        total = len(order)
+        for i, uid in enumerate(order):
+            if i % batch == 0:
+                yield i / total
+            node_data, parent_uid = target[uid]
+            parent = existing[parent_uid] if parent_uid is not None else None
+            text = node_data["text"]
+            x, y = node_data["x"], node_data["y"]
+            color = node_data.get("color", "lightblue")
+            collapsed = bool(node_data.get("collapsed"))
+            layer = load_layer(node_data)
+            node = existing.get(uid)
+            if node is None:
+                node = MindMapNode(text, x, y, parent, color, uid)
+                node.collapsed = collapsed
+                node.layer = layer
+                existing[uid] = node
+                moved.add(uid)
+            else:
+                dashed = hides_children(node)
+                node.children = []
+                node.lazy = None
+                node.layer = layer
+                reparented = node.parent is not parent
+                node.parent = parent
+                drawn = node.id is not None
+                shown = node in self.spatial_index
+                if node.text != text:
+                    resized = self.label_extent(node.text) != self.label_extent(text)
+                    node.text = text
+                    if resized:
+                        self.resize_node(node)
+                        moved.add(uid)
+                    elif node.text_id is not None:
+                        self.canvas.itemconfig(node.text_id, text=text)
+                if node.color != color:
+                    node.color = color
+                    if drawn:
+                        self.canvas.itemconfig(node.id, fill=color)
+                node.collapsed = collapsed
+                if drawn and dashed != collapsed:
+                    self.canvas.itemconfig(node.id, dash=(4, 2) if collapsed else "")
+                if (node.x, node.y) != (x, y):
+                    if drawn:
+                        self.canvas.move(node.id, (x - node.x) * self.zoom, (y - node.y) * self.zoom)
+                    if node.text_id is not None:
+                        self.canvas.move(node.text_id, (x - node.x) * self.zoom, (y - node.y) * self.zoom)
+                    node.x, node.y = x, y
+                    if shown:
+                        self.index_node(node)
+                    moved.add(uid)
+                if drawn and (reparented or uid in moved or parent_uid in moved):
+                    self.update_connector(node)
+            if parent is not None:
+                parent.children.append(node)
+            if not self.is_visible_child(node):
+                self.hide_node(node)
+            elif node not in self.spatial_index:
+                self.index_node(node)
+            nodes.append(node)
+        self.doc.nodes = {node.uid: node for node in nodes}
+        self.doc.release_lazy_source()
+        self.doc.reindex()
+        self.refresh_viewport()
+        if self.selected_node is not None and self.selected_node not in self.spatial_index:
+            self.selected_node = None
+
+    def update_connector(self, node):
+        if node.parent is None:
+            if node.connector_id:
+                self.release_item("line", node.connector_id)
+                node.connector_id = None
+            return
+        if node.connector_id:
+            self.canvas.coords(node.connector_id, *self.connector_coords(node))
+        else:
+            node.connector_id = self.acquire_item(
+                "line", *self.connector_coords(node), **self.connector_options(node)
+            )
+
+    def center_view_on_node(self):
+        if not self.selected_node:
+            messagebox.showwarning("Warning", "Please select a node first!")
+            return
+        self.scroll_to(self.selected_node.x, self.selected_node.y)
+
+    def record_change(self, delta):
+        self.doc.record_change(delta)
+
+    def undo(self):
+        self.doc.undo(self)
+
+    def redo(self):
+        self.doc.redo(self)
+
+    def start_timer(self):
+        if not self.timer_running:
+            self.timer_running = True
+            self.update_timer()
+
+    def stop_timer(self):
+        self.timer_running = False
+        if self.timer_handle is not None:
+            self.root.after_cancel(self.timer_handle)
+            self.timer_handle = None
+
+    def reset_timer(self):
+        self.stop_timer()
+        self.timer_seconds = 0
+        self.show_timer()
+
+    def setup_timer_canvas(self):
+        self.timer_canvas = tk.Canvas(self.root, width=160, height=36, bg="white", highlightthickness=0)
+        self.timer_canvas.pack(side=tk.TOP, anchor="w", padx=5, pady=2)
+        self.bubbles = BubbleAnimation(self.timer_canvas)
+
+    def show_timer(self):
+        h = self.timer_seconds // 3600
+        m = (self.timer_seconds % 3600) // 60
+        s = self.timer_seconds % 60
+        self.timer_label.config(text=f"Timer: {h:02d}:{m:02d}:{s:02d}")
+        self.bubbles.set_text(f"{h:02d}:{m:02d}:{s:02d}")
+
+    def update_timer(self):
+        self.timer_seconds += 1
+        self.show_timer()
+        self.bubbles.add()
+        self.timer_handle = self.root.after(1000, self.update_timer)
+
+    def show_nn_info(self):
+        messagebox.showinfo("Neural Networks", "Neural networks are a set of algorithms, modeled loosely after the human brain, that are designed to recognize patterns.")
+
+    def add_nn_network(self):
+        if not self.selected_node:
+            messagebox.showwarning("Warning", "Please select a node first!")
+            return
+        try:
+            import mindmap_nn
+        except ImportError:
+            messagebox.showerror("Error", "Please install NumPy:\npip install numpy")
+            return
+        sizes_str = simpledialog.askstring(
+            "Neural Network", "Enter the layer sizes, inputs first (comma separated):\nExample: 3, 4, 2")
+        if not sizes_str:
+            return
+        try:
+            sizes = [int(size) for size in sizes_str.split(",") if size.strip()]
+            if len(sizes) < 2 or min(sizes) < 1:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Error", "Enter at least two positive layer sizes.")
+            return
+        activation = simpledialog.askstring(
+            "Neural Network", "Activation (" + ", ".join(mindmap_nn.ACTIVATIONS) + "):", initialvalue="relu")
+        if activation not in mindmap_nn.ACTIVATIONS:
+            if activation:
+                messagebox.showerror("Error", f"Unknown activation {activation!r}.")
+            return
+        by_hand = messagebox.askyesno(
+            "Neural Network", "Enter the weights and biases by hand?\nChoose No to initialize them randomly.")
+
+        layers = []
+        for k, (inputs, outputs) in enumerate(zip(sizes, sizes[1:]), 1):
+            if not by_hand:
+                layers.append(mindmap_nn.random_layer(inputs, outputs, activation))
+                continue
+            weights_str = simpledialog.askstring(
+                "Layer Weights",
+                f"Enter the weights for layer {k}: one row of {inputs} per neuron, {outputs} rows separated by ';':"
+                f"\nExample: 0.5,0.2,0.1; -0.3,0.7,0.8"
+            )
+            bias_str = simpledialog.askstring(
+                "Layer Bias",
+                f"Enter the {outputs} biases for layer {k} (comma separated):\nExample: 0.1, -0.2, 0.3"
+            )
+            if not weights_str or not bias_str:
+                return
+            try:
+                layers.append(mindmap_nn.DenseLayer(
+                    mindmap_nn.parse_matrix(weights_str, outputs, inputs),
+                    mindmap_nn.parse_vector(bias_str, outputs), activation))
+            except ValueError as e:
+                messagebox.showerror("Error", f"Invalid weights or biases for layer {k}: {e}")
+                return
+
+        parent = self.selected_node
+        if hides_children(parent):
+            self.expand_node(parent)
+        head = mindmap_nn.build_network(parent, layers, parent.x + mindmap_nn.COLUMN_GAP, parent.y)
+        self.attach_subtree(head, parent)
+        self.record_change(AddSubtreeDelta(head))
+        self.scroll_to(head.x, head.y)
+
+    def run_forward_pass(self):
+        if not self.selected_node:
+            messagebox.showwarning("Warning", "Please select a node first!")
+            return
+        try:
+            import mindmap_nn
+        except ImportError:
+            messagebox.showerror("Error", "Please install NumPy:\npip install numpy")
+            return
+        network = mindmap_nn.find_network(self.selected_node)
+        if network is None:
+            messagebox.showwarning("Warning", "Please select a node of a neural network!")
+            return
+        head, layer_nodes = network
+        layers = [node.layer for node in layer_nodes]
+        inputs = layers[0].inputs
+        input_str = simpledialog.askstring(
+            "Forward Pass", f"Enter the {inputs} input values (comma separated);\na single value fills every input:")
+        if not input_str:
+            return
+        try:
+            values = mindmap_nn.parse_vector(input_str)
+            if values.size == 1:
+                values = values.repeat(inputs)
+            activations = mindmap_nn.forward_pass(layers, values)
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid input: {e}")
+            return
+
+        # Every neuron shows its activation under its name and is tinted by
+        # it; the whole pass is one undo step.
+        deltas = []
+        for column, column_values in zip([head] + layer_nodes, activations):
+            colors = mindmap_nn.activation_colors(column_values)
+            for node, value, color in zip(mindmap_nn.neurons(column), column_values.tolist(), colors):
+                name = node.text.split("\n", 1)[0]
+                for attr, new_value in (("text", f"{name}\n{value:.4g}"), ("color", color)):
+                    deltas.append(NodeAttrDelta(node, attr, getattr(node, attr), new_value))
+        self.record_change(CompoundDelta(deltas))
+        for delta in deltas:
+            self.set_node_attr(delta.node, delta.attr, delta.new_value)
+
+    def search_node(self):
+        query = simpledialog.askstring("Search Node", "Enter text to search for:")
+        if not query:
+            return
+        try:
+            found = self.doc.search(query, self.search_mode.get())
+        except re.error as e:
+            messagebox.showerror("Error", f"Invalid regular expression: {e}")
+            return
+        self.search_results = found
+        if found:
+            self.show_search_result(0)
+            messagebox.showinfo("Search", f"{len(found)} node(s) found and highlighted.")
+        else:
+            self.search_position = -1
+            self.highlight_matches(())
+            messagebox.showinfo("Search", "No node found with that text.")
+
+    def next_match(self):
+        if not self.search_results:
+            self.search_node()
+            return
+        self.show_search_result(self.search_position + 1)
+
+    def previous_match(self):
+        if not self.search_results:
+            self.search_node()
+            return
+        self.show_search_result(self.search_position - 1)
+
+    def show_search_result(self, position):
+        self.search_results = [node for node in self.search_results if self.doc.get(node.uid) is node]
+        results = self.search_results
+        if not results:
+            self.highlight_matches(())
+            return
+        position %= len(results)
+        self.search_position = position
+        # Only the page around the current result is highlighted, so a query
+        # matching most of a large map stays cheap.
+        start = position - position % self.SEARCH_PAGE_SIZE
+        self.highlight_matches(results[start:start + self.SEARCH_PAGE_SIZE])
+        node = results[position]
+        collapsed = []
+        parent = node.parent
+        while parent is not None:
+            if parent.collapsed:
+                collapsed.append(parent)
+            parent = parent.parent
+        for ancestor in reversed(collapsed):
+            self.expand_node(ancestor)
+        self.set_selection([node])
+        self.scroll_to(node.x, node.y)
+
+    def highlight_matches(self, nodes):
+        previous = self.search_matches
+        self.search_matches = set(nodes)
+        self.canvas.itemconfig("match", outline="black", width=2)
+        self.canvas.dtag("match")
+        for node in previous:
+            if node in self.selection and node.id is not None:
+                self.canvas.itemconfig(node.id, **self.node_outline(node))
+        for node in self.search_matches:
+            if node.id is not None:
+                self.canvas.addtag_withtag("match", node.id)
+        self.canvas.itemconfig("match", outline="red", width=4)
+
+if __name__ == "__main__":
+    root = tk.Tk()
+    app = MindMapApp(root)
+    root.mainloop()
+
@@ -0,0 +1,290 @@
+import argparse
+import importlib.util
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from mindmap_core import (
+    MindMapNode, MindMapDocument, drop_duplicate_roots, iter_node_records, read_map_file
+)
+
+# Command-line tools for working on many saved maps at once without opening
+# a window, e.g.
+#   python mindmap_batch.py validate maps/
+#   python mindmap_batch.py normalize -j 8 --out-dir fixed/ maps/*.json
+#   python mindmap_batch.py export --type png --max-size 512 --out-dir thumbs/ maps/
+# Files are spread over a process pool; each result is printed as soon as
+# its file is done and failures are summarized at the end.
+
+MAX_PROBLEMS = 5
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def layer_problem(layer):
+    if not isinstance(layer, dict):
+        return "\"layer\" is not an object"
+    weights, bias = layer.get("weights"), layer.get("bias")
+    if not isinstance(bias, list) or not all(is_number(value) for value in bias):
+        return "layer \"bias\" is not a list of numbers"
+    if not isinstance(weights, list) or len(weights) != len(bias):
+        return "layer needs one row of \"weights\" per bias"
+    width = len(weights[0]) if weights and isinstance(weights[0], list) else -1
+    for row in weights:
+        if not isinstance(row, list) or len(row) != width or not all(is_number(value) for value in row):
+            return "layer \"weights\" rows are not equal-length lists of numbers"
+    if not isinstance(layer.get("activation", "relu"), str):
+        return "non-string layer \"activation\""
+    return None
+
+def validate_data(data):
+    problems = []
+    if not isinstance(data, dict) or not isinstance(data.get("nodes"), list):
+        return ["top level must be an object with a \"nodes\" list"]
+    seen_ids = set()
+
+    def check_node(node_data, where):
+        if not isinstance(node_data, dict):
+            problems.append(f"{where}: node is not an object")
+            return False
+        if not isinstance(node_data.get("text"), str):
+            problems.append(f"{where}: missing or non-string \"text\"")
+        for key in ("x", "y"):
+            if not is_number(node_data.get(key)):
+                problems.append(f"{where}: missing or non-numeric \"{key}\"")
+        if not isinstance(node_data.get("color", ""), str):
+            problems.append(f"{where}: non-string \"color\"")
+        if not isinstance(node_data.get("collapsed", False), bool):
+            problems.append(f"{where}: non-boolean \"collapsed\"")
+        layer = node_data.get("layer")
+        if layer is not None:
+            problem = layer_problem(layer)
+            if problem:
+                problems.append(f"{where}: {problem}")
+        uid = node_data.get("id")
+        if uid is not None:
+            if not isinstance(uid, int) or isinstance(uid, bool):
+                problems.append(f"{where}: non-integer \"id\"")
+            elif uid in seen_ids:
+                problems.append(f"{where}: duplicate id {uid}")
+            else:
+                seen_ids.add(uid)
+        return True
+
+    if data.get("format") == "flat":
+        for i, node_data in enumerate(data["nodes"]):
+            where = f"nodes[{i}]"
+            if check_node(node_data, where):
+                if node_data.get("id") is None:
+                    problems.append(f"{where}: flat records need an \"id\"")
+                parent = node_data.get("parent")
+                if parent is not None and (parent not in seen_ids or parent == node_data.get("id")):
+                    problems.append(f"{where}: parent {parent!r} does not come before the node")
+            if len(problems) >= MAX_PROBLEMS:
+                break
+        return problems
+
+    stack = [(node_data, f"nodes[{i}]") for i, node_data in reversed(list(enumerate(data["nodes"])))]
+    while stack and len(problems) < MAX_PROBLEMS:
+        node_data, where = stack.pop()
+        if not check_node(node_data, where):
+            continue
+        children = node_data.get("children", [])
+        if not isinstance(children, list):
+            problems.append(f"{where}: \"children\" is not a list")
+            continue
+        for i in range(len(children) - 1, -1, -1):
+            stack.append((children[i], f"{where}.children[{i}]"))
+    return problems
+
+def read_map(path):
+    data, chunks = read_map_file(path)
+    problems = validate_data(data)
+    if problems:
+        raise ValueError("; ".join(problems[:MAX_PROBLEMS]))
+    return data
+
+def load_document(data):
+    # Ids only need to be unique within a file; starting every file at 1
+    # keeps the output independent of which worker handled it.
+    MindMapNode.next_uid = 1
+    doc = MindMapDocument()
+    doc.load_data(data)
+    return doc
+
+def map_stats(data):
+    depth = {}
+    child_count = {}
+    colors = set()
+    roots = collapsed = 0
+    for key, parent_key, node_data in iter_node_records(data):
+        if parent_key is None:
+            roots += 1
+            depth[key] = 0
+        else:
+            depth[key] = depth[parent_key] + 1
+            child_count[parent_key] = child_count.get(parent_key, 0) + 1
+        colors.add(node_data.get("color", "lightblue"))
+        if node_data.get("collapsed"):
+            collapsed += 1
+    return {
+        "nodes": len(depth),
+        "roots": roots,
+        "depth": max(depth.values(), default=-1) + 1,
+        "leaves": len(depth) - len(child_count),
+        "max_children": max(child_count.values(), default=0),
+        "collapsed": collapsed,
+        "colors": len(colors),
+    }
+
+def run_task(command, path, out_path, options):
+    if command == "compact":
+        # Only the whitespace changes; ids and structure are kept as they
+        # are. Chunked files come out as plain compact JSON.
+        data, chunks = read_map_file(path)
+        problems = validate_data(data)
+        if problems:
+            raise ValueError("; ".join(problems))
+        temp_path = out_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(temp_path, out_path)
+        return {"bytes": os.path.getsize(path), "compacted": os.path.getsize(out_path)}
+
+    data = read_map(path)
+    duplicates = drop_duplicate_roots(data)
+    if command == "validate":
+        result = {"nodes": sum(1 for _ in iter_node_records(data))}
+        if duplicates:
+            result["duplicate_roots"] = duplicates
+        return result
+    if command == "stats":
+        return dict(map_stats(data), bytes=os.path.getsize(path), duplicate_roots=duplicates)
+    doc = load_document(data)
+    if command == "normalize":
+        doc.save(out_path, options["format"])
+        return {"nodes": len(doc), "duplicate_roots": duplicates}
+    if command == "export":
+        from mindmap_export import write_png, write_svg
+        if options["type"] == "svg":
+            with open(out_path, "w", encoding="utf-8") as f:
+                write_svg(f, doc.root_nodes())
+            return {"nodes": len(doc)}
+        width, height = write_png(out_path, doc.root_nodes(), scale=options["scale"],
+                                  max_size=options["max_size"])
+        return {"nodes": len(doc), "size": f"{width}x{height}"}
+    raise ValueError(f"unknown command {command!r}")
+
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, subdirs, names in os.walk(path):
+                subdirs.sort()
+                files.extend(os.path.join(directory, name) for name in sorted(names)
+                             if name.endswith(".json"))
+        else:
+            files.append(path)
+    return files
+
+def output_paths(files, out_dir, extension):
+    # Mirrors the inputs' directory layout under out_dir, or writes next to
+    # each input when no out_dir is given.
+    if out_dir is None:
+        base = None
+    elif len(files) == 1:
+        base = os.path.dirname(os.path.abspath(files[0]))
+    else:
+        base = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in files])
+    outputs = []
+    for path in files:
+        if base is None:
+            out_path = path
+        else:
+            out_path = os.path.join(out_dir, os.path.relpath(os.path.abspath(path), base))
+        if extension:
+            out_path = os.path.splitext(out_path)[0] + extension
+        outputs.append(out_path)
+    return outputs
+
+def format_result(result):
+    return " ".join(f"{key}={value}" for key, value in result.items())
+
+def run_batch(command, files, out_paths, options, jobs, as_json=False, out=sys.stdout):
+    failures = []
+    total = len(files)
+
+    def report(done, path, result, error):
+        if as_json:
+            record = {"file": path, "ok": error is None}
+            record.update(result if error is None else {"error": error})
+            out.write(json.dumps(record) + "\n")
+        elif error is None:
+            out.write(f"[{done}/{total}] ok    {path}: {format_result(result)}\n")
+        else:
+            out.write(f"[{done}/{total}] FAIL  {path}: {error}\n")
+        out.flush()
+        if error is not None:
+            failures.append((path, error))
+
+    for out_path in set(out_paths) - set(files):
+        directory = os.path.dirname(out_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    if jobs == 1:
+        for done, (path, out_path) in enumerate(zip(files, out_paths), 1):
+            try:
+                result = run_task(command, path, out_path, options)
+            except Exception as e:
+                report(done, path, None, f"{type(e).__name__}: {e}")
+            else:
+                report(done, path, result, None)
+        return failures
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(run_task, command, path, out_path, options): path
+                   for path, out_path in zip(files, out_paths)}
+        for done, future in enumerate(as_completed(futures), 1):
+            error = future.exception()
+            if error is not None:
+                report(done, futures[future], None, f"{type(error).__name__}: {error}")
+            else:
+                report(done, futures[future], future.result(), None)
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate, normalize, compact, export or "
+                                                 "summarize many mind map files at once.")
+    parser.add_argument("command", choices=("validate", "normalize", "compact", "export", "stats"))
+    parser.add_argument("paths", nargs="+", help="map files, or directories to search for *.json")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--out-dir", help="write results here instead of next to (or over) the inputs")
+    parser.add_argument("--format", choices=("indented", "compact", "flat", "chunked"), default="indented",
+                        help="save format for normalize")
+    parser.add_argument("--type", choices=("png", "svg"), default="png", help="export file type")
+    parser.add_argument("--scale", type=float, default=1.0, help="PNG export scale")
+    parser.add_argument("--max-size", type=int, help="fit PNG exports into this many pixels")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per file")
+    args = parser.parse_args(argv)
+
+    if args.command == "export" and args.type == "png" and importlib.util.find_spec("PIL") is None:
+        print("Please install Pillow:\npip install Pillow", file=sys.stderr)
+        return 2
+    files = collect_files(args.paths)
+    if not files:
+        print("No map files found.", file=sys.stderr)
+        return 2
+    writes = args.command in ("normalize", "compact", "export")
+    extension = "." + args.type if args.command == "export" else None
+    out_paths = output_paths(files, args.out_dir if writes else None, extension)
+    options = {"format": args.format, "type": args.type, "scale": args.scale,
+               "max_size": args.max_size}
+    failures = run_batch(args.command, files, out_paths, options, max(1, args.jobs), args.json)
+
+    print(f"{len(files)} files, {len(failures)} failed", file=sys.stderr)
+    for path, error in failures:
+        print(f"  {path}: {error}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from mindmap_core import (
+    MindMapNode, MindMapDocument, SpatialGrid, iter_subtree, index_nodes, read_map_file, write_map,
+    RecolorDelta, DeleteSubtreeDelta
+)
+from mindmap_layout import NODE_WIDTH, NODE_HEIGHT, fixed_extent
+
+# Synthetic maps and timings for the editor's hot paths, e.g.
+#   python mindmap_bench.py generate --nodes 100000 --fanout 8 big.json
+#   python mindmap_bench.py run --sizes 1000,10000,100000,1000000 --json > bench.jsonl
+#   python mindmap_bench.py run --app --sizes 1000,10000
+# By default the document model is timed without a window; --app drives a
+# hidden editor window instead, so canvas work is included. Every timing
+# is one line of output, or one JSON object per line with --json, so runs
+# can be compared to catch regressions.
+
+SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "ta", "shi", "vo", "be", "da", "fe", "go", "zu", "pi", "wa", "xe")
+RING_GAP = 240
+DEFAULT_SIZES = (1000, 10000, 100000)
+SAVE_FORMATS = ("indented", "compact", "flat", "chunked")
+SEARCHES = (("substring", "kalo"), ("prefix", "shi"), ("regex", r"\bta\w*mi\b"))
+HIT_TESTS = 1000
+DRAG_STEPS = 20
+
+def random_label(rng, length):
+    words = []
+    size = -1
+    while size < length:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4)))
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:length].rstrip()
+
+def depth_for(nodes, fanout):
+    # The smallest depth at which a full tree of this fan-out has at least
+    # the given number of nodes.
+    depth = 0
+    total = level = 1
+    while total < nodes:
+        if fanout < 2:
+            return nodes - 1
+        level *= fanout
+        total += level
+        depth += 1
+    return depth
+
+def generate_map(depth, fanout, text_length=16, max_nodes=None, seed=0):
+    # Builds a detached tree level by level: every node gets fanout
+    # children until depth levels exist or max_nodes nodes are made. Each
+    # level sits on its own ring, wide enough that its nodes do not overlap.
+    rng = random.Random(seed)
+    root = MindMapNode(random_label(rng, text_length), 0, 0)
+    level = [root]
+    count = 1
+    radius = 0
+    for _ in range(depth):
+        size = len(level) * fanout
+        if max_nodes is not None:
+            size = min(size, max_nodes - count)
+        if size <= 0:
+            break
+        radius = max(radius + RING_GAP, size * NODE_WIDTH * 1.2 / (2 * math.pi))
+        next_level = []
+        for i in range(size):
+            parent = level[i // fanout]
+            angle = 2 * math.pi * (i + 0.5) / size
+            node = MindMapNode(random_label(rng, text_length), radius * math.cos(angle),
+                               radius * math.sin(angle), parent)
+            parent.children.append(node)
+            next_level.append(node)
+        count += size
+        level = next_level
+    return root
+
+def find_hub(roots):
+    # The child of a root with the largest branch: dragging or deleting it
+    # touches as much of the map as any single interactive edit does.
+    children = [child for root in roots for child in root.children]
+    return max(children, key=lambda child: sum(1 for _ in iter_subtree(child)), default=None)
+
+def hit_points(nodes, count, seed):
+    rng = random.Random(seed)
+    sample = rng.sample(nodes, min(count, len(nodes)))
+    return [(node.x + rng.uniform(-NODE_WIDTH / 4, NODE_WIDTH / 4),
+             node.y + rng.uniform(-NODE_HEIGHT / 4, NODE_HEIGHT / 4)) for node in sample]
+
+def document_benchmarks(path, workdir, seed):
+    # Yields (name, operations per run, run, setup, teardown) for the
+    # document model, with the editor's hit index built on fixed-size nodes.
+    doc = MindMapDocument()
+    doc.load(path)
+    yield "load", 1, lambda: doc.load(path), None, None
+
+    for save_format in SAVE_FORMATS:
+        out_path = os.path.join(workdir, "save." + save_format)
+        yield (f"save_{save_format}", 1, lambda f=save_format, p=out_path: doc.save(p, f),
+               lambda p=out_path: os.path.exists(p) and os.remove(p), None)
+
+    nodes = list(doc)
+    hub = find_hub(doc.root_nodes())
+    branch = list(iter_subtree(hub))
+    grid = SpatialGrid()
+    index_nodes(grid, nodes, fixed_extent)
+
+    def record_undo():
+        doc.record_change(RecolorDelta(branch, "#ffcc00"))
+        doc.recolor_nodes(branch, "#ffcc00")
+        doc.undo()
+
+    yield "record_undo", 1, record_undo, None, None
+
+    points = hit_points(nodes, HIT_TESTS, seed)
+
+    def hit_test():
+        for x, y in points:
+            grid.nearest(x, y)
+
+    yield "find_node_at_position", len(points), hit_test, None, None
+
+    for mode, query in SEARCHES:
+        yield f"search_{mode}", 1, lambda m=mode, q=query: doc.search(q, m), None, None
+
+    def drag(dx, dy):
+        doc.translate_nodes(branch, dx, dy)
+        index_nodes(grid, branch, fixed_extent)
+
+    yield "drag_hub", 1, lambda: drag(40, 25), None, lambda: drag(-40, -25)
+
+    def delete():
+        index = doc.detach_subtree(hub)
+        for node in branch:
+            grid.remove(node)
+        doc.record_change(DeleteSubtreeDelta(hub, index))
+
+    def restore():
+        doc.undo()
+        index_nodes(grid, branch, fixed_extent)
+
+    yield "delete_node", 1, delete, None, restore
+
+def app_benchmarks(path, workdir, seed):
+    # The same operations through a hidden editor window, pumping the Tk
+    # event loop after each so scheduled redraws are part of the timing.
+    import tkinter as tk
+    from mindmap import MindMapApp
+    root = tk.Tk()
+    root.withdraw()
+    app = MindMapApp(root)
+    root.update()
+
+    def pump(run):
+        def timed():
+            run()
+            root.update()
+        return timed
+
+    def load():
+        data, chunks = read_map_file(path)
+        app.reconcile_nodes(data)
+
+    try:
+        load()
+        yield "load", 1, pump(load), app.clear_map, None
+
+        for save_format in SAVE_FORMATS:
+            out_path = os.path.join(workdir, "save." + save_format)
+            yield (f"save_{save_format}", 1, lambda f=save_format, p=out_path: app.doc.save(p, f),
+                   lambda p=out_path: os.path.exists(p) and os.remove(p), None)
+
+        nodes = list(app.doc)
+        hub = find_hub(app.doc.root_nodes())
+        branch = list(iter_subtree(hub))
+
+        def record_undo():
+            app.record_change(RecolorDelta(branch, "#ffcc00"))
+            app.recolor_nodes(branch, "#ffcc00")
+            app.undo()
+
+        yield "record_undo", 1, pump(record_undo), None, None
+
+        points = hit_points([node for node in nodes if node in app.spatial_index], HIT_TESTS, seed)
+
+        def hit_test():
+            for x, y in points:
+                app.find_node_at_position(x, y)
+
+        yield "find_node_at_position", len(points), hit_test, None, None
+
+        def search(mode, query):
+            app.search_results = app.doc.search(query, mode)
+            if app.search_results:
+                app.show_search_result(0)
+
+        for mode, query in SEARCHES:
+            yield f"search_{mode}", 1, pump(lambda m=mode, q=query: search(m, q)), None, None
+
+        def event_at(x, y):
+            cx, cy = app.to_canvas(x, y)
+            return SimpleNamespace(x=cx - app.canvas.canvasx(0), y=cy - app.canvas.canvasy(0), state=0)
+
+        def drag():
+            x, y = hub.x, hub.y
+            app.on_click(event_at(x, y))
+            for step in range(1, DRAG_STEPS + 1):
+                app.on_drag(event_at(x + 2 * step, y + step))
+                app.frames.flush("drag")
+            app.on_release(event_at(x + 2 * DRAG_STEPS, y + DRAG_STEPS))
+
+        def show_hub():
+            app.scroll_to(hub.x, hub.y)
+            root.update()
+
+        yield "drag_hub", 1, pump(drag), show_hub, app.undo
+
+        def delete():
+            app.set_selection([hub])
+            app.delete_node()
+
+        yield "delete_node", 1, pump(delete), None, lambda: (app.undo(), root.update())
+    finally:
+        app.stop_op_log()
+        root.destroy()
+
+def time_runs(run, repeat, setup=None, teardown=None):
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+        if teardown is not None:
+            teardown()
+    return times
+
+def run_suite(sizes, fanout, text_length, repeat, seed, app=False, only=None, as_json=False, out=sys.stdout):
+    benchmarks = app_benchmarks if app else document_benchmarks
+    workdir = tempfile.mkdtemp(prefix="mindmap-bench-")
+    results = []
+    try:
+        for size in sizes:
+            depth = depth_for(size, fanout)
+            path = os.path.join(workdir, f"map-{size}.json")
+            write_map(path, [generate_map(depth, fanout, text_length, size, seed)], "compact")
+            for name, ops, run, setup, teardown in benchmarks(path, workdir, seed):
+                if only and not any(name.startswith(prefix) for prefix in only):
+                    continue
+                times = time_runs(run, repeat, setup, teardown)
+                result = {
+                    "benchmark": name, "target": "app" if app else "document", "nodes": size,
+                    "depth": depth, "fanout": fanout, "text_length": text_length, "ops": ops,
+                    "repeat": repeat, "min_s": min(times), "median_s": statistics.median(times),
+                    "mean_s": statistics.fmean(times), "max_s": max(times),
+                }
+                results.append(result)
+                if as_json:
+                    out.write(json.dumps(result) + "\n")
+                else:
+                    per_op = result["median_s"] / ops * 1000
+                    out.write(f"{size:>9} {name:<22} median {result['median_s'] * 1000:10.2f} ms"
+                              f"  min {result['min_s'] * 1000:10.2f} ms  ({per_op:.4f} ms/op)\n")
+                out.flush()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def parse_sizes(text):
+    sizes = [int(size) for size in text.split(",") if size.strip()]
+    if not sizes or min(sizes) < 2:
+        raise argparse.ArgumentTypeError("sizes must be whole numbers of at least 2")
+    return sizes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic mind maps and time the editor's "
+                                                 "hot paths on them.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate = commands.add_parser("generate", help="write a synthetic map file")
+    generate.add_argument("path")
+    generate.add_argument("--nodes", type=int, help="stop after this many nodes")
+    generate.add_argument("--depth", type=int, help="levels below the root (default: enough for --nodes)")
+    run = commands.add_parser("run", help="time load, save, undo, hit-testing, search, drag and delete")
+    run.add_argument("--sizes", type=parse_sizes, default=list(DEFAULT_SIZES),
+                     help="comma-separated map sizes in nodes (default: 1000,10000,100000)")
+    run.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark")
+    run.add_argument("--only", help="comma-separated benchmark names or name prefixes to run")
+    run.add_argument("--app", action="store_true", help="time a hidden editor window (needs a display)")
+    run.add_argument("--json", action="store_true", help="print one JSON object per timing")
+    for command in (generate, run):
+        command.add_argument("--fanout", type=int, default=8, help="children per node")
+        command.add_argument("--text-length", type=int, default=16, help="characters per label")
+        command.add_argument("--seed", type=int, default=0)
+    generate.add_argument("--format", choices=SAVE_FORMATS, default="compact")
+    args = parser.parse_args(argv)
+
+    if args.fanout < 1 or args.text_length < 1:
+        parser.error("--fanout and --text-length must be at least 1")
+    if args.command == "generate":
+        if args.nodes is None and args.depth is None:
+            parser.error("generate needs --nodes or --depth")
+        depth = args.depth if args.depth is not None else depth_for(args.nodes, args.fanout)
+        root = generate_map(depth, args.fanout, args.text_length, args.nodes, args.seed)
+        write_map(args.path, [root], args.format)
+        print(f"{sum(1 for _ in iter_subtree(root))} nodes, depth {depth}", file=sys.stderr)
+        return 0
+    if args.app:
+        try:
+            import tkinter
+        except ImportError:
+            print("--app needs tkinter", file=sys.stderr)
+            return 2
+        try:
+            tkinter.Tk().destroy()
+        except tkinter.TclError as e:
+            print(f"--app needs a display: {e}", file=sys.stderr)
+            return 2
+    only = [name.strip() for name in args.only.split(",")] if args.only else None
+    run_suite(args.sizes, args.fanout, args.text_length, max(1, args.repeat), args.seed,
+              args.app, only, args.json)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
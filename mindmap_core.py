@@ -0,0 +1,1458 @@
+import json
+import os
+import re
+import sys
+import mmap
+import shutil
+from array import array
+from collections import deque
+
+class MindMapNode:
+    # Maps can hold millions of nodes, so nodes carry no per-instance
+    # __dict__ and share one string object per distinct color.
+    __slots__ = ("uid", "text", "x", "y", "parent", "children", "id", "text_id",
+                 "connector_id", "color", "collapsed", "lazy", "layer")
+    next_uid = 1
+
+    def __init__(self, text, x, y, parent=None, color="lightblue", uid=None):
+        if uid is None:
+            uid = MindMapNode.next_uid
+        if uid >= MindMapNode.next_uid:
+            MindMapNode.next_uid = uid + 1
+        self.uid = uid
+        self.text = text
+        self.x = x
+        self.y = y
+        self.parent = parent
+        self.children = []
+        self.id = None
+        self.text_id = None
+        self.connector_id = None
+        self.color = sys.intern(color)
+        self.collapsed = False
+        self.lazy = None
+        self.layer = None
+
+class SpatialGrid:
+    def __init__(self, cell_size=128):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.bounds = {}
+
+    def __len__(self):
+        return len(self.bounds)
+
+    def __contains__(self, item):
+        return item in self.bounds
+
+    def _cell_range(self, x0, y0, x1, y1):
+        size = self.cell_size
+        return int(x0 // size), int(y0 // size), int(x1 // size), int(y1 // size)
+
+    def insert(self, item, x0, y0, x1, y1):
+        old = self.bounds.get(item)
+        self.bounds[item] = (x0, y0, x1, y1)
+        new_range = self._cell_range(x0, y0, x1, y1)
+        if old is not None:
+            old_range = self._cell_range(*old)
+            if old_range == new_range:
+                return
+            self._unlink(item, old_range)
+        cx0, cy0, cx1, cy1 = new_range
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = self.cells.get((cx, cy))
+                if cell is None:
+                    cell = self.cells[(cx, cy)] = {}
+                cell[item] = None
+
+    # Moving an item is the same operation as inserting it again; only the
+    # cells it enters or leaves are touched.
+    update = insert
+
+    def remove(self, item):
+        old = self.bounds.pop(item, None)
+        if old is not None:
+            self._unlink(item, self._cell_range(*old))
+
+    def _unlink(self, item, cell_range):
+        cx0, cy0, cx1, cy1 = cell_range
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = self.cells.get((cx, cy))
+                if cell is not None:
+                    cell.pop(item, None)
+                    if not cell:
+                        del self.cells[(cx, cy)]
+
+    def clear(self):
+        self.cells.clear()
+        self.bounds.clear()
+
+    def cell_counts(self, x0, y0, x1, y1):
+        cx0, cy0, cx1, cy1 = self._cell_range(x0, y0, x1, y1)
+        for (cx, cy), cell in self.cells.items():
+            if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                yield cx, cy, len(cell)
+
+    def query_rect(self, x0, y0, x1, y1):
+        if x0 > x1:
+            x0, x1 = x1, x0
+        if y0 > y1:
+            y0, y1 = y1, y0
+        cx0, cy0, cx1, cy1 = self._cell_range(x0, y0, x1, y1)
+        found = {}
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.cells):
+            # Large rectangles visit the occupied cells instead of the whole range.
+            cells = (cell for (cx, cy), cell in self.cells.items()
+                     if cx0 <= cx <= cx1 and cy0 <= cy <= cy1)
+        else:
+            cells = (self.cells.get((cx, cy)) for cx in range(cx0, cx1 + 1)
+                     for cy in range(cy0, cy1 + 1))
+        for cell in cells:
+            if not cell:
+                continue
+            for item in cell:
+                if item in found:
+                    continue
+                bx0, by0, bx1, by1 = self.bounds[item]
+                if bx0 <= x1 and bx1 >= x0 and by0 <= y1 and by1 >= y0:
+                    found[item] = None
+        return list(found)
+
+    def any_in_rect(self, x0, y0, x1, y1):
+        # Cheaper than query_rect when only emptiness matters: stops at the
+        # first overlapping item and builds no result list.
+        cx0, cy0, cx1, cy1 = self._cell_range(x0, y0, x1, y1)
+        cells = self.cells
+        bounds = self.bounds
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = cells.get((cx, cy))
+                if not cell:
+                    continue
+                for item in cell:
+                    bx0, by0, bx1, by1 = bounds[item]
+                    if bx0 <= x1 and bx1 >= x0 and by0 <= y1 and by1 >= y0:
+                        return True
+        return False
+
+    def nearest(self, x, y):
+        # Hit-testing: of the items whose box holds the point, returns the
+        # one whose inscribed oval the point lies deepest inside, measuring
+        # distances in units of each box's own half extents.
+        size = self.cell_size
+        cell = self.cells.get((int(x // size), int(y // size)))
+        if not cell:
+            return None
+        best = None
+        best_distance = None
+        for item in cell:
+            x0, y0, x1, y1 = self.bounds[item]
+            if not (x0 <= x <= x1 and y0 <= y <= y1):
+                continue
+            half_width = max((x1 - x0) / 2, 1e-9)
+            half_height = max((y1 - y0) / 2, 1e-9)
+            distance = ((x - x0) / half_width - 1) ** 2 + ((y - y0) / half_height - 1) ** 2
+            if best is None or distance < best_distance:
+                best, best_distance = item, distance
+        return best
+
+def index_nodes(grid, nodes, extent):
+    # Indexes each node under the box of its oval; extent(node) gives the
+    # oval's half width and height.
+    insert = grid.insert
+    for node in nodes:
+        half_width, half_height = extent(node)
+        insert(node, node.x - half_width, node.y - half_height, node.x + half_width, node.y + half_height)
+
+def load_layer(node_data):
+    # Neural-network layers are NumPy arrays, so NumPy is only needed for
+    # maps that contain them.
+    layer_data = node_data.get("layer")
+    if layer_data is None:
+        return None
+    from mindmap_nn import DenseLayer
+    return DenseLayer.from_data(layer_data)
+
+def hides_children(node):
+    # Branches of a lazily opened map that have not been parsed yet are
+    # hidden like collapsed ones, but keep the collapsed flag from the file.
+    return node.collapsed or node.lazy is not None
+
+def iter_subtree(node):
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(reversed(current.children))
+
+class TranslateDelta:
+    def __init__(self, nodes, dx, dy):
+        self.nodes = dict.fromkeys(nodes)
+        self.dx = dx
+        self.dy = dy
+        self.cost = len(self.nodes)
+
+    def undo(self, app):
+        app.translate_nodes(self.nodes, -self.dx, -self.dy)
+
+    def redo(self, app):
+        app.translate_nodes(self.nodes, self.dx, self.dy)
+
+    def ops(self, undone=False):
+        sign = -1 if undone else 1
+        return [{"op": "translate", "uids": [node.uid for node in self.nodes],
+                 "dx": sign * self.dx, "dy": sign * self.dy}]
+
+class NodeAttrDelta:
+    def __init__(self, node, attr, old_value, new_value):
+        self.node = node
+        self.attr = attr
+        self.old_value = old_value
+        self.new_value = new_value
+        self.cost = 1
+
+    def undo(self, app):
+        app.set_node_attr(self.node, self.attr, self.old_value)
+
+    def redo(self, app):
+        app.set_node_attr(self.node, self.attr, self.new_value)
+
+    def ops(self, undone=False):
+        return [{"op": "set", "uid": self.node.uid, "attr": self.attr,
+                 "value": self.old_value if undone else self.new_value}]
+
+class RecolorDelta:
+    def __init__(self, nodes, color):
+        self.nodes = list(nodes)
+        self.old_colors = [node.color for node in self.nodes]
+        self.color = color
+        self.cost = len(self.nodes)
+
+    def undo(self, app):
+        for node, color in zip(self.nodes, self.old_colors):
+            app.set_node_attr(node, "color", color)
+
+    def redo(self, app):
+        app.recolor_nodes(self.nodes, self.color)
+
+    def ops(self, undone=False):
+        if undone:
+            return [{"op": "set", "uid": node.uid, "attr": "color", "value": color}
+                    for node, color in zip(self.nodes, self.old_colors)]
+        return [{"op": "recolor", "uids": [node.uid for node in self.nodes], "color": self.color}]
+
+class AddSubtreeDelta:
+    def __init__(self, node, index=None):
+        self.node = node
+        self.parent = node.parent
+        self.index = index
+        self.cost = sum(1 for _ in iter_subtree(node))
+
+    def undo(self, app):
+        self.index = app.detach_subtree(self.node)
+
+    def redo(self, app):
+        app.attach_subtree(self.node, self.parent, self.index)
+
+    def ops(self, undone=False):
+        if undone:
+            return [{"op": "delete", "uid": self.node.uid}]
+        return [{"op": "add", "parent": self.parent.uid if self.parent is not None else None,
+                 "index": self.index, "tree": serialize_tree([self.node])[0]}]
+
+class DeleteSubtreeDelta(AddSubtreeDelta):
+    def undo(self, app):
+        AddSubtreeDelta.redo(self, app)
+
+    def redo(self, app):
+        AddSubtreeDelta.undo(self, app)
+
+    def ops(self, undone=False):
+        return AddSubtreeDelta.ops(self, not undone)
+
+class PositionsDelta:
+    def __init__(self, old_positions, new_positions):
+        self.old_positions = old_positions
+        self.new_positions = new_positions
+        self.cost = len(new_positions)
+
+    def undo(self, app):
+        app.set_positions(self.old_positions)
+
+    def redo(self, app):
+        app.set_positions(self.new_positions)
+
+    def ops(self, undone=False):
+        positions = self.old_positions if undone else self.new_positions
+        return [{"op": "positions", "positions": [[node.uid, x, y] for node, (x, y) in positions.items()]}]
+
+class CompoundDelta:
+    def __init__(self, deltas):
+        self.deltas = list(deltas)
+        self.cost = sum(delta.cost for delta in self.deltas)
+
+    def undo(self, app):
+        for delta in reversed(self.deltas):
+            delta.undo(app)
+
+    def redo(self, app):
+        for delta in self.deltas:
+            delta.redo(app)
+
+    def ops(self, undone=False):
+        ops = []
+        for delta in (reversed(self.deltas) if undone else self.deltas):
+            ops.extend(delta.ops(undone))
+        return ops
+
+def build_subtree(tree_data, parent=None):
+    # Creates the nodes of one serialized branch without attaching the
+    # branch itself to parent, the way AddSubtreeDelta expects it.
+    root = None
+    stack = [(tree_data, parent)]
+    while stack:
+        node_data, node_parent = stack.pop()
+        node = MindMapNode(node_data["text"], node_data["x"], node_data["y"], node_parent,
+                           node_data.get("color", "lightblue"), node_data.get("id"))
+        node.collapsed = bool(node_data.get("collapsed"))
+        node.layer = load_layer(node_data)
+        if root is None:
+            root = node
+        else:
+            node_parent.children.append(node)
+        for child_data in reversed(node_data.get("children", ())):
+            stack.append((child_data, node))
+    return root
+
+def apply_ops(target, doc, ops):
+    # Replays journaled operations through target, which is either the
+    # document itself or a view wrapping it.
+    for op in ops:
+        kind = op["op"]
+        nodes = doc.nodes
+        if kind == "translate":
+            target.translate_nodes([nodes[uid] for uid in op["uids"]], op["dx"], op["dy"])
+        elif kind == "set":
+            target.set_node_attr(nodes[op["uid"]], op["attr"], op["value"])
+        elif kind == "recolor":
+            target.recolor_nodes([nodes[uid] for uid in op["uids"]], op["color"])
+        elif kind == "collapse":
+            target.set_collapsed(nodes[op["uid"]], op["value"])
+        elif kind == "add":
+            parent = nodes[op["parent"]] if op["parent"] is not None else None
+            target.attach_subtree(build_subtree(op["tree"], parent), parent, op["index"])
+        elif kind == "delete":
+            target.detach_subtree(nodes[op["uid"]])
+        elif kind == "positions":
+            target.set_positions({nodes[uid]: (x, y) for uid, x, y in op["positions"]})
+        else:
+            raise ValueError(f"unknown journal operation {kind!r}")
+
+class UndoJournal:
+    def __init__(self, max_entries=1000, max_nodes=200000):
+        self.max_entries = max_entries
+        self.max_nodes = max_nodes
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.cost = 0
+
+    def __len__(self):
+        return len(self.undo_stack)
+
+    def record(self, delta):
+        self.undo_stack.append(delta)
+        self.cost += delta.cost
+        for dropped in self.redo_stack:
+            self.cost -= dropped.cost
+        self.redo_stack.clear()
+        self._evict()
+
+    def _evict(self):
+        # The latest change always stays undoable, however large it is.
+        while len(self.undo_stack) > 1 and (len(self.undo_stack) > self.max_entries or
+                                            self.cost > self.max_nodes):
+            self.cost -= self.undo_stack.popleft().cost
+
+    def undo(self, app):
+        if not self.undo_stack:
+            return None
+        delta = self.undo_stack.pop()
+        delta.undo(app)
+        self.redo_stack.append(delta)
+        return delta
+
+    def redo(self, app):
+        if not self.redo_stack:
+            return None
+        delta = self.redo_stack.pop()
+        delta.redo(app)
+        self.undo_stack.append(delta)
+        return delta
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.cost = 0
+
+def node_record(node):
+    record = {
+        "id": node.uid,
+        "text": node.text,
+        "x": node.x,
+        "y": node.y,
+        "color": node.color
+    }
+    if node.collapsed:
+        record["collapsed"] = True
+    if node.layer is not None:
+        record["layer"] = node.layer.to_data()
+    return record
+
+def serialize_tree(roots):
+    serialized = []
+    stack = [(root, serialized) for root in reversed(roots)]
+    while stack:
+        node, siblings = stack.pop()
+        record = node_record(node)
+        record["children"] = []
+        siblings.append(record)
+        if node.lazy is not None:
+            source, source_record = node.lazy
+            record["children"] = source.children_data(source_record)
+        for child in reversed(node.children):
+            stack.append((child, record["children"]))
+    return serialized
+
+def iter_node_records(data):
+    # Yields (key, parent_key, node_data) in preorder for both the nested
+    # format ({"nodes": [tree, ...]}) and the flat table format.
+    if data.get("format") == "flat":
+        for node_data in data["nodes"]:
+            yield node_data["id"], node_data.get("parent"), node_data
+        return
+    key = 0
+    stack = [(node_data, None) for node_data in reversed(data["nodes"])]
+    while stack:
+        node_data, parent_key = stack.pop()
+        yield key, parent_key, node_data
+        for child_data in reversed(node_data.get("children", ())):
+            stack.append((child_data, key))
+        key += 1
+
+def fallback_uid_base(data):
+    # Nodes saved without an id get base + their position in the file, so
+    # the same file always loads with the same uids; journaled edits refer
+    # to nodes by uid.
+    max_id = 0
+    for key, parent_key, node_data in iter_node_records(data):
+        uid = node_data.get("id")
+        if uid is not None and uid > max_id:
+            max_id = uid
+    return max_id + 1
+
+def iter_mindmap_json(roots, indent=2, flat=False):
+    if indent is None:
+        nl, pad, colon = "", "", ":"
+    else:
+        nl, pad, colon = "\n", " " * indent, ": "
+    dumps = json.dumps
+    if flat:
+        yield "{" + nl + pad + '"format"' + colon + '"flat",' + nl + pad + '"nodes"' + colon + "["
+        separator = ""
+        for root in roots:
+            for node in iter_subtree(root):
+                record = node_record(node)
+                record["parent"] = node.parent.uid if node.parent is not None else None
+                yield separator + nl + pad * 2 + dumps(record, separators=(",", ":"))
+                separator = ","
+                if node.lazy is not None:
+                    source, source_record = node.lazy
+                    for record in iter_flat_records(source.children_data(source_record), node.uid):
+                        yield separator + nl + pad * 2 + dumps(record, separators=(",", ":"))
+        yield (nl + pad if separator else "") + "]" + nl + "}"
+        return
+
+    yield "{" + nl + pad + '"nodes"' + colon + "["
+    stack = [[iter(roots), 2, True]]
+    while stack:
+        frame = stack[-1]
+        node = next(frame[0], None)
+        depth = frame[1]
+        if node is None:
+            stack.pop()
+            yield ("]" if frame[2] else nl + pad * (depth - 1) + "]")
+            yield nl + pad * (depth - 2) + "}"
+            continue
+        inner = nl + pad * (depth + 1)
+        yield ("" if frame[2] else ",") + nl + pad * depth + "{" + \
+            inner + '"id"' + colon + dumps(node.uid) + "," + \
+            inner + '"text"' + colon + dumps(node.text) + "," + \
+            inner + '"x"' + colon + dumps(node.x) + "," + \
+            inner + '"y"' + colon + dumps(node.y) + "," + \
+            inner + '"color"' + colon + dumps(node.color) + "," + \
+            (inner + '"collapsed"' + colon + "true," if node.collapsed else "") + \
+            (inner + '"layer"' + colon + dumps(node.layer.to_data(), separators=(",", ":")) + ","
+             if node.layer is not None else "") + \
+            inner + '"children"' + colon + "["
+        frame[2] = False
+        if node.lazy is not None:
+            source, source_record = node.lazy
+            if source.missing_ids:
+                children = dumps(source.children_data(source_record), separators=(",", ":"))
+            else:
+                children = source.raw_children(source_record).decode("utf-8")
+            yield children[1:] + nl + pad * depth + "}"
+        elif node.children:
+            stack.append([iter(node.children), depth + 2, True])
+        else:
+            yield "]" + nl + pad * depth + "}"
+
+def drop_duplicate_roots(data):
+    # Maps saved by early versions list every node twice: once inside its
+    # parent's children and once more at the top level, so each branch comes
+    # back as an extra root. Drops top-level entries whose whole subtree
+    # (ids aside) also appears nested under another entry, and returns how
+    # many were dropped.
+    if data.get("format") == "flat":
+        return 0
+    roots = data["nodes"]
+    shapes = {}
+    shape_of = {}
+    nested = set()
+    for top in roots:
+        stack = [(top, False)]
+        while stack:
+            node_data, done = stack.pop()
+            children = node_data.get("children", ())
+            if not done:
+                stack.append((node_data, True))
+                stack.extend((child_data, False) for child_data in children)
+                continue
+            key = (node_data["text"], node_data["x"], node_data["y"],
+                   node_data.get("color", "lightblue"), bool(node_data.get("collapsed")),
+                   tuple(shape_of[id(child_data)] for child_data in children))
+            shape = shapes.setdefault(key, len(shapes))
+            shape_of[id(node_data)] = shape
+            if node_data is not top:
+                nested.add(shape)
+    kept = [node_data for node_data in roots if shape_of[id(node_data)] not in nested]
+    data["nodes"] = kept
+    return len(roots) - len(kept)
+
+def iter_flat_records(nodes_data, parent_uid=None):
+    stack = [(node_data, parent_uid) for node_data in reversed(nodes_data)]
+    while stack:
+        node_data, parent_uid = stack.pop()
+        record = {key: value for key, value in node_data.items() if key != "children"}
+        if record.get("id") is None:
+            record["id"] = MindMapNode.next_uid
+            MindMapNode.next_uid += 1
+        record["parent"] = parent_uid
+        yield record
+        for child_data in reversed(node_data.get("children", ())):
+            stack.append((child_data, record["id"]))
+
+class LazyMapSource:
+    # Indexes a nested-format map file once (strings and brackets only) so
+    # single branches can be parsed on demand. The index is cached next to
+    # the file as <file>.idx and reused while the file is unchanged.
+    # Each match skips ordinary text, values and keys, and stops at a
+    # bracket or at one of the keys the index cares about. The lookahead
+    # groups make the skipped runs atomic, so malformed input cannot
+    # backtrack.
+    TOKEN = re.compile(rb'(?:(?=([^"\[\]{}]+))\1|"(?!(?:children|id|format|nodes)"\s*:)'
+                       rb'(?=((?:[^"\\]+|\\.)*))\2")*'
+                       rb'(?:"(?P<key>children|id|format|nodes)"\s*:|(?P<bracket>[\[\]{}]))')
+    NUMBER = re.compile(rb'\s*(-?\d+)')
+    FLAT = re.compile(rb'\s*"flat"')
+    INDEX_VERSION = 2
+    # Windows refuses to replace a file that is mapped or open.
+    PINS_FILE = os.name == "nt"
+    FIELDS = ("start", "end", "children_key", "children_end", "parent",
+              "child_first", "child_count", "child_list")
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.private_copy = False
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        stat = os.stat(path)
+        self.signature = {"version": self.INDEX_VERSION, "size": stat.st_size,
+                          "mtime_ns": stat.st_mtime_ns}
+        if not self._load_index():
+            self._build_index()
+            self._save_index()
+
+    def __len__(self):
+        return len(self.start)
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                header = json.loads(f.readline())
+                if {key: header.get(key) for key in self.signature} != self.signature:
+                    return False
+                for name, length in zip(self.FIELDS, header["lengths"]):
+                    values = array("q")
+                    values.fromfile(f, length)
+                    setattr(self, name, values)
+        except (OSError, ValueError, KeyError, EOFError):
+            return False
+        self.flat = header["flat"]
+        self.max_id = header["max_id"]
+        self.missing_ids = header["missing_ids"]
+        return True
+
+    def _save_index(self):
+        header = dict(self.signature, flat=self.flat, max_id=self.max_id, missing_ids=self.missing_ids,
+                      lengths=[len(getattr(self, name)) for name in self.FIELDS])
+        try:
+            with open(self.index_path, "wb") as f:
+                f.write(json.dumps(header).encode("ascii") + b"\n")
+                for name in self.FIELDS:
+                    getattr(self, name).tofile(f)
+        except OSError:
+            pass
+
+    def _build_index(self):
+        data = self.data
+        start, end, children_key, children_end, parent = (array("q") for _ in range(5))
+        self.flat = False
+        self.max_id = 0
+        ids = 0
+        stack = []
+        last_key = None
+        last_key_start = last_key_end = 0
+        for match in self.TOKEN.finditer(data):
+            key = match.group("key")
+            if key is not None:
+                if stack and stack[-1][0] == "node":
+                    record = stack[-1][1]
+                    if key == b"id":
+                        number = self.NUMBER.match(data, match.end())
+                        if number:
+                            self.max_id = max(self.max_id, int(number.group(1)))
+                            ids += 1
+                elif len(stack) == 1 and key == b"format":
+                    self.flat = self.FLAT.match(data, match.end()) is not None
+                last_key = key
+                last_key_start = match.start("key") - 1
+                last_key_end = match.end()
+                continue
+            position = match.end() - 1
+            bracket = data[position]
+            if last_key is not None and data[last_key_end:position].strip():
+                last_key = None
+            if bracket == 0x7b:
+                if stack and stack[-1][0] in ("nodes", "children"):
+                    record = len(start)
+                    start.append(position)
+                    end.append(-1)
+                    children_key.append(-1)
+                    children_end.append(-1)
+                    parent.append(stack[-1][1])
+                    stack.append(("node", record))
+                else:
+                    stack.append(("object", -1))
+            elif bracket == 0x5b:
+                if stack and stack[-1][0] == "node" and last_key == b"children":
+                    children_key[stack[-1][1]] = last_key_start
+                    stack.append(("children", stack[-1][1]))
+                elif len(stack) == 1 and last_key == b"nodes":
+                    stack.append(("nodes", -1))
+                else:
+                    stack.append(("array", -1))
+            else:
+                kind, record = stack.pop()
+                if kind == "node":
+                    end[record] = match.end()
+                elif kind == "children":
+                    children_end[record] = match.end()
+            last_key = None
+
+        count = len(start)
+        self.missing_ids = ids < count
+        child_count = array("q", bytes(8 * count))
+        for record_parent in parent:
+            if record_parent >= 0:
+                child_count[record_parent] += 1
+        child_first = array("q", bytes(8 * count))
+        total = 0
+        for record in range(count):
+            child_first[record] = total
+            total += child_count[record]
+        child_list = array("q", bytes(8 * total))
+        fill = array("q", child_first)
+        for record, record_parent in enumerate(parent):
+            if record_parent >= 0:
+                child_list[fill[record_parent]] = record
+                fill[record_parent] += 1
+        self.start, self.end, self.parent = start, end, parent
+        self.children_key, self.children_end = children_key, children_end
+        self.child_first, self.child_count, self.child_list = child_first, child_count, child_list
+
+    def close(self):
+        self.data.close()
+        if self.private_copy:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def pins(self, path):
+        return (self.PINS_FILE and not self.private_copy and
+                os.path.abspath(self.path) == os.path.abspath(path))
+
+    def move_aside(self):
+        # Remaps the source onto a private copy of its file, which is
+        # deleted on close, so the file itself can be replaced. Record
+        # offsets stay valid because the bytes are the same.
+        copy_path = self.path + ".lazy"
+        shutil.copyfile(self.path, copy_path)
+        self.data.close()
+        with open(copy_path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.path = copy_path
+        self.private_copy = True
+
+    def roots(self):
+        return [record for record, parent in enumerate(self.parent) if parent < 0]
+
+    def children(self, record):
+        first = self.child_first[record]
+        return self.child_list[first:first + self.child_count[record]]
+
+    def header(self, record):
+        data = self.data
+        key = self.children_key[record]
+        if key < 0:
+            return json.loads(data[self.start[record]:self.end[record]])
+        before = data[self.start[record]:key].rstrip()
+        after = data[self.children_end[record]:self.end[record]].lstrip()
+        if after.startswith(b","):
+            after = after[1:]
+        elif before.endswith(b","):
+            before = before[:-1]
+        return json.loads(before + after)
+
+    def raw_children(self, record):
+        key = self.children_key[record]
+        if key < 0:
+            return b"[]"
+        return self.data[self.data.find(b"[", key):self.children_end[record]]
+
+    def children_data(self, record):
+        # Records saved without an id get the uid materialize_records gives
+        # them, so a copy written out keeps this session's uids.
+        data = json.loads(self.raw_children(record))
+        if self.missing_ids:
+            base = self.max_id + 1
+            stack = list(zip(data, self.children(record)))
+            while stack:
+                node_data, child = stack.pop()
+                if node_data.get("id") is None:
+                    node_data["id"] = base + child
+                stack.extend(zip(node_data.get("children", ()), self.children(child)))
+        return data
+
+def write_mindmap(f, roots, indent=2, flat=False, chunk_size=1 << 16, progress=None):
+    # progress, if given, is called with the number of characters written
+    # after every chunk; it may raise to abort the write.
+    buffer = []
+    size = 0
+    written = 0
+    for piece in iter_mindmap_json(roots, indent, flat):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            f.write("".join(buffer))
+            buffer.clear()
+            written += size
+            size = 0
+            if progress is not None:
+                progress(written)
+    if buffer:
+        f.write("".join(buffer))
+
+def file_signature(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def snapshot_signature(path):
+    # For chunked files the signature also holds the header, which an
+    # incremental save changes only in its very last write.
+    signature = file_signature(path)
+    with open(path, "rb") as f:
+        head = f.read(CHUNK_HEADER_SIZE)
+    if head.startswith(CHUNK_MAGIC):
+        signature["table"] = [int(value) for value in head[len(CHUNK_MAGIC):].split()]
+    return signature
+
+def signature_matches(recorded, current):
+    if recorded.get("size") == current["size"] and recorded.get("mtime_ns") == current["mtime_ns"]:
+        return True
+    # An incremental save that crashed before rewriting the header has
+    # only appended to the file, which still reads as the recorded one.
+    return ("table" in current and recorded.get("table") == current["table"] and
+            isinstance(recorded.get("size"), int) and current["size"] > recorded["size"])
+
+# The chunked format stores every top-level branch (a child of a root) as
+# its own JSON segment. A fixed-size header points at a table at the end of
+# the file that holds the root records and the offset of each segment. An
+# incremental save appends only the changed segments and a new table, then
+# rewrites the header in place; segments nobody points at any more are
+# dropped by the next full rewrite.
+CHUNK_MAGIC = b"MINDMAP-CHUNKED 1 "
+CHUNK_HEADER_SIZE = len(CHUNK_MAGIC) + 42
+CHUNK_GARBAGE_SLACK = 1 << 20
+
+def chunk_header(table_offset, table_length):
+    return CHUNK_MAGIC + b"%020d %020d\n" % (table_offset, table_length)
+
+def chunk_segment(branch):
+    return json.dumps(serialize_tree([branch])[0], separators=(",", ":")).encode("utf-8")
+
+def chunk_table(roots, segments):
+    records = []
+    for root in roots:
+        record = node_record(root)
+        record["branches"] = [branch.uid for branch in root.children]
+        records.append(record)
+    return json.dumps({"roots": records, "segments": segments}, separators=(",", ":")).encode("utf-8")
+
+def is_chunked_file(path):
+    with open(path, "rb") as f:
+        return f.read(len(CHUNK_MAGIC)) == CHUNK_MAGIC
+
+def parse_chunked(raw):
+    table_offset, table_length = map(int, raw[len(CHUNK_MAGIC):CHUNK_HEADER_SIZE].split())
+    table = json.loads(raw[table_offset:table_offset + table_length])
+    segments = {int(uid): tuple(span) for uid, span in table["segments"].items()}
+    nodes = []
+    for record in table["roots"]:
+        branches = record.pop("branches")
+        record["children"] = [json.loads(raw[offset:offset + length])
+                              for offset, length in (segments[uid] for uid in branches)]
+        nodes.append(record)
+    return {"nodes": nodes}, segments
+
+def parse_map_bytes(raw):
+    # Returns the map in the nested format plus, for chunked files, the
+    # segment table an incremental save can build on.
+    if raw.startswith(CHUNK_MAGIC):
+        return parse_chunked(raw)
+    return json.loads(raw), None
+
+def read_map_file(path):
+    with open(path, "rb") as f:
+        raw = f.read()
+        signature = {"size": len(raw), "mtime_ns": os.fstat(f.fileno()).st_mtime_ns}
+    data, segments = parse_map_bytes(raw)
+    return data, chunk_state(path, signature, segments)
+
+def chunk_state(path, signature, segments, table_length=0):
+    if segments is None:
+        return None
+    live = sum(length for offset, length in segments.values()) + table_length
+    return {"path": path, "signature": signature, "segments": segments, "live": live}
+
+def write_chunked(f, roots, progress=None):
+    f.write(chunk_header(0, 0))
+    offset = CHUNK_HEADER_SIZE
+    segments = {}
+    for root in roots:
+        for branch in root.children:
+            data = chunk_segment(branch)
+            f.write(data)
+            segments[branch.uid] = (offset, len(data))
+            offset += len(data)
+            if progress is not None:
+                progress(offset)
+    table = chunk_table(roots, segments)
+    f.write(table)
+    f.seek(0)
+    f.write(chunk_header(offset, len(table)))
+    return segments, len(table)
+
+def write_map(path, roots, save_format="indented", progress=None, sync=False):
+    # Writes a whole map file; returns the chunk state for chunked saves.
+    if save_format == "chunked":
+        with open(path, "wb") as f:
+            segments, table_length = write_chunked(f, roots, progress)
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+        return segments, table_length
+    with open(path, "w", encoding="utf-8") as f:
+        write_mindmap(f, roots, indent=2 if save_format == "indented" else None,
+                      flat=save_format == "flat", progress=progress)
+        f.flush()
+        if sync:
+            os.fsync(f.fileno())
+    return None, 0
+
+def sync_directory(path):
+    # Makes a rename into path's directory durable. Windows cannot open a
+    # directory for fsync, and does not need to.
+    if os.name == "nt":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class StaleJournal(Exception):
+    # The journal was started on a different version of the map file than
+    # the one on disk, so replaying it could apply changes twice.
+    pass
+
+class OperationLog:
+    # Append-only journal of the edits made since the map file was last
+    # written, kept next to it as <file>.journal. Every change is one line
+    # holding a JSON list of operations; lines are flushed as they are
+    # written and fsynced in batches by sync(). The header names the exact
+    # map file (size and mtime) the journal applies to, so a journal left
+    # over from an older snapshot is ignored, and a line torn by a crash is
+    # dropped at recovery.
+    VERSION = 1
+    COMPACT_MIN_BYTES = 1 << 20
+
+    def __init__(self, map_path):
+        self.map_path = map_path
+        self.path = map_path + ".journal"
+        self.file = None
+        self.changes = 0
+        self.unsynced = 0
+        self.snapshot_size = 0
+        self.signature = None
+        self.valid_end = 0
+        self.compaction_failed = False
+
+    def _write(self, path, signature, body=b""):
+        header = dict(signature, journal=self.VERSION)
+        with open(path, "wb") as f:
+            f.write(json.dumps(header).encode("ascii") + b"\n")
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def start(self):
+        # Begins an empty journal on top of the map file as it is now.
+        self.close()
+        signature = snapshot_signature(self.map_path)
+        self._write(self.path, signature)
+        try:
+            os.remove(self.path + ".new")
+        except OSError:
+            pass
+        self.file = open(self.path, "ab")
+        self.changes = 0
+        self.snapshot_size = signature["size"]
+        self.signature = signature
+
+    def recover(self):
+        # Returns the changes journaled on top of the current map file, or
+        # None if there is no matching journal. A journal caught halfway
+        # through rotate() is picked up from its .new file.
+        try:
+            signature = snapshot_signature(self.map_path)
+        except OSError:
+            return None
+        for path in (self.path, self.path + ".new"):
+            try:
+                with open(path, "rb") as f:
+                    header = json.loads(f.readline())
+                    if not isinstance(header, dict) or not signature_matches(header, signature):
+                        continue
+                    changes = []
+                    valid_end = f.tell()
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        try:
+                            changes.append(json.loads(line))
+                        except ValueError:
+                            break
+                        valid_end += len(line)
+            except (OSError, ValueError):
+                continue
+            if path != self.path:
+                os.replace(path, self.path)
+            self.valid_end = valid_end
+            self.snapshot_size = signature["size"]
+            self.signature = header
+            return changes
+        return None
+
+    def resume(self, changes):
+        # Continues a recovered journal, cutting off any torn last line.
+        self.close()
+        self.file = open(self.path, "r+b")
+        self.file.truncate(self.valid_end)
+        self.file.seek(self.valid_end)
+        self.changes = changes
+
+    def append(self, ops):
+        self.file.write(json.dumps(ops, separators=(",", ":")).encode("utf-8") + b"\n")
+        self.file.flush()
+        self.changes += 1
+        self.unsynced += 1
+
+    def sync(self):
+        if self.unsynced and self.file is not None:
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+
+    def size(self):
+        return self.file.tell()
+
+    def needs_compaction(self):
+        # Compacting once the journal reaches half the snapshot keeps the
+        # rewrite cost proportional to the edits that caused it.
+        return (not self.compaction_failed and self.changes > 0 and
+                self.size() >= max(self.COMPACT_MIN_BYTES, self.snapshot_size // 2))
+
+    def rotate(self, snapshot_path, signature, end):
+        # Swaps in a snapshot that already contains the first `end` bytes of
+        # the journal, carrying the rest over into a fresh journal. The new
+        # journal is complete before either rename, so a crash at any point
+        # leaves one journal that matches the map file on disk. If the map
+        # file was replaced since the journal began, the snapshot is stale
+        # and is thrown away.
+        if not signature_matches(self.signature, snapshot_signature(self.map_path)):
+            os.remove(snapshot_path)
+            raise StaleJournal(self.path)
+        self.sync()
+        with open(self.path, "rb") as f:
+            f.seek(end)
+            tail = f.read()
+        try:
+            self._write(self.path + ".new", signature, tail)
+            os.replace(snapshot_path, self.map_path)
+        except OSError:
+            # Nothing was swapped in, so the open journal still matches the
+            # map file and keeps taking appends.
+            for path in (self.path + ".new", snapshot_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            raise
+        self.file.close()
+        self.file = None
+        os.replace(self.path + ".new", self.path)
+        sync_directory(self.path)
+        self.file = open(self.path, "ab")
+        self.changes = tail.count(b"\n")
+        self.snapshot_size = signature["size"]
+        self.signature = signature
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+    def discard(self):
+        self.close()
+        for path in (self.path, self.path + ".new"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def read_log_changes(path, end):
+    # Returns the journal header and the changes in its first `end` bytes.
+    with open(path, "rb") as f:
+        header = json.loads(f.readline())
+        data = f.read(end - f.tell())
+    return header, [json.loads(line) for line in data.splitlines()]
+
+class SearchIndex:
+    # Trigram postings over lowercased node text. A query's trigrams narrow
+    # the candidates; each candidate is then checked against the query, so
+    # short queries and regular expressions fall back to a scan of the
+    # cached lowercased text.
+    GRAM = 3
+
+    def __init__(self):
+        self.texts = {}
+        self.postings = {}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def grams(self, text):
+        n = self.GRAM
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    def add(self, uid, text):
+        text = text.lower()
+        self.texts[uid] = text
+        postings = self.postings
+        for gram in self.grams(text):
+            uids = postings.get(gram)
+            if uids is None:
+                postings[gram] = {uid}
+            else:
+                uids.add(uid)
+
+    def remove(self, uid):
+        text = self.texts.pop(uid, None)
+        if text is None:
+            return
+        postings = self.postings
+        for gram in self.grams(text):
+            uids = postings[gram]
+            uids.discard(uid)
+            if not uids:
+                del postings[gram]
+
+    def update(self, uid, text):
+        self.remove(uid)
+        self.add(uid, text)
+
+    def clear(self):
+        self.texts = {}
+        self.postings = {}
+
+    def candidates(self, literal):
+        if len(literal) < self.GRAM:
+            return self.texts
+        sets = []
+        for gram in self.grams(literal):
+            uids = self.postings.get(gram)
+            if not uids:
+                return ()
+            sets.append(uids)
+        sets.sort(key=len)
+        found = set(sets[0])
+        for uids in sets[1:]:
+            found &= uids
+            if not found:
+                break
+        return found
+
+    def search(self, query, mode="substring"):
+        texts = self.texts
+        if mode == "regex":
+            pattern = re.compile(query, re.IGNORECASE)
+            return sorted(uid for uid, text in texts.items() if pattern.search(text))
+        literal = query.lower()
+        candidates = self.candidates(literal)
+        if mode == "prefix":
+            pattern = re.compile(r"(?<!\w)" + re.escape(literal))
+            return sorted(uid for uid in candidates if pattern.search(texts[uid]))
+        return sorted(uid for uid in candidates if literal in texts[uid])
+
+class MindMapDocument:
+    LAZY_EXPAND_DEPTH = 2
+
+    def __init__(self):
+        self.nodes = {}
+        self.undo_journal = UndoJournal()
+        self.search_index = SearchIndex()
+        self.op_log = None
+        # Top-level branches changed since the last save, and the segment
+        # table of the chunked file they were last saved to.
+        self.dirty_branches = set()
+        self.chunks = None
+        self.lazy_source = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __iter__(self):
+        return iter(self.nodes.values())
+
+    def get(self, uid):
+        return self.nodes.get(uid)
+
+    def root_nodes(self):
+        return [node for node in self.nodes.values() if node.parent is None]
+
+    def clear(self):
+        self.nodes = {}
+        self.undo_journal.clear()
+        self.search_index.clear()
+        self.mark_saved(None)
+        self.release_lazy_source()
+
+    def release_path(self, path):
+        # Called before path is replaced: the lazy source must not keep the
+        # file mapped where that blocks the replace.
+        if self.lazy_source is not None and self.lazy_source.pins(path):
+            self.lazy_source.move_aside()
+
+    def release_lazy_source(self):
+        # Called once no node refers to the lazily opened file any more.
+        if self.lazy_source is not None:
+            self.lazy_source.close()
+            self.lazy_source = None
+
+    def mark_dirty(self, node):
+        # Every mutation marks the top-level branch it happened in; roots
+        # live in the chunk table, which is rewritten on every save anyway.
+        parent = node.parent
+        if parent is None:
+            return
+        while parent.parent is not None:
+            node = parent
+            parent = node.parent
+        self.dirty_branches.add(node.uid)
+
+    def mark_saved(self, chunks):
+        self.dirty_branches.clear()
+        self.chunks = chunks
+
+    def reindex(self):
+        self.search_index.clear()
+        for node in self.nodes.values():
+            self.search_index.add(node.uid, node.text)
+
+    def attach_subtree(self, node, parent, index=None):
+        if parent is not None:
+            if index is None:
+                parent.children.append(node)
+            else:
+                parent.children.insert(index, node)
+        self.mark_dirty(node)
+        for current in iter_subtree(node):
+            self.nodes[current.uid] = current
+            self.search_index.add(current.uid, current.text)
+
+    def detach_subtree(self, node):
+        index = None
+        if node.parent is not None:
+            self.mark_dirty(node.parent)
+            index = node.parent.children.index(node)
+            del node.parent.children[index]
+        for current in iter_subtree(node):
+            self.nodes.pop(current.uid, None)
+            self.search_index.remove(current.uid)
+        return index
+
+    def translate_nodes(self, nodes, dx, dy):
+        for node in nodes:
+            node.x += dx
+            node.y += dy
+            self.mark_dirty(node)
+
+    def set_node_attr(self, node, attr, value):
+        setattr(node, attr, value)
+        self.mark_dirty(node)
+        if attr == "text":
+            self.search_index.update(node.uid, value)
+
+    def recolor_nodes(self, nodes, color):
+        for node in nodes:
+            node.color = color
+            self.mark_dirty(node)
+
+    def set_positions(self, positions):
+        for node, (x, y) in positions.items():
+            node.x = x
+            node.y = y
+            self.mark_dirty(node)
+
+    def set_collapsed(self, node, collapsed):
+        # Collapsing is saved with the map but is not an undo step, so it
+        # is journaled here rather than through a delta.
+        node.collapsed = collapsed
+        self.mark_dirty(node)
+        if not collapsed and node.lazy is not None:
+            source, record = node.lazy
+            node.lazy = None
+            self.materialize_records(source, source.children(record), node)
+        self.log_ops([{"op": "collapse", "uid": node.uid, "value": collapsed}])
+
+    def log_ops(self, ops):
+        if self.op_log is not None:
+            self.op_log.append(ops)
+
+    def record_change(self, delta):
+        self.undo_journal.record(delta)
+        # Serializing a large delta is expensive, so only do it for a journal.
+        if self.op_log is not None:
+            self.log_ops(delta.ops())
+
+    def undo(self, target=None):
+        # A view passes itself as the target so that replayed changes also
+        # update what is on screen.
+        delta = self.undo_journal.undo(self if target is None else target)
+        if delta is not None and self.op_log is not None:
+            self.log_ops(delta.ops(undone=True))
+        return delta
+
+    def redo(self, target=None):
+        delta = self.undo_journal.redo(self if target is None else target)
+        if delta is not None and self.op_log is not None:
+            self.log_ops(delta.ops())
+        return delta
+
+    def search(self, query, mode="substring"):
+        # mode is "substring", "prefix" (a word starting with the query) or
+        # "regex"; matches come back in creation order.
+        nodes = self.nodes
+        return [nodes[uid] for uid in self.search_index.search(query, mode)]
+
+    def serialize(self):
+        return serialize_tree(self.root_nodes())
+
+    def load_data(self, data):
+        self.clear()
+        by_key = {}
+        base = fallback_uid_base(data)
+        for i, (key, parent_key, node_data) in enumerate(iter_node_records(data)):
+            parent = by_key.get(parent_key) if parent_key is not None else None
+            uid = node_data.get("id")
+            if uid is None or uid in self.nodes:
+                uid = base + i
+            node = MindMapNode(node_data["text"], node_data["x"], node_data["y"], parent,
+                               node_data.get("color", "lightblue"), uid)
+            node.collapsed = bool(node_data.get("collapsed"))
+            node.layer = load_layer(node_data)
+            if parent is not None:
+                parent.children.append(node)
+            self.nodes[node.uid] = node
+            self.search_index.add(node.uid, node.text)
+            by_key[key] = node
+
+    def load(self, path):
+        data, chunks = read_map_file(path)
+        self.load_data(data)
+        self.mark_saved(chunks)
+
+    def load_lazy(self, source):
+        self.clear()
+        self.lazy_source = source
+        # Records without an id get source.max_id + 1 + their index once
+        # they are parsed, so new nodes must start past all of them.
+        MindMapNode.next_uid = max(MindMapNode.next_uid, source.max_id + 1 + len(source))
+        return self.materialize_records(source, source.roots(), None)
+
+    def materialize_records(self, source, records, parent):
+        created = []
+        stack = [(record, parent, 0) for record in reversed(records)]
+        while stack:
+            record, parent, depth = stack.pop()
+            node_data = source.header(record)
+            uid = node_data.get("id")
+            if uid is None or uid in self.nodes:
+                uid = source.max_id + 1 + record
+            node = MindMapNode(node_data["text"], node_data["x"], node_data["y"], parent,
+                               node_data.get("color", "lightblue"), uid)
+            node.layer = load_layer(node_data)
+            self.nodes[node.uid] = node
+            self.search_index.add(node.uid, node.text)
+            if parent is not None:
+                parent.children.append(node)
+            else:
+                created.append(node)
+            node.collapsed = bool(node_data.get("collapsed"))
+            if source.child_count[record]:
+                if node.collapsed or depth + 1 >= self.LAZY_EXPAND_DEPTH:
+                    node.lazy = (source, record)
+                else:
+                    children = source.children(record)
+                    for child in reversed(children):
+                        stack.append((child, node, depth + 1))
+        return created
+
+    def saves_incrementally(self, path, save_format):
+        chunks = self.chunks
+        if save_format != "chunked" or chunks is None or chunks["path"] != path:
+            return False
+        try:
+            signature = file_signature(path)
+        except OSError:
+            return False
+        # Rewrite the whole file once dead segments outweigh live ones.
+        return (signature == chunks["signature"] and
+                signature["size"] <= 2 * chunks["live"] + CHUNK_GARBAGE_SLACK)
+
+    def save(self, path, save_format="indented", progress=None):
+        roots = self.root_nodes()
+        if save_format == "chunked":
+            # Segments are cut at the roots' children, so collapsed lazy
+            # roots have to be expanded into the model first.
+            for root in roots:
+                if root.lazy is not None:
+                    source, record = root.lazy
+                    root.lazy = None
+                    self.materialize_records(source, source.children(record), root)
+            if self.saves_incrementally(path, save_format):
+                self.save_changed_segments(path, roots)
+                return
+        # Write next to the target and rename over it, so lazily loaded
+        # branches can still be copied from the old file while saving. A
+        # failed or cancelled save leaves the old file untouched, and a
+        # crash leaves either the old file or the complete new one.
+        temp_path = path + ".tmp"
+        try:
+            segments, table_length = write_map(temp_path, roots, save_format, progress, sync=True)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        self.release_path(path)
+        os.replace(temp_path, path)
+        sync_directory(path)
+        self.mark_saved(chunk_state(path, file_signature(path), segments, table_length))
+
+    def save_changed_segments(self, path, roots):
+        # Appends the dirty branches and a new table, and only then points
+        # the header at them; until that last small write the file still
+        # reads as the previous save.
+        old_segments = self.chunks["segments"]
+        segments = {}
+        with open(path, "r+b") as f:
+            offset = f.seek(0, os.SEEK_END)
+            for root in roots:
+                for branch in root.children:
+                    uid = branch.uid
+                    if uid in self.dirty_branches or uid not in old_segments:
+                        data = chunk_segment(branch)
+                        f.write(data)
+                        segments[uid] = (offset, len(data))
+                        offset += len(data)
+                    else:
+                        segments[uid] = old_segments[uid]
+            table = chunk_table(roots, segments)
+            f.write(table)
+            f.flush()
+            os.fsync(f.fileno())
+            f.seek(0)
+            f.write(chunk_header(offset, len(table)))
+            f.flush()
+            os.fsync(f.fileno())
+        self.mark_saved(chunk_state(path, file_signature(path), segments, len(table)))
+
+def compact_snapshot(map_path, log_path, end, save_format="indented"):
+    # Builds the next snapshot from the current one plus the first `end`
+    # bytes of the journal, without touching the document being edited, so
+    # it can run on a worker thread. Returns the temp file to rotate in and
+    # its signature.
+    header, changes = read_log_changes(log_path, end)
+    if not isinstance(header, dict) or not signature_matches(header, snapshot_signature(map_path)):
+        raise StaleJournal(log_path)
+    doc = MindMapDocument()
+    doc.load(map_path)
+    for ops in changes:
+        apply_ops(doc, doc, ops)
+    temp_path = map_path + ".compact"
+    try:
+        write_map(temp_path, doc.root_nodes(), save_format, sync=True)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return temp_path, snapshot_signature(temp_path)
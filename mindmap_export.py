@@ -0,0 +1,249 @@
+import math
+import struct
+import zlib
+from xml.sax.saxutils import escape, quoteattr
+from mindmap_core import SpatialGrid, hides_children
+from mindmap_layout import label_extent
+
+FONT_SIZE = 12
+LINE_HEIGHT = FONT_SIZE * 1.25
+LINE_WIDTH = 2
+# Like the canvas, drop labels below this scale; they would be unreadable.
+TEXT_MIN_SCALE = 0.35
+
+def iter_shown(roots):
+    stack = list(reversed(roots))
+    while stack:
+        node = stack.pop()
+        yield node
+        if not hides_children(node):
+            stack.extend(reversed(node.children))
+
+def edge_points(parent, node, labels):
+    # Same geometry as the canvas connectors: from the rim of the parent's
+    # oval to the rim of the child's.
+    angle = math.atan2(node.y - parent.y, node.x - parent.x)
+    cos, sin = math.cos(angle), math.sin(angle)
+    parent_width, parent_height = labels[parent][:2]
+    width, height = labels[node][:2]
+    return (parent.x + parent_width * cos, parent.y + parent_height * sin,
+            node.x - width * cos, node.y - height * sin)
+
+def map_bounds(nodes, margin, labels):
+    if not nodes:
+        return 0, 0, 2 * margin, 2 * margin
+    return (min(node.x - labels[node][0] for node in nodes) - margin,
+            min(node.y - labels[node][1] for node in nodes) - margin,
+            max(node.x + labels[node][0] for node in nodes) + margin,
+            max(node.y + labels[node][1] for node in nodes) + margin)
+
+def wrap_text(text, width, measure):
+    lines = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for word in paragraph.split(" "):
+            candidate = word if not line else line + " " + word
+            if line and measure(candidate) > width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+    return lines
+
+def measure_labels(nodes, measure):
+    # Wraps every label and sizes its oval by the editor's rule. Returns
+    # node -> (half width, half height, lines) in map units.
+    def size(text, wrap):
+        lines = wrap_text(text, wrap, measure)
+        return max(map(measure, lines)), len(lines) * LINE_HEIGHT
+
+    labels = {}
+    by_text = {}
+    for node in nodes:
+        label = by_text.get(node.text)
+        if label is None:
+            half_width, half_height, wrap = label_extent(node.text, size)
+            label = by_text[node.text] = (half_width, half_height, wrap_text(node.text, wrap, measure))
+        labels[node] = label
+    return labels
+
+def write_svg(f, roots, margin=40):
+    nodes = list(iter_shown(roots))
+    labels = measure_labels(nodes, text_measure())
+    x0, y0, x1, y1 = map_bounds(nodes, margin, labels)
+    width, height = x1 - x0, y1 - y0
+    w = f.write
+    w('<svg xmlns="http://www.w3.org/2000/svg" width="%g" height="%g" viewBox="%g %g %g %g" '
+      'font-family="Tahoma, sans-serif" font-size="%d">\n' % (width, height, x0, y0, width, height, FONT_SIZE))
+    w('<rect x="%g" y="%g" width="%g" height="%g" fill="white"/>\n' % (x0, y0, width, height))
+    w('<g stroke="black" stroke-width="%d">\n' % LINE_WIDTH)
+    for node in nodes:
+        if node.parent is not None:
+            w('<line x1="%.1f" y1="%.1f" x2="%.1f" y2="%.1f"/>\n' % edge_points(node.parent, node, labels))
+    w('</g>\n')
+    for node in nodes:
+        half_width, half_height, lines = labels[node]
+        w('<ellipse cx="%.1f" cy="%.1f" rx="%g" ry="%g" fill=%s stroke="black" stroke-width="%d"%s/>\n' % (
+            node.x, node.y, half_width, half_height, quoteattr(node.color), LINE_WIDTH,
+            ' stroke-dasharray="4 2"' if hides_children(node) else ""))
+        top = node.y - (len(lines) - 1) * LINE_HEIGHT / 2 + FONT_SIZE * 0.35
+        w('<text text-anchor="middle">')
+        for i, line in enumerate(lines):
+            w('<tspan x="%.1f" y="%.1f">%s</tspan>' % (node.x, top + i * LINE_HEIGHT, escape(line)))
+        w('</text>\n')
+    w('</svg>\n')
+
+def png_chunk(f, kind, data):
+    f.write(struct.pack(">I", len(data)))
+    f.write(kind)
+    f.write(data)
+    f.write(struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+def load_font(ImageFont, size):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        pass
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+def text_measure():
+    # Label widths at FONT_SIZE in map units: Pillow's text metrics when it
+    # is installed, an average glyph width otherwise.
+    try:
+        from PIL import Image, ImageDraw, ImageFont
+    except ImportError:
+        return lambda s: len(s) * FONT_SIZE * 0.6
+    draw = ImageDraw.Draw(Image.new("L", (1, 1)))
+    font = load_font(ImageFont, FONT_SIZE)
+    return lambda s: draw.textlength(s, font=font)
+
+def write_png(path, roots, scale=1.0, margin=40, max_size=None, band_bytes=1 << 25):
+    # Renders the map from the model, not from the screen, one horizontal
+    # band at a time. Each band is drawn with Pillow and streamed into the
+    # PNG's IDAT chunks, so memory stays around band_bytes whatever the
+    # output size. max_size shrinks the scale so the longer side fits, which
+    # is what thumbnails want.
+    from PIL import Image, ImageDraw, ImageFont, ImageColor
+
+    nodes = list(iter_shown(roots))
+    labels = measure_labels(nodes, text_measure())
+    bx0, by0, bx1, by1 = map_bounds(nodes, margin, labels)
+    if max_size:
+        scale = min(scale, max_size / max(bx1 - bx0, by1 - by0))
+    width = max(1, math.ceil((bx1 - bx0) * scale))
+    height = max(1, math.ceil((by1 - by0) * scale))
+
+    font = load_font(ImageFont, max(1, round(FONT_SIZE * scale)))
+    line_height = LINE_HEIGHT * scale
+    line_width = max(1, round(LINE_WIDTH * scale))
+    show_text = scale >= TEXT_MIN_SCALE
+    sizer = ImageDraw.Draw(Image.new("L", (1, 1)))
+    measure = lambda s: sizer.textlength(s, font=font)
+    ink = {}
+
+    def text_box(lines):
+        # The ink box of a label drawn as below, relative to its node's
+        # centre and in map units.
+        key = tuple(lines)
+        box = ink.get(key)
+        if box is None:
+            left = top = math.inf
+            right = bottom = -math.inf
+            y = -len(lines) * line_height / 2
+            for line in lines:
+                l, t, r, b = sizer.textbbox((-measure(line) / 2, y), line, font=font)
+                left, top, right, bottom = min(left, l), min(top, t), max(right, r), max(bottom, b)
+                y += line_height
+            box = ink[key] = (left / scale, top / scale, right / scale, bottom / scale)
+        return box
+
+    # Index each node under everything it paints (its oval, its label and
+    # its connector, widened by the stroke), so a band query returns every
+    # node that can paint into the band and nothing is cut at a seam.
+    pad = (line_width / 2 + 1) / scale
+    grid = SpatialGrid()
+    order = {}
+    shape = {}
+    for i, node in enumerate(nodes):
+        order[node] = i
+        half_width, half_height, lines = labels[node]
+        x0, y0 = node.x - half_width, node.y - half_height
+        x1, y1 = node.x + half_width, node.y + half_height
+        if show_text:
+            tx0, ty0, tx1, ty1 = text_box(lines)
+            x0, y0 = min(x0, node.x + tx0), min(y0, node.y + ty0)
+            x1, y1 = max(x1, node.x + tx1), max(y1, node.y + ty1)
+        shape[node] = (y0 - pad, y1 + pad)
+        if node.parent is not None:
+            ex0, ey0, ex1, ey1 = edge_points(node.parent, node, labels)
+            x0, y0 = min(x0, ex0, ex1), min(y0, ey0, ey1)
+            x1, y1 = max(x1, ex0, ex1), max(y1, ey0, ey1)
+        grid.insert(node, x0 - pad, y0 - pad, x1 + pad, y1 + pad)
+
+    colors = {}
+
+    def fill_of(color):
+        rgb = colors.get(color)
+        if rgb is None:
+            try:
+                rgb = ImageColor.getrgb(color)
+            except ValueError:
+                rgb = ImageColor.getrgb("lightblue")
+            colors[color] = rgb
+        return rgb
+
+    stride = width * 3
+    band_height = max(1, min(height, band_bytes // stride))
+    compressor = zlib.compressobj(6)
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        png_chunk(f, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        for top in range(0, height, band_height):
+            rows = min(band_height, height - top)
+            image = Image.new("RGB", (width, rows), "white")
+            draw = ImageDraw.Draw(image)
+            band_top = by0 + top / scale
+            band_bottom = by0 + (top + rows) / scale
+            hits = grid.query_rect(bx0, band_top, bx1, band_bottom)
+            hits.sort(key=order.__getitem__)
+
+            # Pillow truncates fractional coordinates, which does not
+            # commute with the band offset, so round in image space first
+            # to draw each band exactly as a slice of the whole image.
+            def px(x, y):
+                return round((x - bx0) * scale), round((y - by0) * scale) - top
+
+            for node in hits:
+                if node.parent is not None:
+                    ex0, ey0, ex1, ey1 = edge_points(node.parent, node, labels)
+                    draw.line([px(ex0, ey0), px(ex1, ey1)], fill="black", width=line_width)
+            for node in hits:
+                half_width, half_height, lines = labels[node]
+                shape_top, shape_bottom = shape[node]
+                if shape_bottom < band_top or shape_top > band_bottom:
+                    continue
+                draw.ellipse([px(node.x - half_width, node.y - half_height),
+                              px(node.x + half_width, node.y + half_height)],
+                             fill=fill_of(node.color), outline="black", width=line_width)
+                if not show_text:
+                    continue
+                # Lines break where they did at map scale, so the label
+                # fits the oval sized for it.
+                cx, cy = (node.x - bx0) * scale, (node.y - by0) * scale
+                y = cy - len(lines) * line_height / 2
+                for line in lines:
+                    draw.text((round(cx - measure(line) / 2), round(y) - top), line, fill="black", font=font)
+                    y += line_height
+
+            raw = image.tobytes()
+            data = b"".join(b"\x00" + raw[i * stride:(i + 1) * stride] for i in range(rows))
+            chunk = compressor.compress(data)
+            if chunk:
+                png_chunk(f, b"IDAT", chunk)
+        png_chunk(f, b"IDAT", compressor.flush())
+        png_chunk(f, b"IEND", b"")
+    return width, height
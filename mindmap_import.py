@@ -0,0 +1,154 @@
+import os
+import re
+import xml.etree.ElementTree as ET
+from mindmap_core import MindMapNode
+
+# Importers for outlines written elsewhere. Each reader streams its file
+# and yields (depth, text) pairs in document order, so memory stays
+# bounded by the nesting depth rather than the file size; build_outline
+# turns the pairs into a detached tree in one pass.
+
+HEADING = re.compile(r"(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$")
+BULLET = re.compile(r"(?:[-*+]|\d{1,9}[.)])(?:[ \t]+(.*)|$)")
+FENCE = re.compile(r"(`{3,}|~{3,})")
+THEMATIC_BREAK = re.compile(r"(?:[-*_][ \t]*){3,}$")
+PROGRESS_LINES = 4096
+
+OUTLINE_EXTENSIONS = {
+    ".md": "markdown",
+    ".markdown": "markdown",
+    ".opml": "opml",
+    ".xml": "opml",
+}
+
+def outline_format(path):
+    return OUTLINE_EXTENSIONS.get(os.path.splitext(path)[1].lower(), "indented")
+
+def iter_lines(f, progress=None):
+    # Decodes a binary file line by line; progress gets the bytes read.
+    read = 0
+    for count, raw in enumerate(f, 1):
+        read += len(raw)
+        if progress is not None and count % PROGRESS_LINES == 0:
+            progress(read)
+        yield raw.decode("utf-8", "replace").rstrip("\r\n").expandtabs(4)
+
+class IndentLevels:
+    # Turns indentation widths into nesting levels, whatever the file uses
+    # per level; a line indented between two open levels joins the outer one.
+    def __init__(self):
+        self.widths = []
+
+    def level(self, width):
+        widths = self.widths
+        while widths and widths[-1] > width:
+            widths.pop()
+        if not widths or widths[-1] < width:
+            widths.append(width)
+        return len(widths) - 1
+
+    def reset(self):
+        self.widths = []
+
+def iter_indented_outline(lines):
+    levels = IndentLevels()
+    for line in lines:
+        text = line.strip()
+        if text:
+            yield levels.level(len(line) - len(line.lstrip(" "))), text
+
+def iter_markdown_outline(lines):
+    # ATX headings nest by their level and bullets (-, *, + or numbered)
+    # nest under the heading above them by indentation. Lines continuing a
+    # bullet are appended to it; other prose and fenced code are skipped.
+    levels = IndentLevels()
+    section = 0
+    fence = None
+    pending = None
+    in_bullet = False
+    for line in lines:
+        stripped = line.strip()
+        if fence is not None:
+            if stripped.startswith(fence):
+                fence = None
+            continue
+        match = FENCE.match(stripped)
+        if match:
+            fence = match.group(1)
+            continue
+        if not stripped or THEMATIC_BREAK.match(stripped):
+            in_bullet = False
+            continue
+        indent = len(line) - len(line.lstrip(" "))
+        match = HEADING.match(stripped) if indent < 4 else None
+        if match:
+            if pending is not None:
+                yield pending
+            depth = len(match.group(1)) - 1
+            pending = (depth, match.group(2) or "")
+            section = depth + 1
+            levels.reset()
+            in_bullet = False
+            continue
+        match = BULLET.match(stripped)
+        if match:
+            if pending is not None:
+                yield pending
+            pending = (section + levels.level(indent), match.group(1) or "")
+            in_bullet = True
+        elif in_bullet:
+            pending = (pending[0], pending[1] + (" " if pending[1] else "") + stripped)
+    if pending is not None:
+        yield pending
+
+def iter_opml_outline(f, progress=None):
+    # Finished <outline> elements are detached from their parent as soon as
+    # they end, so the parsed document never holds more than one branch of
+    # open elements.
+    stack = []
+    depth = 0
+    count = 0
+    for event, element in ET.iterparse(f, events=("start", "end")):
+        if event == "start":
+            stack.append(element)
+            if element.tag == "outline":
+                yield depth, element.get("text") or element.get("title") or ""
+                depth += 1
+            continue
+        stack.pop()
+        if element.tag == "outline":
+            depth -= 1
+            element.clear()
+            if stack:
+                stack[-1].remove(element)
+            count += 1
+            if progress is not None and count % PROGRESS_LINES == 0:
+                progress(f.tell())
+
+def build_outline(items):
+    # Builds detached trees from (depth, text) pairs and returns their
+    # roots. A depth that skips levels nests one level below the item
+    # before it.
+    roots = []
+    stack = []
+    for depth, text in items:
+        del stack[depth:]
+        parent = stack[-1] if stack else None
+        node = MindMapNode(text, 0, 0, parent)
+        if parent is None:
+            roots.append(node)
+        else:
+            parent.children.append(node)
+        stack.append(node)
+    return roots
+
+def read_outline(path, outline=None, progress=None):
+    outline = outline or outline_format(path)
+    with open(path, "rb") as f:
+        if outline == "opml":
+            items = iter_opml_outline(f, progress)
+        elif outline == "markdown":
+            items = iter_markdown_outline(iter_lines(f, progress))
+        else:
+            items = iter_indented_outline(iter_lines(f, progress))
+        return build_outline(items)
@@ -0,0 +1,295 @@
+import math
+from mindmap_core import iter_subtree
+
+NODE_WIDTH = 100
+NODE_HEIGHT = 60
+# Labels wrap at the narrowest of these widths that keeps a node from
+# getting much taller than wide.
+WRAP_WIDTHS = (90, 140, 200, 280, 400)
+LABEL_PADDING = 4
+
+def label_extent(text, size):
+    # size(text, wrap_width) gives the width and height of the label
+    # wrapped at wrap_width. Returns the half width and half height of the
+    # oval that fits the label, and the width the label wraps at. Labels
+    # that fit the default oval keep it; longer ones get an oval around
+    # their box.
+    width, height = size(text, WRAP_WIDTHS[0])
+    if (width / NODE_WIDTH) ** 2 + (height / NODE_HEIGHT) ** 2 <= 1:
+        return NODE_WIDTH / 2, NODE_HEIGHT / 2, WRAP_WIDTHS[0]
+    for wrap in WRAP_WIDTHS:
+        width, height = size(text, wrap)
+        if height <= wrap * 0.6:
+            break
+    return (max(NODE_WIDTH / 2, (width / 2 + LABEL_PADDING) * math.sqrt(2)),
+            max(NODE_HEIGHT / 2, (height / 2 + LABEL_PADDING) * math.sqrt(2)), wrap)
+
+def fixed_extent(node):
+    # The default node size, for callers that cannot measure text.
+    return NODE_WIDTH / 2, NODE_HEIGHT / 2
+
+def visible_children(node):
+    return () if node.collapsed else node.children
+
+def index_tree(root):
+    # Flattens the visible part of the tree into arrays so the layouts below
+    # can run as loops over integers instead of recursion. Children always
+    # get higher indices than their parent, and nodes on one level appear in
+    # left-to-right order.
+    nodes = [root]
+    parent = [-1]
+    depth = [0]
+    children = [[]]
+    stack = [0]
+    while stack:
+        i = stack.pop()
+        kids = children[i]
+        for child in visible_children(nodes[i]):
+            kids.append(len(nodes))
+            nodes.append(child)
+            parent.append(i)
+            depth.append(depth[i] + 1)
+            children.append([])
+        stack.extend(reversed(kids))
+    return nodes, parent, depth, children
+
+def radial_layout(root, ring=180, gap=20, start_angle=0.0, span=2 * math.pi, extent=fixed_extent):
+    # Each node gets a wedge of the circle proportional to the number of
+    # leaves below it and sits in the middle of its wedge. Rings are pushed
+    # outwards until the circles around neighbouring nodes, on the same
+    # ring or on adjacent rings, are at least `gap` apart; extent(node)
+    # gives a node's half width and height.
+    nodes, parent, depth, children = index_tree(root)
+    n = len(nodes)
+    reach = [max(extent(node)) for node in nodes]
+    leaves = [1] * n
+    for i in range(n - 1, -1, -1):
+        if children[i]:
+            leaves[i] = sum(leaves[c] for c in children[i])
+    unit = span / leaves[0]
+
+    angle = [0.0] * n
+    angle[0] = start_angle + span / 2
+    wedge_start = [0.0] * n
+    wedge_start[0] = start_angle
+    for i in range(n):
+        start = wedge_start[i]
+        for c in children[i]:
+            wedge_start[c] = start
+            angle[c] = start + leaves[c] * unit / 2
+            start += leaves[c] * unit
+
+    # Neighbours i and j on a ring of radius r are 2 * r * sin((angle[j] -
+    # angle[i]) / 2) apart, so each pair sets a lower bound on r.
+    def chord(gap_angle):
+        return max(2 * math.sin(min(gap_angle, math.pi) / 2), 1e-9)
+
+    max_depth = max(depth)
+    widest = [0.0] * (max_depth + 1)
+    needed = [0.0] * (max_depth + 1)
+    first = [None] * (max_depth + 1)
+    last = [None] * (max_depth + 1)
+    for i in range(n):
+        d = depth[i]
+        widest[d] = max(widest[d], reach[i])
+        if d == 0:
+            continue
+        if last[d] is not None:
+            needed[d] = max(needed[d], (reach[last[d]] + reach[i] + gap) / chord(angle[i] - angle[last[d]]))
+        else:
+            first[d] = i
+        last[d] = i
+    if span >= 2 * math.pi:
+        for d in range(1, max_depth + 1):
+            if first[d] is not None and first[d] != last[d]:
+                wrap_gap = 2 * math.pi - (angle[last[d]] - angle[first[d]])
+                needed[d] = max(needed[d], (reach[last[d]] + reach[first[d]] + gap) / chord(wrap_gap))
+    radius = [0.0] * (max_depth + 1)
+    for d in range(1, max_depth + 1):
+        step = max(ring, widest[d - 1] + widest[d] + gap)
+        radius[d] = max(radius[d - 1] + step, needed[d])
+
+    cx, cy = root.x, root.y
+    positions = {}
+    for i in range(n):
+        r = radius[depth[i]]
+        positions[nodes[i]] = (cx + r * math.cos(angle[i]), cy + r * math.sin(angle[i]))
+    return positions
+
+def tidy_layout(root, level_gap=60, sibling_gap=20, extent=fixed_extent):
+    # Reingold-Tilford tidy tree in the linear-time formulation of Buchheim,
+    # Junger and Leipert, growing to the right of the root: depth maps to x
+    # and the breadth coordinate to y. Gaps are between node boxes, so each
+    # column is as wide as its widest node and neighbours are separated by
+    # their own heights.
+    nodes, parent, depth, children = index_tree(root)
+    n = len(nodes)
+    sizes = [extent(node) for node in nodes]
+    half_height = [size[1] for size in sizes]
+
+    def separation(a, b):
+        return half_height[a] + half_height[b] + sibling_gap
+    number = [0] * n
+    for i in range(n):
+        for k, c in enumerate(children[i]):
+            number[c] = k
+    prelim = [0.0] * n
+    mod = [0.0] * n
+    shift = [0.0] * n
+    change = [0.0] * n
+    thread = [-1] * n
+    ancestor = list(range(n))
+    default_ancestor = [kids[0] if kids else -1 for kids in children]
+
+    def left_sibling(v):
+        p = parent[v]
+        return children[p][number[v] - 1] if p >= 0 and number[v] > 0 else -1
+
+    def next_left(v):
+        return children[v][0] if children[v] else thread[v]
+
+    def next_right(v):
+        return children[v][-1] if children[v] else thread[v]
+
+    def move_subtree(wl, wr, amount):
+        subtrees = number[wr] - number[wl]
+        change[wr] -= amount / subtrees
+        shift[wr] += amount
+        change[wl] += amount / subtrees
+        prelim[wr] += amount
+        mod[wr] += amount
+
+    def apportion(v, default):
+        w = left_sibling(v)
+        if w < 0:
+            return default
+        vir = vor = v
+        vil = w
+        vol = children[parent[v]][0]
+        sir = sor = mod[vir]
+        sil = mod[vil]
+        sol = mod[vol]
+        while next_right(vil) >= 0 and next_left(vir) >= 0:
+            vil = next_right(vil)
+            vir = next_left(vir)
+            vol = next_left(vol)
+            vor = next_right(vor)
+            ancestor[vor] = v
+            amount = (prelim[vil] + sil) - (prelim[vir] + sir) + separation(vil, vir)
+            if amount > 0:
+                a = ancestor[vil]
+                if parent[a] != parent[v]:
+                    a = default
+                move_subtree(a, v, amount)
+                sir += amount
+                sor += amount
+            sil += mod[vil]
+            sir += mod[vir]
+            sol += mod[vol]
+            sor += mod[vor]
+        if next_right(vil) >= 0 and next_right(vor) < 0:
+            thread[vor] = next_right(vil)
+            mod[vor] += sil - sor
+        if next_left(vir) >= 0 and next_left(vol) < 0:
+            thread[vol] = next_left(vir)
+            mod[vol] += sir - sol
+            default = v
+        return default
+
+    # First walk in postorder; each finished subtree is apportioned against
+    # its left siblings before the next sibling is walked, as in the
+    # recursive formulation.
+    stack = [(0, False)]
+    while stack:
+        v, done = stack.pop()
+        if not done:
+            stack.append((v, True))
+            stack.extend((c, False) for c in reversed(children[v]))
+            continue
+        w = left_sibling(v)
+        kids = children[v]
+        if not kids:
+            prelim[v] = prelim[w] + separation(w, v) if w >= 0 else 0.0
+        else:
+            amount = total = 0.0
+            for c in reversed(kids):
+                prelim[c] += amount
+                mod[c] += amount
+                total += change[c]
+                amount += shift[c] + total
+            midpoint = (prelim[kids[0]] + prelim[kids[-1]]) / 2
+            if w >= 0:
+                prelim[v] = prelim[w] + separation(w, v)
+                mod[v] = prelim[v] - midpoint
+            else:
+                prelim[v] = midpoint
+        p = parent[v]
+        if p >= 0:
+            default_ancestor[p] = apportion(v, default_ancestor[p])
+
+    breadth = [0.0] * n
+    stack = [(0, 0.0)]
+    while stack:
+        v, m = stack.pop()
+        breadth[v] = prelim[v] + m
+        for c in children[v]:
+            stack.append((c, m + mod[v]))
+
+    max_depth = max(depth)
+    widest = [0.0] * (max_depth + 1)
+    for i in range(n):
+        widest[depth[i]] = max(widest[depth[i]], sizes[i][0])
+    column = [0.0] * (max_depth + 1)
+    for d in range(1, max_depth + 1):
+        column[d] = column[d - 1] + widest[d - 1] + widest[d] + level_gap
+
+    x0, y0 = root.x, root.y - breadth[0]
+    return {nodes[i]: (x0 + column[depth[i]], y0 + breadth[i]) for i in range(n)}
+
+def find_free_slot(grid, parent, angle, size=(NODE_WIDTH / 2, NODE_HEIGHT / 2), distance=150, gap=10,
+                   max_rings=12):
+    # Walks rings around parent, starting at the preferred angle and
+    # alternating to either side of it, and returns the first position where
+    # a node of half width and height `size` (plus gap) overlaps nothing in
+    # the spatial grid. The first ring clears the parent's own box. Falls
+    # back to the preferred spot when the neighbourhood is full.
+    half_width = size[0] + gap
+    half_height = size[1] + gap
+    px, py = parent.x, parent.y
+    bounds = grid.bounds.get(parent)
+    if bounds is not None:
+        parent_reach = max(bounds[2] - bounds[0], bounds[3] - bounds[1]) / 2
+        distance = max(distance, parent_reach + max(size) + gap)
+    occupied = grid.any_in_rect
+    for ring in range(max_rings):
+        radius = distance + ring * 2 * half_height
+        step = 2 * half_height / radius
+        for k in range(int(math.pi / step) + 1):
+            for a in ((angle,) if k == 0 else (angle + k * step, angle - k * step)):
+                x = px + radius * math.cos(a)
+                y = py + radius * math.sin(a)
+                if not occupied(x - half_width, y - half_height, x + half_width, y + half_height):
+                    return x, y
+    return px + distance * math.cos(angle), py + distance * math.sin(angle)
+
+def layout_positions(root, mode="radial", extent=fixed_extent):
+    # Lays out the visible part of the tree under root, keeping root in
+    # place. extent(node) gives each node's half width and height. Branches
+    # hidden under collapsed nodes keep their shape and move with their
+    # collapsed ancestor.
+    if mode == "tree":
+        positions = tidy_layout(root, extent=extent)
+    elif root.parent is not None:
+        # A branch fans out on the side facing away from its parent.
+        away = math.atan2(root.y - root.parent.y, root.x - root.parent.x)
+        positions = radial_layout(root, start_angle=away - math.pi / 2, span=math.pi, extent=extent)
+    else:
+        positions = radial_layout(root, extent=extent)
+    for node, (x, y) in list(positions.items()):
+        if node.collapsed and node.children:
+            dx = x - node.x
+            dy = y - node.y
+            for child in node.children:
+                for current in iter_subtree(child):
+                    positions[current] = (current.x + dx, current.y + dy)
+    return positions
@@ -0,0 +1,141 @@
+import math
+import numpy as np
+from mindmap_core import MindMapNode
+
+ACTIVATIONS = {
+    "relu": lambda z: np.maximum(z, 0.0),
+    "sigmoid": lambda z: 1.0 / (1.0 + np.exp(-z)),
+    "tanh": np.tanh,
+    "linear": lambda z: z,
+}
+COLUMN_GAP = 220
+NEURON_GAP = 80
+HEADER_GAP = 110
+POSITIVE_COLOR = (0xff, 0x98, 0x00)
+NEGATIVE_COLOR = (0x19, 0x76, 0xd2)
+
+class DenseLayer:
+    # A fully connected layer: weights has one row per neuron and one column
+    # per input, so a whole batch goes through with a single matrix product.
+    def __init__(self, weights, bias, activation="relu"):
+        weights = np.asarray(weights, dtype=np.float64)
+        bias = np.asarray(bias, dtype=np.float64)
+        if weights.ndim != 2 or bias.shape != (weights.shape[0],):
+            raise ValueError(f"weights of shape {weights.shape} do not match bias of shape {bias.shape}")
+        if activation not in ACTIVATIONS:
+            raise ValueError(f"unknown activation {activation!r}")
+        self.weights = weights
+        self.bias = bias
+        self.activation = activation
+
+    @property
+    def inputs(self):
+        return self.weights.shape[1]
+
+    @property
+    def outputs(self):
+        return self.weights.shape[0]
+
+    def forward(self, x):
+        return ACTIVATIONS[self.activation](x @ self.weights.T + self.bias)
+
+    def to_data(self):
+        return {"weights": self.weights.tolist(), "bias": self.bias.tolist(),
+                "activation": self.activation}
+
+    @classmethod
+    def from_data(cls, data):
+        weights = np.asarray(data["weights"], dtype=np.float64)
+        if weights.size == 0:
+            weights = weights.reshape(len(data["bias"]), 0)
+        return cls(weights, data["bias"], data.get("activation", "relu"))
+
+def random_layer(inputs, outputs, activation="relu", rng=None):
+    # He initialization for ReLU layers, Glorot for the others.
+    rng = np.random.default_rng() if rng is None else rng
+    if activation == "relu":
+        scale = math.sqrt(2.0 / inputs)
+    else:
+        scale = math.sqrt(2.0 / (inputs + outputs))
+    return DenseLayer(rng.normal(0.0, scale, (outputs, inputs)), np.zeros(outputs), activation)
+
+def parse_vector(text, size=None):
+    values = np.array([value for value in text.replace(";", ",").split(",") if value.strip()],
+                      dtype=np.float64)
+    if size is not None and values.shape != (size,):
+        raise ValueError(f"expected {size} values, got {values.size}")
+    return values
+
+def parse_matrix(text, rows, columns):
+    # Rows are separated by ";" and values within a row by ",".
+    matrix = np.array([row.split(",") for row in text.split(";") if row.strip()], dtype=np.float64)
+    if matrix.shape != (rows, columns):
+        raise ValueError(f"expected {rows} rows of {columns} weights")
+    return matrix
+
+def forward_pass(layers, inputs):
+    # inputs is one input vector or a batch with one vector per row;
+    # returns the inputs followed by the activations of every layer.
+    x = np.asarray(inputs, dtype=np.float64)
+    activations = [x]
+    for layer in layers:
+        if x.shape[-1] != layer.inputs:
+            raise ValueError(f"layer expects {layer.inputs} inputs, got {x.shape[-1]}")
+        x = layer.forward(x)
+        activations.append(x)
+    return activations
+
+def neurons(node):
+    return [child for child in node.children if child.layer is None]
+
+def find_network(node):
+    # A network is an input node followed by a chain of layer nodes, each
+    # the child of the one before; neurons are the children without a
+    # layer. Works from any node of the network, neurons included.
+    for start in (node, node.parent):
+        if start is None:
+            continue
+        while start.layer is not None:
+            start = start.parent
+        layer_nodes = []
+        current = start
+        while True:
+            current = next((child for child in current.children if child.layer is not None), None)
+            if current is None:
+                break
+            layer_nodes.append(current)
+        if layer_nodes:
+            return start, layer_nodes
+    return None
+
+def build_network(parent, layers, x, y):
+    # Creates the nodes of a network whose input column sits at (x, y):
+    # one column of neurons per layer, with the input and layer nodes on a
+    # row above the tallest column. The branch is not attached to parent.
+    sizes = [layers[0].inputs] + [layer.outputs for layer in layers]
+    header_y = y - (max(sizes) - 1) * NEURON_GAP / 2 - HEADER_GAP
+    head = MindMapNode(f"Input ({sizes[0]})", x, header_y, parent)
+    column = head
+    for k, size in enumerate(sizes):
+        column_x = x + k * COLUMN_GAP
+        top = y - (size - 1) * NEURON_GAP / 2
+        label = "x" if k == 0 else "y" if k == len(layers) else f"h{k}_"
+        for i in range(size):
+            column.children.append(MindMapNode(f"{label}{i + 1}", column_x, top + i * NEURON_GAP, column))
+        if k < len(layers):
+            layer = layers[k]
+            next_column = MindMapNode(f"Layer {k + 1}: {layer.inputs}→{layer.outputs}, {layer.activation}",
+                                      column_x + COLUMN_GAP, header_y, column)
+            next_column.layer = layer
+            column.children.append(next_column)
+            column = next_column
+    return head
+
+def activation_colors(values):
+    # Blends from white towards orange for positive and blue for negative
+    # activations.
+    values = np.asarray(values, dtype=np.float64)
+    t = np.tanh(np.abs(values))[:, None]
+    base = np.where(values[:, None] >= 0, POSITIVE_COLOR, NEGATIVE_COLOR)
+    rgb = np.rint(255 * (1 - t) + base * t).astype(int)
+    return ["#%02x%02x%02x" % tuple(row) for row in rgb.tolist()]
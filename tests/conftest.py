@@ -0,0 +1,28 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mindmap_core import MindMapDocument, MindMapNode
+
+@pytest.fixture
+def make_doc():
+    # Builds a document with one root, `branches` top-level branches and
+    # `fanout` children per node down to `depth` levels below the root.
+    def build(branches=4, fanout=3, depth=3):
+        root = MindMapNode("Central", 0, 0)
+        level = [root]
+        for d in range(1, depth + 1):
+            next_level = []
+            for parent in level:
+                for i in range(branches if d == 1 else fanout):
+                    node = MindMapNode(f"{parent.text} / {i}", parent.x + 150 * i, parent.y + 80 * d, parent)
+                    parent.children.append(node)
+                    next_level.append(node)
+            level = next_level
+        doc = MindMapDocument()
+        doc.attach_subtree(root, None)
+        doc.mark_saved(None)
+        return doc
+    return build
@@ -0,0 +1,57 @@
+import json
+from mindmap_core import MindMapDocument, drop_duplicate_roots, iter_subtree
+from mindmap_batch import run_task
+
+def baseline_data(roots):
+    # What early versions saved: every node serialized with its subtree,
+    # so each branch also shows up again at the top level, and no ids.
+    def shape(node):
+        return {"text": node.text, "x": node.x, "y": node.y, "color": node.color,
+                "children": [shape(child) for child in node.children]}
+    return {"nodes": [shape(node) for root in roots for node in iter_subtree(root)]}
+
+def strip_ids(nodes_data):
+    return [{"text": node_data["text"], "x": node_data["x"], "y": node_data["y"],
+             "children": strip_ids(node_data["children"])} for node_data in nodes_data]
+
+def test_baseline_duplicates_are_dropped(make_doc):
+    doc = make_doc()
+    data = baseline_data(doc.root_nodes())
+    assert len(data["nodes"]) == len(doc)
+    assert drop_duplicate_roots(data) == len(doc) - 1
+    assert len(data["nodes"]) == 1
+    loaded = MindMapDocument()
+    loaded.load_data(data)
+    assert len(loaded) == len(doc)
+    assert strip_ids(loaded.serialize()) == strip_ids(doc.serialize())
+
+def test_separate_roots_are_kept(make_doc):
+    first = make_doc(branches=2, fanout=2, depth=2).root_nodes()[0]
+    second = make_doc(branches=3, fanout=1, depth=2).root_nodes()[0]
+    second.x = 900
+    data = baseline_data([first, second])
+    drop_duplicate_roots(data)
+    assert [node_data["text"] for node_data in data["nodes"]] == ["Central", "Central"]
+    assert [node_data["x"] for node_data in data["nodes"]] == [0, 900]
+
+def test_clean_and_flat_maps_are_left_alone(make_doc):
+    doc = make_doc()
+    data = {"nodes": doc.serialize()}
+    assert drop_duplicate_roots(data) == 0
+    assert data["nodes"] == doc.serialize()
+    flat = {"format": "flat", "nodes": [{"id": 1, "parent": None, "text": "a", "x": 0, "y": 0}]}
+    assert drop_duplicate_roots(flat) == 0
+    assert len(flat["nodes"]) == 1
+
+def test_normalize_writes_the_deduplicated_map(tmp_path, make_doc):
+    doc = make_doc(branches=2)
+    path = str(tmp_path / "old.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline_data(doc.root_nodes()), f)
+    assert run_task("validate", path, None, {}) == {"nodes": len(doc), "duplicate_roots": len(doc) - 1}
+    out_path = str(tmp_path / "new.json")
+    result = run_task("normalize", path, out_path, {"format": "indented"})
+    assert result == {"nodes": len(doc), "duplicate_roots": len(doc) - 1}
+    normalized = MindMapDocument()
+    normalized.load(out_path)
+    assert strip_ids(normalized.serialize()) == strip_ids(doc.serialize())
@@ -0,0 +1,103 @@
+import os
+import pytest
+from mindmap_core import (
+    MindMapDocument, CHUNK_HEADER_SIZE, is_chunked_file, read_map_file, snapshot_signature, signature_matches
+)
+
+def load(path):
+    doc = MindMapDocument()
+    doc.load(path)
+    return doc
+
+@pytest.mark.parametrize("save_format", ["indented", "compact", "flat", "chunked"])
+def test_round_trip(tmp_path, make_doc, save_format):
+    doc = make_doc()
+    path = str(tmp_path / "map.json")
+    doc.save(path, save_format)
+    assert is_chunked_file(path) == (save_format == "chunked")
+    assert load(path).serialize() == doc.serialize()
+
+def test_round_trip_keeps_collapsed_and_colors(tmp_path, make_doc):
+    doc = make_doc()
+    branch = doc.root_nodes()[0].children[1]
+    doc.set_collapsed(branch, True)
+    doc.recolor_nodes(branch.children, "orange")
+    path = str(tmp_path / "map.json")
+    doc.save(path, "chunked")
+    loaded = load(path)
+    assert loaded.get(branch.uid).collapsed
+    assert [child.color for child in loaded.get(branch.uid).children] == ["orange"] * 3
+    assert loaded.serialize() == doc.serialize()
+
+def test_incremental_save_rewrites_only_dirty_branches(tmp_path, make_doc):
+    doc = make_doc()
+    path = str(tmp_path / "map.json")
+    doc.save(path, "chunked")
+    segments = dict(doc.chunks["segments"])
+    size = os.path.getsize(path)
+
+    changed = doc.root_nodes()[0].children[2]
+    doc.set_node_attr(changed.children[0], "text", "renamed")
+    assert doc.saves_incrementally(path, "chunked")
+    doc.save(path, "chunked")
+
+    new_segments = doc.chunks["segments"]
+    for uid, span in segments.items():
+        if uid == changed.uid:
+            assert span != new_segments[uid]
+            assert new_segments[uid][0] >= size
+        else:
+            assert span == new_segments[uid]
+    assert not doc.dirty_branches
+    assert load(path).serialize() == doc.serialize()
+
+def test_incremental_save_of_added_and_deleted_branches(tmp_path, make_doc):
+    doc = make_doc()
+    path = str(tmp_path / "map.json")
+    doc.save(path, "chunked")
+    root = doc.root_nodes()[0]
+    doc.detach_subtree(root.children[0])
+    added = make_doc(branches=1, fanout=2, depth=2).root_nodes()[0]
+    added.parent = root
+    doc.attach_subtree(added, root)
+    doc.save(path, "chunked")
+    assert set(doc.chunks["segments"]) == {branch.uid for branch in root.children}
+    assert load(path).serialize() == doc.serialize()
+
+def test_changed_file_gets_a_full_rewrite(tmp_path, make_doc):
+    doc = make_doc()
+    path = str(tmp_path / "map.json")
+    doc.save(path, "chunked")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert not doc.saves_incrementally(path, "chunked")
+    assert not doc.saves_incrementally(str(tmp_path / "other.json"), "chunked")
+    assert not doc.saves_incrementally(path, "indented")
+
+def test_torn_incremental_save_reads_as_previous_save(tmp_path, make_doc):
+    # A crash after appending segments but before the header is rewritten
+    # leaves a file that still reads as the previous save.
+    doc = make_doc()
+    path = str(tmp_path / "map.json")
+    doc.save(path, "chunked")
+    recorded = snapshot_signature(path)
+    expected = load(path).serialize()
+    with open(path, "ab") as f:
+        f.write(b'{"id":1,"text":"half written')
+    current = snapshot_signature(path)
+    assert signature_matches(recorded, current)
+    assert load(path).serialize() == expected
+
+    with open(path, "r+b") as f:
+        f.write(b"MINDMAP-CHUNKED 1 " + b"%020d %020d\n" % (CHUNK_HEADER_SIZE, 0))
+    assert not signature_matches(recorded, snapshot_signature(path))
+
+def test_read_map_file_returns_segment_table(tmp_path, make_doc):
+    doc = make_doc()
+    path = str(tmp_path / "map.json")
+    doc.save(path, "chunked")
+    data, chunks = read_map_file(path)
+    assert chunks["segments"] == doc.chunks["segments"]
+    assert chunks["signature"] == doc.chunks["signature"]
+    doc.save(path, "indented")
+    assert read_map_file(path)[1] is None
@@ -0,0 +1,75 @@
+import itertools
+import math
+import random
+import pytest
+from mindmap_core import MindMapNode, iter_subtree
+from mindmap_layout import radial_layout, tidy_layout, layout_positions, fixed_extent
+
+def random_tree(seed, count=150):
+    rng = random.Random(seed)
+    root = MindMapNode("root", 400, 300)
+    nodes = [root]
+    for i in range(count):
+        # Mix uniform picks with recent nodes so trees get both wide fans
+        # and deeper chains.
+        if rng.random() < 0.7:
+            parent = rng.choice(nodes[:20])
+        else:
+            parent = nodes[max(0, len(nodes) - 1 - int(rng.expovariate(0.3)))]
+        node = MindMapNode(f"n{i}", 0, 0, parent)
+        parent.children.append(node)
+        nodes.append(node)
+    sizes = {node: (rng.choice([50, 50, 80, 160]), rng.choice([30, 30, 45, 90])) for node in nodes}
+    return root, sizes.__getitem__
+
+@pytest.mark.parametrize("seed", range(6))
+def test_radial_layout_has_no_overlaps(seed):
+    root, extent = random_tree(seed)
+    gap = 20
+    positions = radial_layout(root, gap=gap, extent=extent)
+    assert len(positions) == len(list(iter_subtree(root)))
+    assert positions[root] == (root.x, root.y)
+    # The radial layout keeps circles around the nodes apart.
+    for a, b in itertools.combinations(positions, 2):
+        (ax, ay), (bx, by) = positions[a], positions[b]
+        assert math.hypot(ax - bx, ay - by) >= max(extent(a)) + max(extent(b)) + gap - 1e-6
+
+@pytest.mark.parametrize("seed", range(6))
+def test_tidy_layout_has_no_overlaps(seed):
+    root, extent = random_tree(seed)
+    gap = 20
+    positions = tidy_layout(root, level_gap=gap, sibling_gap=gap, extent=extent)
+    assert len(positions) == len(list(iter_subtree(root)))
+    assert positions[root] == (root.x, root.y)
+    for a, b in itertools.combinations(positions, 2):
+        (ax, ay), (bx, by) = positions[a], positions[b]
+        (aw, ah), (bw, bh) = extent(a), extent(b)
+        apart_x = abs(ax - bx) >= aw + bw + gap - 1e-6
+        apart_y = abs(ay - by) >= ah + bh + gap - 1e-6
+        assert apart_x or apart_y
+    for node in positions:
+        for child in node.children:
+            assert positions[child][0] > positions[node][0]
+
+@pytest.mark.parametrize("mode", ["radial", "tree"])
+def test_collapsed_branches_move_with_their_ancestor(mode):
+    root, extent = random_tree(7, count=60)
+    branch = max(root.children, key=lambda node: len(list(iter_subtree(node))))
+    branch.collapsed = True
+    hidden = [node for child in branch.children for node in iter_subtree(child)]
+    before = {node: (node.x, node.y) for node in hidden}
+    positions = layout_positions(root, mode, extent)
+    dx = positions[branch][0] - branch.x
+    dy = positions[branch][1] - branch.y
+    for node in hidden:
+        assert positions[node] == (before[node][0] + dx, before[node][1] + dy)
+
+def test_branch_fans_out_away_from_its_parent():
+    root = MindMapNode("root", 0, 0)
+    branch = MindMapNode("branch", 200, 0, root)
+    root.children.append(branch)
+    for i in range(5):
+        branch.children.append(MindMapNode(f"leaf {i}", 0, 0, branch))
+    positions = layout_positions(branch, "radial", fixed_extent)
+    assert positions[branch] == (200, 0)
+    assert all(positions[leaf][0] > 200 for leaf in branch.children)
@@ -0,0 +1,180 @@
+import json
+import os
+import pytest
+from mindmap_core import (
+    MindMapDocument, MindMapNode, LazyMapSource, OperationLog, NodeAttrDelta, hides_children, iter_subtree,
+    serialize_tree, apply_ops
+)
+
+@pytest.fixture(params=["indented", "compact"])
+def map_file(request, tmp_path, make_doc):
+    # A map with a collapsed top-level branch and a collapsed node below
+    # the depth that is materialized on open.
+    doc = make_doc(depth=4)
+    root = doc.root_nodes()[0]
+    doc.set_collapsed(root.children[1], True)
+    doc.set_collapsed(root.children[2].children[0].children[1], True)
+    path = str(tmp_path / "map.json")
+    doc.save(path, request.param)
+    return path, doc
+
+def open_lazy(path):
+    doc = MindMapDocument()
+    doc.load_lazy(LazyMapSource(path))
+    return doc
+
+def load(path):
+    doc = MindMapDocument()
+    doc.load(path)
+    return doc
+
+@pytest.mark.parametrize("save_format", ["indented", "compact", "flat", "chunked"])
+def test_lazy_save_matches_full_load(tmp_path, map_file, save_format):
+    path, doc = map_file
+    lazy = open_lazy(path)
+    assert len(lazy) < len(doc)
+    out_path = str(tmp_path / ("out." + save_format))
+    lazy.save(out_path, save_format)
+    assert load(out_path).serialize() == load(path).serialize() == doc.serialize()
+
+def test_lazy_branches_keep_their_collapsed_flags(map_file):
+    path, doc = map_file
+    lazy = open_lazy(path)
+    depth = MindMapDocument.LAZY_EXPAND_DEPTH
+    for node in lazy:
+        original = doc.get(node.uid)
+        assert node.collapsed == original.collapsed
+        node_depth = 0
+        parent = node.parent
+        while parent is not None:
+            node_depth += 1
+            parent = parent.parent
+        if original.children and (original.collapsed or node_depth + 1 >= depth):
+            assert node.lazy is not None
+            assert hides_children(node)
+        else:
+            assert node.lazy is None
+            assert hides_children(node) == node.collapsed
+
+def test_expanding_a_lazy_branch_materializes_it(map_file):
+    path, doc = map_file
+    lazy = open_lazy(path)
+    branch = lazy.get(doc.root_nodes()[0].children[2].uid)
+    assert branch.lazy is not None and not branch.collapsed
+    lazy.set_collapsed(branch, False)
+    assert branch.lazy is None
+    assert serialize_tree([branch]) == serialize_tree([doc.get(branch.uid)])
+    for node in iter_subtree(branch):
+        assert lazy.get(node.uid) is node
+    assert [node.uid for node in lazy.search("Central / 2 / 0")][:1] == [branch.children[0].uid]
+
+def test_expanding_a_collapsed_lazy_branch(map_file):
+    path, doc = map_file
+    lazy = open_lazy(path)
+    branch = lazy.get(doc.root_nodes()[0].children[1].uid)
+    assert branch.collapsed and branch.lazy is not None
+    lazy.set_collapsed(branch, False)
+    assert not branch.collapsed and branch.lazy is None
+    assert len(branch.children) == len(doc.get(branch.uid).children)
+
+def test_source_is_closed_when_the_document_is_cleared(map_file):
+    path, doc = map_file
+    lazy = MindMapDocument()
+    source = LazyMapSource(path)
+    lazy.load_lazy(source)
+    other = LazyMapSource(path)
+    lazy.load_lazy(other)
+    assert source.data.closed
+    assert not other.data.closed
+    lazy.clear()
+    assert other.data.closed
+    assert lazy.lazy_source is None
+
+def test_index_cache_is_reused_until_the_file_changes(map_file):
+    path, doc = map_file
+    first = LazyMapSource(path)
+    first.close()
+    assert os.path.exists(path + ".idx")
+    cached = LazyMapSource(path)
+    assert list(cached.start) == list(first.start)
+    cached.close()
+    doc.set_node_attr(doc.root_nodes()[0], "text", "a longer root label")
+    doc.save(path, "indented")
+    lazy = MindMapDocument()
+    lazy.load_lazy(LazyMapSource(path))
+    assert lazy.root_nodes()[0].text == "a longer root label"
+    lazy.clear()
+
+def write_legacy_map(path):
+    # Early versions saved nodes without ids.
+    def node(text, children=()):
+        return {"text": text, "x": 0, "y": 0, "color": "lightblue", "children": list(children)}
+    data = {"nodes": [node("root", [node(f"b{i}", [node(f"b{i}.{j}", [node(f"b{i}.{j}.{k}") for k in range(2)])
+                                                   for j in range(2)]) for i in range(3)])]}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+def test_new_nodes_never_reuse_uids_of_unparsed_records(tmp_path, monkeypatch):
+    monkeypatch.setattr(MindMapNode, "next_uid", 1)
+    path = str(tmp_path / "legacy.json")
+    write_legacy_map(path)
+    lazy = open_lazy(path)
+    root = lazy.root_nodes()[0]
+    added = MindMapNode("new", 0, 0, root)
+    lazy.attach_subtree(added, root)
+    for branch in list(root.children):
+        if branch.lazy is not None:
+            lazy.set_collapsed(branch, False)
+    uids = [node.uid for node in iter_subtree(root)]
+    assert len(uids) == len(set(uids)) == len(lazy)
+    assert lazy.get(added.uid) is added
+
+@pytest.mark.parametrize("save_format", ["indented", "compact", "flat", "chunked"])
+def test_journal_of_a_saved_legacy_map_recovers(tmp_path, monkeypatch, save_format):
+    # Branches copied unparsed from an id-less file must keep the uids
+    # this session gives them, or the journal names the wrong nodes.
+    monkeypatch.setattr(MindMapNode, "next_uid", 1)
+    path = str(tmp_path / "legacy.json")
+    write_legacy_map(path)
+    lazy = open_lazy(path)
+    lazy.save(path, save_format)
+    lazy.op_log = OperationLog(path)
+    lazy.op_log.start()
+    branch = lazy.root_nodes()[0].children[1]
+    lazy.set_collapsed(branch, False)
+    node = branch.children[0].children[1] if branch.children[0].lazy is None else branch.children[0]
+    lazy.record_change(NodeAttrDelta(node, "text", node.text, "renamed"))
+    lazy.set_node_attr(node, "text", "renamed")
+    lazy.op_log.close()
+
+    recovered = MindMapDocument()
+    recovered.load(path)
+    changes = OperationLog(path).recover()
+    assert len(changes) == 2
+    for ops in changes:
+        apply_ops(recovered, recovered, ops)
+    assert recovered.get(node.uid).text == "renamed"
+    assert recovered.serialize() == lazy.serialize()
+
+def test_saving_in_place_moves_the_mapping_off_the_file(map_file, monkeypatch):
+    # Where mapped files cannot be replaced, the source is moved onto a
+    # private copy first and keeps serving unparsed branches from it.
+    monkeypatch.setattr(LazyMapSource, "PINS_FILE", True)
+    path, doc = map_file
+    lazy = open_lazy(path)
+    source = lazy.lazy_source
+    assert source.pins(path)
+    lazy.set_node_attr(lazy.root_nodes()[0], "text", "renamed")
+    lazy.save(path, "indented")
+    assert source.path != path and not source.pins(path)
+    copy_path = source.path
+    lazy.save(path, "compact")
+    assert source.path == copy_path
+    branch = lazy.get(doc.root_nodes()[0].children[3].uid)
+    lazy.set_collapsed(branch, False)
+    assert serialize_tree([branch]) == serialize_tree([doc.get(branch.uid)])
+    doc.set_node_attr(doc.root_nodes()[0], "text", "renamed")
+    assert lazy.serialize() == doc.serialize()
+    lazy.clear()
+    assert source.data.closed
+    assert not os.path.exists(copy_path)
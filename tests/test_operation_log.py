@@ -0,0 +1,169 @@
+import os
+import pytest
+from mindmap_core import (
+    MindMapDocument, OperationLog, StaleJournal, NodeAttrDelta, TranslateDelta, apply_ops, compact_snapshot
+)
+
+def load(path):
+    doc = MindMapDocument()
+    doc.load(path)
+    return doc
+
+def rename(doc, node, text):
+    doc.record_change(NodeAttrDelta(node, "text", node.text, text))
+    doc.set_node_attr(node, "text", text)
+
+def move(doc, nodes, dx, dy):
+    doc.record_change(TranslateDelta(nodes, dx, dy))
+    doc.translate_nodes(nodes, dx, dy)
+
+def recover(path):
+    # Opens the map and replays its journal the way the editor does.
+    doc = load(path)
+    log = OperationLog(path)
+    changes = log.recover()
+    for ops in changes or ():
+        apply_ops(doc, doc, ops)
+    return doc, log, changes
+
+@pytest.fixture
+def journaled(tmp_path, make_doc):
+    doc = make_doc()
+    path = str(tmp_path / "map.json")
+    doc.save(path, "indented")
+    doc.op_log = OperationLog(path)
+    doc.op_log.start()
+    yield doc, path
+    doc.op_log.close()
+
+def test_recover_replays_journaled_changes(journaled):
+    doc, path = journaled
+    branch = doc.root_nodes()[0].children[1]
+    rename(doc, branch, "renamed")
+    move(doc, list(branch.children), 30, -10)
+    doc.set_collapsed(branch, True)
+    doc.undo()
+    doc.op_log.sync()
+
+    recovered, log, changes = recover(path)
+    assert len(changes) == 4
+    assert recovered.serialize() == doc.serialize()
+
+def test_torn_last_line_is_dropped_and_cut_off(journaled):
+    doc, path = journaled
+    rename(doc, doc.root_nodes()[0], "first")
+    doc.op_log.close()
+    expected = load(path)
+    expected.get(doc.root_nodes()[0].uid).text = "first"
+    with open(path + ".journal", "ab") as f:
+        f.write(b'[{"op":"set","uid":1,')
+
+    recovered, log, changes = recover(path)
+    assert len(changes) == 1
+    assert recovered.serialize() == expected.serialize()
+    log.resume(len(changes))
+    log.append([{"op": "set", "uid": doc.root_nodes()[0].uid, "attr": "text", "value": "second"}])
+    log.close()
+    recovered, log, changes = recover(path)
+    assert len(changes) == 2
+    assert recovered.root_nodes()[0].text == "second"
+
+def test_journal_of_another_snapshot_is_ignored(journaled):
+    doc, path = journaled
+    rename(doc, doc.root_nodes()[0], "renamed")
+    # Saving without restarting the journal leaves it describing the old file.
+    doc.save(path, "compact")
+    assert OperationLog(path).recover() is None
+
+def test_journal_with_mismatched_header_is_ignored(journaled):
+    doc, path = journaled
+    rename(doc, doc.root_nodes()[0], "renamed")
+    doc.op_log.close()
+    with open(path + ".journal", "rb") as f:
+        f.readline()
+        body = f.read()
+    with open(path + ".journal", "wb") as f:
+        f.write(b'{"size": 1, "mtime_ns": 1, "journal": 1}\n' + body)
+    assert OperationLog(path).recover() is None
+    with pytest.raises(StaleJournal):
+        compact_snapshot(path, path + ".journal", os.path.getsize(path + ".journal"))
+    assert not os.path.exists(path + ".compact")
+
+def test_compaction_folds_the_journal_and_carries_later_edits(journaled):
+    doc, path = journaled
+    root = doc.root_nodes()[0]
+    rename(doc, root, "folded")
+    end = doc.op_log.size()
+    # An edit made while the snapshot is being built goes into the next journal.
+    move(doc, [root.children[0]], 5, 5)
+
+    temp_path, signature = compact_snapshot(path, doc.op_log.path, end)
+    doc.op_log.rotate(temp_path, signature, end)
+    assert not os.path.exists(temp_path)
+    assert load(path).root_nodes()[0].text == "folded"
+    assert doc.op_log.changes == 1
+
+    rename(doc, root.children[1], "after rotate")
+    doc.op_log.sync()
+    recovered, log, changes = recover(path)
+    assert len(changes) == 2
+    assert recovered.serialize() == doc.serialize()
+
+def test_compaction_refuses_a_replaced_map(journaled, make_doc):
+    doc, path = journaled
+    rename(doc, doc.root_nodes()[0], "renamed")
+    end = doc.op_log.size()
+    make_doc(branches=1).save(path + ".other", "indented")
+    os.replace(path + ".other", path)
+    with pytest.raises(StaleJournal):
+        compact_snapshot(path, doc.op_log.path, end)
+
+def test_rotate_refuses_a_map_replaced_during_compaction(journaled, make_doc):
+    doc, path = journaled
+    rename(doc, doc.root_nodes()[0], "renamed")
+    end = doc.op_log.size()
+    temp_path, signature = compact_snapshot(path, doc.op_log.path, end)
+    other = make_doc(branches=1)
+    other.save(path, "indented")
+    with pytest.raises(StaleJournal):
+        doc.op_log.rotate(temp_path, signature, end)
+    assert not os.path.exists(temp_path)
+    assert load(path).serialize() == other.serialize()
+
+def test_discard_removes_the_journal(journaled):
+    doc, path = journaled
+    rename(doc, doc.root_nodes()[0], "renamed")
+    doc.op_log.discard()
+    assert not os.path.exists(path + ".journal")
+    assert OperationLog(path).recover() is None
+
+def test_save_leaves_no_temp_file(journaled):
+    doc, path = journaled
+    doc.save(path, "chunked")
+    assert not os.path.exists(path + ".tmp")
+    assert load(path).serialize() == doc.serialize()
+
+def test_failed_rotate_keeps_the_journal_open(journaled, monkeypatch):
+    doc, path = journaled
+    rename(doc, doc.root_nodes()[0], "renamed")
+    end = doc.op_log.size()
+    temp_path, signature = compact_snapshot(path, doc.op_log.path, end)
+    replace = os.replace
+
+    def refuse_map(source, target):
+        if target == path:
+            raise PermissionError(13, "file is mapped", target)
+        replace(source, target)
+
+    monkeypatch.setattr(os, "replace", refuse_map)
+    with pytest.raises(OSError):
+        doc.op_log.rotate(temp_path, signature, end)
+    monkeypatch.setattr(os, "replace", replace)
+    assert not os.path.exists(temp_path)
+    assert not os.path.exists(path + ".journal.new")
+
+    rename(doc, doc.root_nodes()[0].children[0], "after failure")
+    doc.op_log.sync()
+    recovered, log, changes = recover(path)
+    assert len(changes) == 2
+    assert recovered.serialize() == doc.serialize()
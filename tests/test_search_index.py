@@ -0,0 +1,62 @@
+import pytest
+from mindmap_core import SearchIndex
+
+def scan(doc, query):
+    return sorted((node for node in doc if query.lower() in node.text.lower()), key=lambda node: node.uid)
+
+def test_index_matches_a_scan(make_doc):
+    doc = make_doc()
+    for query in ["central / 2", "/ 1 /", "2 / 0", "/", "1", "CENTRAL", "missing"]:
+        assert doc.search(query) == scan(doc, query)
+
+def test_search_follows_renames_and_deletes(make_doc):
+    doc = make_doc()
+    root = doc.root_nodes()[0]
+    node = root.children[1].children[2]
+    doc.set_node_attr(node, "text", "Quarterly Budget")
+    assert doc.search("budget") == [node]
+    assert node not in doc.search("Central / 1 / 2")
+    doc.set_node_attr(node, "text", "Yearly plan")
+    assert doc.search("budget") == []
+    assert doc.search("arly pl") == [node]
+
+    branch = root.children[2]
+    removed = list(branch.children) + [branch]
+    index = doc.detach_subtree(branch)
+    assert doc.search("Central / 2") == []
+    assert all(node not in doc.search("Central") for node in removed)
+    assert doc.search("Central") == scan(doc, "Central")
+    doc.attach_subtree(branch, root, index)
+    assert doc.search("Central / 2") == scan(doc, "Central / 2")
+    assert len(doc.search("Central / 2")) == 13
+
+def test_prefix_and_regex_modes(make_doc):
+    doc = make_doc(branches=2, fanout=2, depth=1)
+    root, first, second = doc.root_nodes()[0], *doc.root_nodes()[0].children
+    doc.set_node_attr(first, "text", "rebuild the index")
+    doc.set_node_attr(second, "text", "build pipeline")
+    assert doc.search("build", "prefix") == [second]
+    assert doc.search("build") == [first, second]
+    assert doc.search(r"^(re)?build\b", "regex") == [first, second]
+    assert doc.search("CENT", "prefix") == [root]
+
+@pytest.mark.parametrize("query", ["a", "ab", "xa"])
+def test_short_queries_scan_every_text(query):
+    index = SearchIndex()
+    index.add(1, "Alpha")
+    index.add(2, "xab")
+    index.add(3, "beta")
+    assert index.search(query) == sorted(uid for uid, text in index.texts.items() if query in text)
+
+def test_postings_are_dropped_with_their_last_text():
+    index = SearchIndex()
+    index.add(1, "Alpha")
+    index.add(2, "alphabet")
+    index.remove(1)
+    index.remove(1)
+    assert index.search("alpha") == [2]
+    index.update(2, "gamma")
+    assert index.search("alpha") == []
+    assert set(index.postings) == {"gam", "amm", "mma"}
+    index.clear()
+    assert len(index) == 0 and index.search("gam") == []
@@ -0,0 +1,66 @@
+import random
+from mindmap_core import SpatialGrid, MindMapNode, index_nodes
+
+def brute_force(boxes, x0, y0, x1, y1):
+    return {item for item, (bx0, by0, bx1, by1) in boxes.items()
+            if bx0 <= x1 and bx1 >= x0 and by0 <= y1 and by1 >= y0}
+
+def test_query_rect_matches_a_scan():
+    rng = random.Random(1)
+    grid = SpatialGrid(cell_size=64)
+    boxes = {}
+    for item in range(500):
+        x, y = rng.uniform(-2000, 2000), rng.uniform(-2000, 2000)
+        boxes[item] = (x, y, x + rng.uniform(1, 300), y + rng.uniform(1, 200))
+        grid.insert(item, *boxes[item])
+    assert len(grid) == 500
+    for _ in range(200):
+        x, y = rng.uniform(-2500, 2500), rng.uniform(-2500, 2500)
+        # Small rectangles walk their cells, huge ones the occupied cells.
+        w, h = rng.choice([(10, 10), (400, 250), (6000, 6000)])
+        rect = (x, y, x + w, y + h)
+        expected = brute_force(boxes, *rect)
+        assert set(grid.query_rect(*rect)) == expected
+        assert set(grid.query_rect(rect[2], rect[3], rect[0], rect[1])) == expected
+        assert grid.any_in_rect(*rect) == bool(expected)
+
+def test_move_and_remove():
+    grid = SpatialGrid(cell_size=100)
+    grid.insert("a", 10, 10, 60, 40)
+    grid.insert("b", 500, 500, 560, 540)
+    assert grid.query_rect(0, 0, 100, 100) == ["a"]
+
+    grid.update("a", 1010, 10, 1060, 40)
+    assert grid.query_rect(0, 0, 100, 100) == []
+    assert grid.query_rect(1000, 0, 1100, 100) == ["a"]
+    assert grid.bounds["a"] == (1010, 10, 1060, 40)
+    # Moving within the same cells only updates the bounds.
+    grid.update("a", 1015, 15, 1065, 45)
+    assert grid.query_rect(1061, 41, 1064, 44) == ["a"]
+
+    grid.remove("a")
+    grid.remove("a")
+    assert "a" not in grid and "b" in grid
+    assert grid.query_rect(0, 0, 2000, 2000) == ["b"]
+    grid.remove("b")
+    assert not grid.cells
+
+def test_nearest_picks_the_oval_the_point_is_deepest_in():
+    parent = MindMapNode("parent", 0, 0)
+    wide = MindMapNode("a wide label", 70, 0, parent)
+    grid = SpatialGrid()
+    extents = {parent: (50, 30), wide: (100, 30)}
+    index_nodes(grid, [parent, wide], extents.__getitem__)
+    assert grid.nearest(-40, 0) is parent
+    assert grid.nearest(40, 0) is wide
+    assert grid.nearest(160, 0) is wide
+    assert grid.nearest(0, 100) is None
+    assert grid.nearest(5000, 5000) is None
+
+def test_cell_counts_cover_the_rect():
+    grid = SpatialGrid(cell_size=10)
+    for item in range(5):
+        grid.insert(item, 1, 1, 2, 2)
+    grid.insert("far", 95, 95, 96, 96)
+    assert list(grid.cell_counts(0, 0, 9, 9)) == [(0, 0, 5)]
+    assert sorted(grid.cell_counts(0, 0, 100, 100)) == [(0, 0, 5), (9, 9, 1)]